@@ -13,12 +13,14 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import os
 from typing import Optional
+from services.request_timing import traced
 
 JWT_SECRET = os.environ.get("JWT_SECRET", "supersecretjwtkey")
 JWT_ALGORITHM = "HS256"
 
 bearer_scheme = HTTPBearer()
 
+@traced("auth")
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> Optional[str]:
     """
     Retrieve the current user from the JWT token provided in the Authorization header.
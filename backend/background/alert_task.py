@@ -0,0 +1,125 @@
+"""
+alert_task.py
+
+Background sender for device alerts. Alerts are written to the database by the poller and
+delivered to Telegram from here, so a slow or failing Telegram API never blocks monitoring.
+
+Envío en segundo plano de las alertas de dispositivos. El sondeo escribe las alertas en la base de
+datos y desde aquí se entregan a Telegram, de modo que una API de Telegram lenta o caída no bloquea
+el monitoreo.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func
+from sqlmodel import Session, select
+from models import Alert, Incident
+from utils import post_telegram, escape_markdown
+from database import engine
+from services.http_cache import ALERTS
+
+logger = logging.getLogger("raingauge-backend")
+
+ALERT_SEND_INTERVAL = float(os.environ.get("ALERT_SEND_INTERVAL", "2"))
+# Alerts older than this are never sent (avoids flooding Telegram with history after an outage)
+# Las alertas más antiguas que esto no se envían (evita inundar Telegram con historial tras una caída)
+ALERT_SEND_WINDOW_MINUTES = int(os.environ.get("ALERT_SEND_WINDOW_MINUTES", "15"))
+ALERT_SEND_BATCH = 20
+
+class TelegramUnavailable(Exception):
+    """
+    Telegram is not configured, unreachable, rate limiting or failing: retry on the next run.
+    Telegram no está configurado, no responde, limita la tasa o falla: reintentar en la siguiente ejecución.
+    """
+
+async def deliver(message: str) -> Optional[str]:
+    """
+    Send a MarkdownV2 message. Returns None if Telegram accepted it, or the reason if Telegram rejected it
+    for good (other 4xx answers, e.g. a malformed message). Raises TelegramUnavailable on transient failures
+    (no answer, 429, 5xx).
+
+    Envía un mensaje MarkdownV2. Retorna None si Telegram lo aceptó, o el motivo si Telegram lo rechazó
+    definitivamente (otras respuestas 4xx, p. ej. un mensaje mal formado). Lanza TelegramUnavailable ante
+    fallos transitorios (sin respuesta, 429, 5xx).
+    """
+    response = await post_telegram(message, parse_mode="MarkdownV2")
+    if response is None or response.status_code == 429 or response.status_code >= 500:
+        raise TelegramUnavailable()
+    if response.is_success:
+        return None
+    return f"{response.status_code} {response.text[:500]}"
+
+async def send_pending_alerts() -> None:
+    """
+    Send unsent recent alerts and incident openings/resolutions to Telegram and mark the delivered ones.
+    Alerts linked to an incident are marked as sent when linked, so only the incident is notified.
+    Messages Telegram rejects are marked with `telegram_error` and skipped; transient failures stop the
+    run and are retried on the next one.
+
+    Envía a Telegram las alertas recientes no enviadas y las aperturas/resoluciones de incidentes, y marca
+    las entregadas. Las alertas asociadas a un incidente se marcan como enviadas al asociarlas, así solo
+    se notifica el incidente. Los mensajes que Telegram rechaza se marcan con `telegram_error` y se omiten;
+    los fallos transitorios detienen la ejecución y se reintentan en la siguiente.
+    """
+    since = datetime.utcnow() - timedelta(minutes=ALERT_SEND_WINDOW_MINUTES)
+    with Session(engine) as session:
+        try:
+            await send_alerts(session, since)
+            await send_incidents(session, since)
+        except TelegramUnavailable:
+            pass  # Retry on next run / Reintentar en la siguiente ejecución
+
+async def send_alerts(session: Session, since: datetime) -> None:
+    # Reopened alerts count from their last occurrence / Las alertas reabiertas cuentan desde su última ocurrencia
+    raised_at = func.coalesce(Alert.last_seen, Alert.timestamp)
+    pending = session.exec(
+        select(Alert)
+        .where(Alert.sent_to_telegram == False, Alert.telegram_error == None, raised_at >= since)
+        .order_by(raised_at)
+        .limit(ALERT_SEND_BATCH)
+    ).all()
+    for alert in pending:
+        error = await deliver(alert.message)
+        if error:
+            logger.error("Telegram rejected alert %s, not retrying: %s", alert.id, error)
+            alert.telegram_error = error
+        else:
+            alert.sent_to_telegram = True
+        session.add(alert)
+        session.commit()
+        ALERTS.bump()
+
+async def send_incidents(session: Session, since: datetime) -> None:
+    incidents = session.exec(
+        select(Incident)
+        .where(Incident.sent_to_telegram == False, Incident.telegram_error == None, Incident.opened_at >= since)
+        .order_by(Incident.opened_at)
+        .limit(ALERT_SEND_BATCH)
+    ).all()
+    for incident in incidents:
+        error = await deliver(incident.message)
+        if error:
+            logger.error("Telegram rejected incident %s, not retrying: %s", incident.id, error)
+            incident.telegram_error = error
+        else:
+            incident.sent_to_telegram = True
+        session.add(incident)
+        session.commit()
+    resolutions = session.exec(
+        select(Incident)
+        .where(Incident.resolved == True, Incident.resolution_sent == False, Incident.resolved_at >= since)
+        .order_by(Incident.resolved_at)
+        .limit(ALERT_SEND_BATCH)
+    ).all()
+    for incident in resolutions:
+        if incident.sent_to_telegram:
+            msg = "🟢✅ " + escape_markdown(f"Incidente resuelto: la subred {incident.key} ha vuelto a estar ONLINE.")
+            error = await deliver(msg)
+            if error:
+                logger.error("Telegram rejected the resolution of incident %s, not retrying: %s", incident.id, error)
+                incident.telegram_error = error
+        incident.resolution_sent = True
+        session.add(incident)
+        session.commit()
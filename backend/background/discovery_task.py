@@ -0,0 +1,118 @@
+"""
+discovery_task.py
+
+Runs network discovery sweeps (services/discovery.py): periodically over DISCOVERY_CIDRS when
+DISCOVERY_INTERVAL > 0, or on demand from POST /devices/discovery. Only one sweep runs at a time;
+its progress and the summary of the last one are kept in `discovery_state`, and new hosts are
+reported to Telegram in a single message.
+
+Ejecuta barridos de descubrimiento en red (services/discovery.py): periódicamente sobre
+DISCOVERY_CIDRS cuando DISCOVERY_INTERVAL > 0, o bajo demanda desde POST /devices/discovery. Solo se
+ejecuta un barrido a la vez; su progreso y el resumen del último se guardan en `discovery_state`, y
+los hosts nuevos se reportan a Telegram en un solo mensaje.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+from sqlmodel import Session
+from database import engine
+from services.device_registry import device_registry
+from services.discovery import DiscoverySweep, DISCOVERY_CIDRS, DISCOVERY_CONCURRENCY, add_devices, summary_message
+from utils import send_telegram_alert
+
+logger = logging.getLogger("raingauge-backend")
+
+# 0 disables periodic sweeps / 0 desactiva los barridos periódicos
+DISCOVERY_INTERVAL = float(os.environ.get("DISCOVERY_INTERVAL", "0"))
+# Insert the hosts found by periodic sweeps instead of only proposing them
+# Insertar los hosts encontrados por los barridos periódicos en lugar de solo proponerlos
+DISCOVERY_AUTO_ADD = os.environ.get("DISCOVERY_AUTO_ADD", "false").lower() == "true"
+
+class DiscoveryState:
+    """
+    The running sweep (if any), its task and the summary of the last finished one.
+    El barrido en curso (si hay), su tarea y el resumen del último terminado.
+    """
+    def __init__(self):
+        self.current: Optional[DiscoverySweep] = None
+        self.task: Optional[asyncio.Task] = None
+        self.last: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self.current is not None
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        return self.current.summary() if self.current is not None else self.last
+
+discovery_state = DiscoveryState()
+
+def prepare_sweep(cidrs: List[str], concurrency: int = DISCOVERY_CONCURRENCY) -> DiscoverySweep:
+    """
+    Create (and register as running) a sweep of `cidrs` skipping the registered IPs.
+    Raises RuntimeError if a sweep is already running and ValueError for invalid ranges.
+
+    Crea (y registra como en curso) un barrido de `cidrs` omitiendo las IPs registradas.
+    Lanza RuntimeError si ya hay un barrido en curso y ValueError para rangos no válidos.
+    """
+    if discovery_state.running:
+        raise RuntimeError("A discovery sweep is already running")
+    known = {device.ip for device in device_registry.all()}
+    sweep = discovery_state.current = DiscoverySweep(cidrs, known, concurrency)
+    return sweep
+
+async def run_sweep(sweep: DiscoverySweep, add: bool) -> Dict[str, Any]:
+    """
+    Run a prepared sweep, insert the new hosts in bulk if `add`, and report the summary.
+    Ejecuta un barrido preparado, inserta en bloque los hosts nuevos si `add` y reporta el resumen.
+    """
+    try:
+        found = await sweep.run()
+        summary = sweep.summary()
+        if add and found:
+            with Session(engine) as session:
+                summary["added"] = [device.ip for device in add_devices(session, found)]
+    finally:
+        discovery_state.current = None
+    discovery_state.last = summary
+    message = summary_message(summary)
+    logger.info(message)
+    if found:
+        await send_telegram_alert(message)
+    return summary
+
+def start_sweep(cidrs: List[str], add: bool, concurrency: int = DISCOVERY_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Start a sweep in the background and return its initial progress. Must be called from the event loop.
+    Inicia un barrido en segundo plano y retorna su progreso inicial. Debe llamarse desde el event loop.
+    """
+    sweep = prepare_sweep(cidrs, concurrency)
+    discovery_state.task = asyncio.ensure_future(run_sweep(sweep, add))
+    discovery_state.task.add_done_callback(_log_failure)
+    return sweep.summary()
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Discovery sweep failed: %s", task.exception())
+
+async def stop_sweep() -> None:
+    """
+    Cancel an on-demand sweep still running (on shutdown).
+    Cancela un barrido bajo demanda que siga en curso (al apagar).
+    """
+    task = discovery_state.task
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+async def discover_devices() -> None:
+    """
+    Periodic sweep of DISCOVERY_CIDRS (skipped while an on-demand sweep is running).
+    Barrido periódico de DISCOVERY_CIDRS (se omite mientras hay un barrido bajo demanda en curso).
+    """
+    if discovery_state.running:
+        logger.info("Discovery sweep already running, skipping this cycle")
+        return
+    await run_sweep(prepare_sweep(DISCOVERY_CIDRS), DISCOVERY_AUTO_ADD)
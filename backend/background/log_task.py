@@ -0,0 +1,58 @@
+"""
+log_task.py
+
+Periodic log collection for the archive (services/log_archive.py). Fetches the logs of the enabled
+devices whose logs were not already fetched by a /logs request during the interval, with at most
+LOG_COLLECT_CONCURRENCY requests in flight, then writes the buffered entries to the full-text index
+and drops the partitions past the retention period.
+
+Recolección periódica de logs para el archivo (services/log_archive.py). Obtiene los logs de los
+dispositivos habilitados cuyos logs no se obtuvieron ya con una petición a /logs durante el intervalo,
+con como máximo LOG_COLLECT_CONCURRENCY peticiones en curso, luego escribe las entradas en buffer en
+el índice de texto completo y elimina las particiones que superan el periodo de retención.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from services.device_registry import device_registry
+from services.log_archive import log_archive
+from utils import fetch_logs
+
+logger = logging.getLogger("raingauge-backend")
+
+LOG_ARCHIVE_INTERVAL = float(os.environ.get("LOG_ARCHIVE_INTERVAL", "300"))
+LOG_COLLECT_CONCURRENCY = int(os.environ.get("LOG_COLLECT_CONCURRENCY", "50"))
+
+async def collect_logs() -> None:
+    """
+    Fetch the logs not collected during the last interval and archive everything buffered.
+    Obtiene los logs no recolectados durante el último intervalo y archiva todo lo que está en buffer.
+    """
+    if not log_archive.enabled:
+        return
+    fresh_after = time.time() - LOG_ARCHIVE_INTERVAL / 2
+    ips = [d.ip for d in device_registry.enabled() if log_archive.collected.get(d.ip, 0.0) < fresh_after]
+    # Workers share one iterator: next() never awaits, so each device is taken exactly once
+    # Los workers comparten un iterador: next() nunca espera, así cada dispositivo se toma una sola vez
+    pending = iter(ips)
+
+    async def worker() -> None:
+        for ip in pending:
+            await fetch_logs(ip)
+
+    await asyncio.gather(*(worker() for _ in range(min(LOG_COLLECT_CONCURRENCY, len(ips)))))
+    await flush_logs()
+    dropped = await asyncio.to_thread(log_archive.purge)
+    if dropped:
+        logger.info("Log archive: dropped partitions %s", ", ".join(dropped))
+
+async def flush_logs() -> None:
+    """
+    Write the buffered log entries to the archive.
+    Escribe en el archivo las entradas de log en buffer.
+    """
+    counts = await asyncio.to_thread(log_archive.flush)
+    if counts["stored"] or counts["duplicate"]:
+        logger.info("Log archive: stored %d entries, skipped %d duplicates", counts["stored"], counts["duplicate"])
@@ -0,0 +1,93 @@
+"""
+metric_task.py
+
+Buffered persistence of device metrics. The poller records samples in memory and the flusher
+writes them to MetricHistory in a single batch, instead of one commit per device. Gauge readings
+defined by the device type's payload schema are extracted at record time and stored in MetricSample.
+
+Persistencia con buffer de las métricas de dispositivos. El sondeo registra muestras en memoria y el
+volcador las escribe en MetricHistory en un solo lote, en lugar de un commit por dispositivo. Las
+lecturas del pluviómetro definidas por el esquema de payload del tipo de dispositivo se extraen al
+registrar y se guardan en MetricSample.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlmodel import Session, insert
+from models import MetricHistory, MetricSample
+from database import engine
+from services.payload_schema import CompiledSchema, metric_catalog, schema_for
+
+logger = logging.getLogger("raingauge-backend")
+
+METRIC_FLUSH_INTERVAL = float(os.environ.get("METRIC_FLUSH_INTERVAL", "30"))
+# Minimum seconds between two stored samples of the same device
+# Segundos mínimos entre dos muestras almacenadas del mismo dispositivo
+METRIC_RECORD_INTERVAL = float(os.environ.get("METRIC_RECORD_INTERVAL", "60"))
+
+_buffer: List[MetricHistory] = []
+# (device_id, schema, unix ts, extracted values) / (device_id, esquema, ts unix, valores extraídos)
+_readings: List[Tuple[int, CompiledSchema, int, Tuple[Optional[float], ...]]] = []
+_last_recorded: Dict[int, float] = {}
+
+def _as_float(value: Any):
+    """
+    Convert a reported metric to float, or None if it is missing or not numeric.
+    Convierte una métrica reportada a float, o None si falta o no es numérica.
+    """
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def record_metrics(device_id: int, status: Dict[str, Any], device_type: Optional[str] = None) -> None:
+    """
+    Buffer a metric sample from a fetch_status result (rate limited per device), plus the readings
+    defined by the payload schema of `device_type`.
+    Guarda en el buffer una muestra de métricas de un resultado de fetch_status (limitado por
+    dispositivo), más las lecturas definidas por el esquema de payload de `device_type`.
+    """
+    now = time.monotonic()
+    last = _last_recorded.get(device_id)
+    if last is not None and now - last < METRIC_RECORD_INTERVAL:
+        return
+    _last_recorded[device_id] = now
+    online = "error" not in status
+    _buffer.append(MetricHistory(
+        device_id=device_id,
+        cpu=_as_float(status.get("cpu")) if online else None,
+        ram=_as_float(status.get("ram")) if online else None,
+        disk=_as_float(status.get("disk")) if online else None,
+        temp=_as_float(status.get("temp")) if online else None,
+        status="online" if online else "offline",
+    ))
+    schema = schema_for(device_type) if online else None
+    if schema is not None:
+        _readings.append((device_id, schema, int(time.time()), schema.extract(status)))
+
+async def flush_metrics() -> None:
+    """
+    Write all buffered samples to the database in one transaction.
+    Escribe todas las muestras del buffer en la base de datos en una sola transacción.
+    """
+    if not _buffer and not _readings:
+        return
+    batch = _buffer[:]
+    del _buffer[:len(batch)]
+    readings = _readings[:]
+    del _readings[:len(readings)]
+    with Session(engine) as session:
+        rows = []
+        for device_id, schema, ts, values in readings:
+            metric_ids = metric_catalog.ids_for(session, schema)
+            rows += [
+                {"device_id": device_id, "metric_id": metric_id, "ts": ts, "value": value}
+                for metric_id, value in zip(metric_ids, values) if value is not None
+            ]
+        session.add_all(batch)
+        if rows:
+            session.execute(insert(MetricSample), rows)
+        session.commit()
+    logger.debug("Flushed %d metric samples and %d readings", len(batch), len(rows))
@@ -1,78 +1,163 @@
 """
 ping_task.py
 
-Background monitoring of Raspberry Pi device status. Sends alerts and logs status changes.
+Background monitoring of Raspberry Pi device status. Opens and resolves alerts on status changes and records metrics.
+One poll cycle queries all enabled devices concurrently; the cycle is scheduled by the task supervisor.
 
-Monitoreo en background del estado de las Raspberry Pi. Envía alertas y registra cambios de estado.
+Monitoreo en background del estado de las Raspberry Pi. Abre y resuelve alertas ante cambios de estado y registra métricas.
+Un ciclo de sondeo consulta todos los dispositivos habilitados de forma concurrente; el supervisor de tareas lo programa.
 """
 
-import time
+import asyncio
 import logging
-import httpx
+import os
+import time
 from sqlmodel import Session, select
-from models import Device
-from utils import send_telegram_alert
+from utils import fetch_status, escape_markdown
 import crud
-from endpoints.device_endpoint import engine
-from typing import Dict
+from database import engine
+from background.metric_task import record_metrics
+from services.metrics import POLL_CYCLE_SECONDS, POLL_DEVICES
+from services.status_hub import status_hub
+from services.group_aggregates import group_aggregates
+from services.device_registry import device_registry
+from services.ring_buffer import metric_rings
+from services.forecast import forecasts, FORECAST_DISK_FULL_PERCENT, FORECAST_TEMP_THRESHOLD
+from services.incidents import correlate
+from services.event_stream import publish_statuses, publish_removed, publish_alerts
+from services.http_cache import ALERTS
+from services.serialization import rows_to_dicts
+from models import Alert
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
 logger = logging.getLogger("raingauge-backend")
 
-def is_online(ip: str) -> bool:
+MONITOR_INTERVAL = float(os.environ.get("MONITOR_INTERVAL", "10"))
+# An 'offline' alert resolved less than this ago is reopened instead of creating a new one (flapping)
+# Una alerta 'offline' resuelta hace menos de esto se reabre en lugar de crear una nueva (aleteo)
+ALERT_REOPEN_WINDOW = timedelta(minutes=float(os.environ.get("ALERT_REOPEN_MINUTES", "15")))
+
+# Last known online state per device IP / Último estado online conocido por IP de dispositivo
+previous_status: Dict[str, bool] = {}
+
+def is_online(status: Dict[str, Any]) -> bool:
     """
-    Check if a Raspberry Pi is online by making an HTTP request to /status.
-    Verifica si una Raspberry Pi está online mediante una petición HTTP a /status.
+    Check if a fetch_status result corresponds to a reachable Raspberry Pi.
+    Verifica si un resultado de fetch_status corresponde a una Raspberry Pi accesible.
 
     Args:
-        ip (str): Device IP address.
-        ip (str): Dirección IP del dispositivo.
+        status (Dict[str, Any]): Result of fetch_status.
+        status (Dict[str, Any]): Resultado de fetch_status.
 
     Returns:
-        bool: True if responds correctly, False otherwise.
-        bool: True si responde correctamente, False en caso contrario.
+        bool: True if the device responded correctly, False otherwise.
+        bool: True si el dispositivo respondió correctamente, False en caso contrario.
+    """
+    return "error" not in status
+
+def forecast_message(device: Any, condition: str, hours: Optional[float], status: Dict[str, Any]) -> str:
+    """
+    Telegram text of a forecast warning.
+    Texto de Telegram de un aviso de pronóstico.
+    """
+    who = f"Raspberry Pi {device.ip} ({device.name})"
+    if condition == "disk_forecast":
+        detail = f"disco lleno ({FORECAST_DISK_FULL_PERCENT:g}%) en ~{hours:.0f} horas, ahora {status.get('disk')}%"
+        return "⚠️💾 " + escape_markdown(f"{who}: {detail}.")
+    detail = f"temperatura subiendo hacia {FORECAST_TEMP_THRESHOLD:g} °C en ~{hours:.1f} horas, ahora {status.get('temp')} °C"
+    return "⚠️🌡️ " + escape_markdown(f"{who}: {detail}.")
+
+def apply_forecast(session: Session, device: Any, status: Dict[str, Any],
+                   changes: List[Tuple[str, bool, Optional[float]]], cleared: Dict[str, List[int]]) -> None:
+    """
+    Open a WARNING alert for each raised forecast and collect the cleared ones for a bulk resolve.
+    Abre una alerta WARNING por cada pronóstico activado y junta los despejados para resolverlos en bloque.
     """
-    try:
-        url = f"http://{ip}:8000/api/v1/status"
-        resp = httpx.get(url, timeout=3)
-        return resp.status_code == 200
-    except Exception as e:
-        logger.warning(f"No se pudo conectar con {ip}: {e}")
-        return False
+    for condition, raised, hours in changes:
+        if not raised:
+            cleared.setdefault(condition, []).append(device.id)
+            continue
+        msg = forecast_message(device, condition, hours, status)
+        crud.open_alert(session, device.id, condition, "WARNING", msg, ALERT_REOPEN_WINDOW)
+        logger.info("[ALERTA] %s", msg)
 
-def start_monitoring() -> None:
+async def poll_devices() -> None:
     """
-    Start continuous monitoring of devices. Sends alerts and logs status changes.
-    Inicia el monitoreo continuo de dispositivos. Envía alertas y registra cambios de estado.
+    Run one monitoring cycle: query every enabled device, record metrics, publish statuses to the
+    status hub and the SSE event stream, create alerts on status changes and update the disk/temperature forecasts.
+    Ejecuta un ciclo de monitoreo: consulta cada dispositivo habilitado, registra métricas, publica los
+    estados en el hub de estado y el flujo de eventos SSE, crea alertas ante cambios y actualiza los
+    pronósticos de disco/temperatura.
     """
-    previous_status: Dict[str, bool] = {}
-    while True:
-        with Session(engine) as session:
-            devices = session.exec(select(Device).where(Device.enabled == True)).all()
-            for device in devices:
-                ip = device.ip
-                online = is_online(ip)
-                last_status = previous_status.get(ip)
-                if last_status is None:
-                    previous_status[ip] = online
-                    continue  # Do not alert on first cycle / No alertar en el primer ciclo
-                if online != last_status:
-                    # State change: send alert and log / Cambio de estado: enviar alerta y registrar
-                    from utils import escape_markdown
-                    if online:
-                        msg = (
-                            "🟢✅ Raspberry Pi "
-                            f"{escape_markdown(ip)} ({escape_markdown(device.name)}) ha vuelto a estar ONLINE."
-                        )
-                        level = "INFO"
-                    else:
-                        msg = (
-                            "🔴❌ Raspberry Pi "
-                            f"{escape_markdown(ip)} ({escape_markdown(device.name)}) está OFFLINE."
-                        )
-                        level = "CRITICAL"
-                    import asyncio
-                    asyncio.create_task(send_telegram_alert(msg, parse_mode="MarkdownV2"))
-                    crud.create_alert(session, device.id, level, msg)
-                    logger.info(f"[ALERTA] {msg}")
-                    previous_status[ip] = online
-        time.sleep(10)  # Monitoring interval / Intervalo de monitoreo
+    started = time.perf_counter()
+    devices = device_registry.enabled()
+    # Forget devices deleted or disabled since the last cycle / Olvidar dispositivos eliminados o deshabilitados
+    removed = sorted(set(status_hub.snapshots) - {d.id for d in devices})
+    for device_id in removed:
+        status_hub.remove(device_id)
+        metric_rings.remove(device_id)
+        forecasts.remove(device_id)
+    publish_removed(removed)
+    metric_rings.fit(len(devices))
+    if not devices:
+        return
+    results = await asyncio.gather(*(fetch_status(d.ip) for d in devices))
+    online_count = 0
+    first_cycle_online = []
+    changed = False
+    cleared: Dict[str, List[int]] = {}
+    now = time.time()
+    with Session(engine) as session:
+        for device, status in zip(devices, results):
+            ip = device.ip
+            online = is_online(status)
+            online_count += online
+            record_metrics(device.id, status, device.device_type)
+            metric_rings.record(device.id, status, online)
+            if online:
+                apply_forecast(session, device, status, forecasts.observe(device.id, status, now), cleared)
+            status_hub.publish(device.id, {"device_id": device.id, "name": device.name, "online": online, **status})
+            group_aggregates.update_status(device.id, online, status)
+            last_status = previous_status.get(ip)
+            previous_status[ip] = online
+            if last_status is None:
+                # Recovered while the backend was down / Recuperado mientras el backend estaba detenido
+                if online:
+                    first_cycle_online.append(device.id)
+                continue
+            if online == last_status:
+                continue  # No alert without change / Sin alerta sin cambio
+            changed = True
+            # State change: open or resolve the 'offline' alert (sent to Telegram by the alert task)
+            # Cambio de estado: abrir o resolver la alerta 'offline' (la tarea de alertas la envía a Telegram)
+            if online:
+                resolved = crud.resolve_condition(session, [device.id], "offline")
+                if not any(crud.recovery_notified(a) for a in resolved):
+                    continue
+                msg = "🟢✅ " + escape_markdown(f"Raspberry Pi {ip} ({device.name}) ha vuelto a estar ONLINE.")
+                crud.create_alert(session, device.id, "INFO", msg, resolved=True)
+            else:
+                msg = "🔴❌ " + escape_markdown(f"Raspberry Pi {ip} ({device.name}) está OFFLINE.")
+                alert = crud.open_alert(session, device.id, "offline", "CRITICAL", msg, ALERT_REOPEN_WINDOW,
+                                        recovery_notices=True)
+                # Silent only for flaps whose recovery was never announced
+                # En silencio solo para aleteos cuya recuperación nunca se anunció
+                if alert.sent_to_telegram:
+                    continue
+            logger.info("[ALERTA] %s", msg)
+        if first_cycle_online:
+            crud.resolve_condition(session, first_cycle_online, "offline")
+        for condition, device_ids in cleared.items():
+            crud.resolve_condition(session, device_ids, condition)
+        if changed or first_cycle_online:
+            correlate(session, devices, [ip for ip, up in previous_status.items() if not up])
+        # Stream the cycle to SSE clients: changed statuses, then alerts if they changed
+        # Transmitir el ciclo a los clientes SSE: estados que cambiaron y luego alertas si cambiaron
+        publish_statuses(d.id for d in devices)
+        publish_alerts(ALERTS.version, lambda: rows_to_dicts(
+            session.exec(select(Alert).where(Alert.resolved == False).order_by(Alert.id)).all()
+        ))
+    POLL_DEVICES.labels("online").set(online_count)
+    POLL_DEVICES.labels("offline").set(len(devices) - online_count)
+    POLL_CYCLE_SECONDS.observe(time.perf_counter() - started)
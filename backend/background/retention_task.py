@@ -0,0 +1,50 @@
+"""
+retention_task.py
+
+Periodic retention job: deletes old metric samples and old resolved alerts and incidents so the SQLite
+database does not grow without bound.
+
+Trabajo periódico de retención: elimina muestras de métricas antiguas y alertas e incidentes resueltos
+antiguos para que la base de datos SQLite no crezca sin límite.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from sqlmodel import Session, delete
+from models import Alert, Incident, MetricHistory, MetricSample
+from database import engine
+from services.http_cache import ALERTS
+
+logger = logging.getLogger("raingauge-backend")
+
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", "3600"))
+METRIC_RETENTION_DAYS = int(os.environ.get("METRIC_RETENTION_DAYS", "30"))
+ALERT_RETENTION_DAYS = int(os.environ.get("ALERT_RETENTION_DAYS", "180"))
+
+async def purge_expired() -> None:
+    """
+    Delete metric samples and resolved alerts older than their retention period.
+    Elimina muestras de métricas y alertas resueltas más antiguas que su periodo de retención.
+    """
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        metrics = session.execute(
+            delete(MetricHistory).where(MetricHistory.timestamp < now - timedelta(days=METRIC_RETENTION_DAYS))
+        )
+        readings = session.execute(
+            delete(MetricSample).where(MetricSample.ts < time.time() - METRIC_RETENTION_DAYS * 86400)
+        )
+        alerts = session.execute(
+            delete(Alert).where(Alert.resolved == True, Alert.timestamp < now - timedelta(days=ALERT_RETENTION_DAYS))
+        )
+        session.execute(
+            delete(Incident).where(Incident.resolved == True, Incident.resolved_at < now - timedelta(days=ALERT_RETENTION_DAYS))
+        )
+        session.commit()
+    if alerts.rowcount:
+        ALERTS.bump()
+    if metrics.rowcount or readings.rowcount or alerts.rowcount:
+        logger.info("Retention: deleted %d metric samples, %d readings and %d resolved alerts",
+                    metrics.rowcount, readings.rowcount, alerts.rowcount)
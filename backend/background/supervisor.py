@@ -0,0 +1,170 @@
+"""
+supervisor.py
+
+Supervisor for the backend's periodic background jobs (poller, alert sender, metric flusher, retention).
+Each job runs as an asyncio task owned by the application lifespan, is restarted with exponential
+backoff when it fails, and reports its health and last-run latency.
+
+Supervisor para los trabajos periódicos en segundo plano del backend (sondeo, envío de alertas,
+volcado de métricas, retención). Cada trabajo corre como una tarea asyncio controlada por el ciclo
+de vida de la aplicación, se reinicia con backoff exponencial si falla y reporta su salud y latencia.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("raingauge-backend")
+
+JobFunc = Callable[[], Awaitable[Any]]
+
+class SupervisedTask:
+    """
+    A periodic job run by the supervisor, with its health bookkeeping.
+    Un trabajo periódico ejecutado por el supervisor, con su información de salud.
+    """
+    def __init__(self, name: str, func: JobFunc, interval: float,
+                 max_backoff: float = 300.0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.status = "pending"
+        self.runs = 0
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_run_at: Optional[datetime] = None
+        self.last_latency: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def backoff_delay(self) -> float:
+        """
+        Delay before the next attempt after consecutive failures (exponential, capped).
+        Espera antes del siguiente intento tras fallos consecutivos (exponencial, con tope).
+        """
+        base = max(self.interval, 1.0)
+        return min(base * (2 ** (self.consecutive_failures - 1)), self.max_backoff)
+
+    async def run_forever(self) -> None:
+        """
+        Run the job every `interval` seconds until cancelled, backing off on errors.
+        Ejecuta el trabajo cada `interval` segundos hasta ser cancelado, con backoff ante errores.
+        """
+        self.status = "running"
+        while True:
+            started = time.perf_counter()
+            try:
+                await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_latency = time.perf_counter() - started
+                self.last_run_at = datetime.utcnow()
+                self.consecutive_failures += 1
+                self.restarts += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.status = "backoff"
+                delay = self.backoff_delay()
+                logger.exception("Background task %s failed, restarting in %.1fs", self.name, delay)
+                await asyncio.sleep(delay)
+                continue
+            self.last_latency = time.perf_counter() - started
+            self.last_run_at = datetime.utcnow()
+            self.runs += 1
+            self.consecutive_failures = 0
+            self.status = "running"
+            await asyncio.sleep(self.interval)
+
+    def is_healthy(self) -> bool:
+        """
+        A task is healthy while running and not overdue by more than three intervals.
+        Una tarea está sana mientras corre y no lleva más de tres intervalos de retraso.
+        """
+        if self.status != "running" or self.last_run_at is None:
+            return False
+        overdue = (datetime.utcnow() - self.last_run_at).total_seconds()
+        return overdue <= max(self.interval, 1.0) * 3 + (self.last_latency or 0.0)
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Return a JSON-serializable health report for this task.
+        Retorna un reporte de salud serializable a JSON para esta tarea.
+        """
+        return {
+            "status": self.status,
+            "healthy": self.is_healthy(),
+            "interval": self.interval,
+            "runs": self.runs,
+            "restarts": self.restarts,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_latency_ms": round(self.last_latency * 1000, 2) if self.last_latency is not None else None,
+        }
+
+class TaskSupervisor:
+    """
+    Starts, restarts and cancels the registered background jobs.
+    Inicia, reinicia y cancela los trabajos en segundo plano registrados.
+    """
+    def __init__(self):
+        self.tasks: Dict[str, SupervisedTask] = {}
+
+    def add(self, name: str, func: JobFunc, interval: float, max_backoff: float = 300.0) -> SupervisedTask:
+        """
+        Register a job to be run every `interval` seconds once the supervisor starts.
+        Registra un trabajo para ejecutarse cada `interval` segundos cuando arranque el supervisor.
+        """
+        task = SupervisedTask(name, func, interval, max_backoff=max_backoff)
+        self.tasks[name] = task
+        return task
+
+    def start(self) -> None:
+        """
+        Launch every registered job on the running event loop.
+        Lanza cada trabajo registrado en el event loop actual.
+        """
+        for task in self.tasks.values():
+            if task._task is None or task._task.done():
+                self._launch(task)
+        logger.info("Background supervisor started: %s", ", ".join(self.tasks))
+
+    def _launch(self, task: SupervisedTask) -> None:
+        """
+        Create the asyncio task for a job and relaunch it if it ever dies unexpectedly.
+        Crea la tarea asyncio de un trabajo y la relanza si termina inesperadamente.
+        """
+        def on_done(fut: asyncio.Task) -> None:
+            if fut.cancelled():
+                return
+            logger.error("Background task %s exited: %r, relaunching", task.name, fut.exception())
+            task.restarts += 1
+            self._launch(task)
+
+        task._task = asyncio.create_task(task.run_forever(), name=f"supervised:{task.name}")
+        task._task.add_done_callback(on_done)
+
+    async def stop(self) -> None:
+        """
+        Cancel every job and wait for them to finish.
+        Cancela todos los trabajos y espera a que terminen.
+        """
+        running: List[asyncio.Task] = []
+        for task in self.tasks.values():
+            if task._task is not None and not task._task.done():
+                task._task.cancel()
+                running.append(task._task)
+        await asyncio.gather(*running, return_exceptions=True)
+        for task in self.tasks.values():
+            task.status = "stopped"
+        logger.info("Background supervisor stopped")
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Health report for all registered jobs, keyed by name.
+        Reporte de salud de todos los trabajos registrados, indexado por nombre.
+        """
+        return {name: task.health() for name, task in self.tasks.items()}
@@ -0,0 +1,84 @@
+"""
+bench_compression.py
+
+Measures compression ratio and CPU cost of the codecs available to the backend (gzip levels, brotli
+qualities when installed, and raw deflate as used by WebSocket permessage-deflate) on fleet-scale
+status, log and metric payloads, so bytes saved can be weighed against CPU time.
+
+Mide la tasa de compresión y el costo de CPU de los códecs disponibles en el backend (niveles gzip,
+calidades brotli si está instalado y deflate crudo como en permessage-deflate de WebSocket) sobre
+payloads de estado, logs y métricas a escala de flota, para comparar bytes ahorrados con tiempo de CPU.
+
+Usage / Uso (from backend/ / desde backend/):
+    python benchmarks/bench_compression.py --devices 1000
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import orjson
+from fleet_stub import FleetStub, device_ips
+from services.compression import brotli
+
+def deflate_raw(body: bytes, level: int) -> bytes:
+    """
+    Raw deflate stream, as produced by permessage-deflate for a WebSocket message.
+    Flujo deflate crudo, como el que produce permessage-deflate para un mensaje WebSocket.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def codecs() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    result = [(f"gzip-{level}", lambda b, level=level: gzip.compress(b, compresslevel=level)) for level in (1, 6, 9)]
+    result += [("ws-deflate-6", lambda b: deflate_raw(b, 6))]
+    if brotli is not None:
+        result += [(f"br-{q}", lambda b, q=q: brotli.compress(b, quality=q)) for q in (1, 4, 11)]
+    return result
+
+def payloads(devices: int) -> Dict[str, bytes]:
+    """
+    Representative response bodies for a fleet of `devices` gauges.
+    Cuerpos de respuesta representativos para una flota de `devices` pluviómetros.
+    """
+    stub = FleetStub(devices, port=0)
+    statuses = [{"ip": ip, **orjson.loads(stub.status_body(ip))["data"]} for ip in device_ips(devices)]
+    logs = [{"ip": ip, "logs": orjson.loads(stub.log_body())} for ip in device_ips(min(devices, 500))]
+    samples = 360
+    metrics = {
+        "timestamp": [f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}" for i in range(samples)],
+        "cpu": [round(10 + (i % 37) * 1.3, 1) for i in range(samples)],
+        "temp": [round(45 + (i % 11) * 0.4, 1) for i in range(samples)],
+    }
+    return {
+        "/api/v1/status": orjson.dumps(statuses),
+        "/log": orjson.dumps(logs),
+        "/devices/{id}/metrics": orjson.dumps(metrics),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compression benchmark / Benchmark de compresión")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"{'payload':<24} {'codec':<14} {'KB in':>10} {'KB out':>10} {'ratio':>7} {'ms':>8} {'MB/s':>8}")
+    for name, body in payloads(args.devices).items():
+        for codec, func in codecs():
+            best = float("inf")
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                out = func(body)
+                best = min(best, time.perf_counter() - started)
+            print(f"{name:<24} {codec:<14} {len(body) / 1024:>10.1f} {len(out) / 1024:>10.1f} "
+                  f"{len(body) / len(out):>6.1f}x {best * 1000:>8.2f} {len(body) / best / 1e6:>8.1f}")
+
+if __name__ == "__main__":
+    main()
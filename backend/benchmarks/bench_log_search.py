@@ -0,0 +1,116 @@
+"""
+bench_log_search.py
+
+Fills a temporary log archive (services/log_archive.py) with synthetic entries of a fleet over several
+days, measures the ingest rate and the effect of re-archiving the same logs (deduplication), then
+times typical searches: a rare term over the whole fleet, a common term, one device, 50 devices, a time
+range and a prefix.
+
+Llena un archivo de logs temporal (services/log_archive.py) con entradas sintéticas de una flota
+durante varios días, mide la tasa de ingesta y el efecto de volver a archivar los mismos logs
+(deduplicación), luego mide búsquedas típicas: un término raro en toda la flota, un término común, un
+dispositivo, 50 dispositivos, un rango de tiempo y un prefijo.
+
+Usage / Uso (from backend/ / desde backend/):
+    python benchmarks/bench_log_search.py --devices 1000 --days 14 --per-day 100
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_archive import LogArchive, DAY_SECONDS
+
+MESSAGES = [
+    "rain {v:.1f}mm in the last hour",
+    "battery {v:.2f}V",
+    "sensor read ok",
+    "uploaded batch of {n} readings",
+    "wifi signal {n}dBm",
+    "status ONLINE",
+]
+RARE_MESSAGES = [
+    "I/O error on /dev/mmcblk0p2 sector {n}",
+    "kernel: under-voltage detected",
+]
+
+def device_logs(rnd: random.Random, day_start: float, per_day: int) -> List[Dict[str, Any]]:
+    entries = []
+    for i in range(per_day):
+        ts = day_start + (i + rnd.random()) * DAY_SECONDS / per_day
+        pool = RARE_MESSAGES if rnd.random() < 0.002 else MESSAGES
+        entries.append({
+            "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+            "level": "ERROR" if pool is RARE_MESSAGES else "INFO",
+            "message": rnd.choice(pool).format(v=rnd.uniform(0, 15), n=rnd.randint(1, 99999)),
+        })
+    return entries
+
+def timed(func: Callable[[], Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(times), 2), "max_ms": round(max(times), 2),
+            "results": len(result["results"]), "partitions": result["partitions"]}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--per-day", type=int, default=100, help="log entries per device and day")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    path = os.path.join(tempfile.mkdtemp(prefix="raingauge-logs-"), "log_archive.db")
+    archive = LogArchive(path, retention_days=args.days + 1)
+    today = (time.time() // DAY_SECONDS) * DAY_SECONDS
+    first_day = today - (args.days - 1) * DAY_SECONDS
+    total = args.devices * args.days * args.per_day
+    started = time.perf_counter()
+    stored = 0
+    last_day: Dict[int, List[Dict[str, Any]]] = {}
+    for day in range(args.days):
+        for device_id in range(1, args.devices + 1):
+            last_day[device_id] = device_logs(rnd, first_day + day * DAY_SECONDS, args.per_day)
+            archive.record(device_id, last_day[device_id])
+        stored += archive.flush()["stored"]
+    elapsed = time.perf_counter() - started
+    print(f"ingest: {stored}/{total} entries in {elapsed:.1f} s ({stored / elapsed:,.0f} entries/s), "
+          f"{os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    # The last day again, as a collector re-fetching the same logs would / El último día otra vez, como un recolector que vuelve a obtener los mismos logs
+    started = time.perf_counter()
+    for device_id, entries in last_day.items():
+        archive.record(device_id, entries)
+    counts = archive.flush()
+    print(f"re-archive of the last day: {counts} in {time.perf_counter() - started:.2f} s")
+
+    device_ids = [rnd.randint(1, args.devices)]
+    group = rnd.sample(range(1, args.devices + 1), 50)
+    since = today - 2 * DAY_SECONDS
+    queries = {
+        "rare term, fleet": lambda: archive.search('"I/O error"'),
+        "rare term, limit 1000": lambda: archive.search("voltage", limit=1000),
+        "common term, fleet": lambda: archive.search("battery"),
+        "common term, one device": lambda: archive.search("battery", device_ids=device_ids),
+        "rare term, one device": lambda: archive.search("error", device_ids=device_ids),
+        "common term, 50 devices": lambda: archive.search("battery", device_ids=group),
+        "level filter, last 2 days": lambda: archive.search("level:ERROR", since=since),
+        "prefix, last 2 days": lambda: archive.search("mmcblk*", since=since),
+    }
+    for name, query in queries.items():
+        print(f"{name:32} {timed(query, args.repeat)}")
+
+if __name__ == "__main__":
+    main()
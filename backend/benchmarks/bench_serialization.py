@@ -0,0 +1,106 @@
+"""
+bench_serialization.py
+
+Compares the previous serialization path (Pydantic .dict()/jsonable_encoder + json) with the orjson
+path used by the REST routes and the WebSocket (row_to_dict + orjson), and the row format of metric
+series against the array-of-columns format.
+
+Compara la ruta de serialización anterior (Pydantic .dict()/jsonable_encoder + json) con la ruta
+orjson usada por las rutas REST y el WebSocket (row_to_dict + orjson), y el formato por filas de las
+series de métricas frente al formato de columnas.
+
+Usage / Uso (from backend/ / desde backend/):
+    python benchmarks/bench_serialization.py --devices 5000 --samples 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from models import Alert, Device, MetricHistory
+from services.serialization import dumps, rows_to_columns, rows_to_dicts
+
+def measure(func: Callable[[], bytes], repeat: int) -> Dict[str, Any]:
+    """
+    Best-of-`repeat` wall time (ms) and output size of a serialization function.
+    Mejor tiempo de `repeat` ejecuciones (ms) y tamaño de salida de una función de serialización.
+    """
+    best = float("inf")
+    output = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = func()
+        best = min(best, time.perf_counter() - started)
+    return {"ms": round(best * 1000, 2), "bytes": len(output)}
+
+def make_rows(devices: int, samples: int):
+    rnd = random.Random(1)
+    now = datetime.utcnow()
+    device_rows = [Device(id=i, name=f"Gauge {i}", ip=f"10.0.{i // 250}.{i % 250 + 1}", enabled=True)
+                   for i in range(devices)]
+    metric_rows = [MetricHistory(id=i, device_id=i % devices, timestamp=now - timedelta(seconds=i),
+                                 cpu=rnd.uniform(0, 100), ram=rnd.uniform(0, 100), disk=rnd.uniform(0, 100),
+                                 temp=rnd.uniform(30, 80), status="online") for i in range(samples)]
+    alert_rows = [Alert(id=i, device_id=i % devices, timestamp=now, level="CRITICAL",
+                        message=f"Raspberry Pi {i} está OFFLINE.") for i in range(devices // 10)]
+    statuses = [{"ip": d.ip, "hostname": f"gauge-{d.id}", "cpu": 12.5, "ram": 40.1, "disk": 55.0, "temp": 48.2,
+                 "battery": {"voltage": 12.7, "status": "OK"}, "meta": {"version": "1.0"}} for d in device_rows]
+    return device_rows, metric_rows, alert_rows, statuses
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serialization benchmark / Benchmark de serialización")
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    # The old path uses the deprecated .dict() on purpose / La ruta antigua usa .dict() (obsoleto) a propósito
+    warnings.simplefilter("ignore", DeprecationWarning)
+    devices, metrics, alerts, statuses = make_rows(args.devices, args.samples)
+    series = [(m.timestamp, m.cpu, m.ram, m.disk, m.temp, m.status) for m in metrics[: args.samples // 10]]
+    fields = ("timestamp", "cpu", "ram", "disk", "temp", "status")
+
+    cases = {
+        "status list (REST)": (
+            lambda: json.dumps(jsonable_encoder(statuses)).encode(),
+            lambda: dumps(statuses),
+        ),
+        "device list (REST)": (
+            lambda: json.dumps(jsonable_encoder(devices)).encode(),
+            lambda: dumps(rows_to_dicts(devices)),
+        ),
+        "ws frame": (
+            lambda: json.dumps(jsonable_encoder({
+                "devices": [d.dict() for d in devices],
+                "metrics": [m.dict() for m in metrics],
+                "alerts": [a.dict() for a in alerts],
+            })).encode(),
+            lambda: dumps({
+                "devices": rows_to_dicts(devices),
+                "metrics": rows_to_dicts(metrics),
+                "alerts": rows_to_dicts(alerts),
+            }),
+        ),
+        "metric series rows -> columns": (
+            lambda: dumps([dict(zip(fields, row)) for row in series]),
+            lambda: dumps(rows_to_columns(series, fields)),
+        ),
+    }
+    print(f"{'case':<32} {'old ms':>10} {'new ms':>10} {'speedup':>8} {'old KB':>10} {'new KB':>10}")
+    for name, (old, new) in cases.items():
+        before = measure(old, args.repeat)
+        after = measure(new, args.repeat)
+        speedup = before["ms"] / after["ms"] if after["ms"] else float("inf")
+        print(f"{name:<32} {before['ms']:>10} {after['ms']:>10} {speedup:>7.1f}x "
+              f"{before['bytes'] / 1024:>10.1f} {after['bytes'] / 1024:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+bench_startup.py
+
+Measures cold-start import time of the backend entry points (the API app, the database module used by
+the admin scripts, and the scripts themselves) with `python -X importtime`, each in a fresh interpreter
+against an empty temporary database, and lists the modules with the highest cumulative import time.
+
+Mide el tiempo de importación en frío de los puntos de entrada del backend (la app de la API, el módulo
+de base de datos que usan los scripts de administración y los propios scripts) con `python -X importtime`,
+cada uno en un intérprete nuevo contra una base temporal vacía, y lista los módulos con mayor tiempo
+de importación acumulado.
+
+Usage / Uso (from backend/ / desde backend/):
+    python benchmarks/bench_startup.py --runs 5 --top 15
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = ("main", "database", "create_local_user", "import_raspberry_ips", "promote_admin")
+
+def import_profile(module: str, workdir: str) -> Tuple[float, Dict[str, int]]:
+    """
+    Import `module` in a fresh interpreter. Returns the wall time (s) and the cumulative import time
+    (microseconds) of every module reported by -X importtime.
+    Importa `module` en un intérprete nuevo. Retorna el tiempo total (s) y el tiempo de importación
+    acumulado (microsegundos) de cada módulo reportado por -X importtime.
+    """
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, LOG_LEVEL="CRITICAL",
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", f"import {module}"],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    cumulative: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, total, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        cumulative[name] = max(cumulative.get(name, 0), int(total))
+    return elapsed, cumulative
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules listed for the app")
+    args = parser.parse_args()
+
+    slowest: List[Tuple[int, str]] = []
+    print(f"{'target':<22}{'wall median (ms)':>18}{'import (ms)':>14}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for target in TARGETS:
+            walls, imports = [], []
+            for _ in range(args.runs):
+                wall, cumulative = import_profile(target, workdir)
+                walls.append(wall)
+                imports.append(cumulative.get(target, 0))
+                if target == "main":
+                    slowest = sorted(((t, name) for name, t in cumulative.items()), reverse=True)
+            print(f"{target:<22}{statistics.median(walls) * 1000:>18.1f}{statistics.median(imports) / 1000:>14.1f}")
+
+    print(f"\nSlowest modules imported by main (cumulative) / Módulos más lentos importados por main (acumulado):")
+    for total, name in slowest[:args.top]:
+        print(f"  {total / 1000:>8.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()
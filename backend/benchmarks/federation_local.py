@@ -0,0 +1,186 @@
+"""
+federation_local.py
+
+Local federation check. Starts the simulated fleet, several peer backends (each with its own database
+and its own slice of the fleet, short SSE streams so they end and resume often) and a hub backend
+following them with FEDERATION_PEERS. It measures how long the hub takes to show every remote device
+in /api/v1/status and on a /ws/status subscription, checks that stream reconnects resume with
+Last-Event-ID (no new snapshots), then stops one peer, checks its devices turn stale, restarts it and
+checks the hub resynchronizes.
+
+Verificación local de la federación. Inicia la flota simulada, varios backends pares (cada uno con su
+propia base de datos y su parte de la flota, con flujos SSE cortos para que terminen y continúen a
+menudo) y un backend central que los sigue con FEDERATION_PEERS. Mide cuánto tarda el central en
+mostrar todos los dispositivos remotos en /api/v1/status y en una suscripción a /ws/status, comprueba
+que las reconexiones del flujo continúan con Last-Event-ID (sin instantáneas nuevas), luego detiene un
+par, comprueba que sus dispositivos quedan como viejos, lo reinicia y comprueba que el central se
+resincroniza.
+
+Usage / Uso (from backend/ / desde backend/):
+    python benchmarks/federation_local.py --peers 3 --devices 200
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+from fleet_stub import device_ips
+
+SEED_SCRIPT = """
+import sys
+from sqlmodel import Session
+from database import engine, init_db
+from models import Device
+init_db()
+with Session(engine) as session:
+    session.add_all([Device(name=f"Gauge {ip}", ip=ip, enabled=True) for ip in sys.argv[1:]])
+    session.commit()
+"""
+
+def backend_env(workdir: str, args: argparse.Namespace, **extra: str) -> Dict[str, str]:
+    return dict(os.environ, PYTHONPATH=BACKEND_DIR, LOG_LEVEL="CRITICAL",
+                DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'backend.db')}",
+                LOG_FILE_PATH=os.path.join(workdir, "backend.log"),
+                DEVICE_API_PORT=str(args.stub_port), MONITOR_INTERVAL=str(args.monitor_interval), **extra)
+
+def start_backend(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=env["LOG_FILE_PATH"].rsplit(os.sep, 1)[0], env=env,
+    )
+
+def wait_for(check: Callable[[], bool], timeout: float, step: float = 0.2) -> float:
+    """
+    Seconds until `check()` is true, or -1 after `timeout`.
+    Segundos hasta que `check()` sea verdadero, o -1 tras `timeout`.
+    """
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if check():
+                return round(time.perf_counter() - started, 2)
+        except Exception:
+            pass
+        time.sleep(step)
+    return -1
+
+def events_by_type(hub: str) -> Dict[str, float]:
+    import httpx
+
+    counts: Dict[str, float] = {}
+    for line in httpx.get(f"{hub}/metrics", timeout=5).text.splitlines():
+        if line.startswith("raingauge_federation_events_total{"):
+            labels, value = line.rsplit(" ", 1)
+            event = labels.split('event="', 1)[1].split('"', 1)[0]
+            counts[event] = counts.get(event, 0) + float(value)
+    return counts
+
+async def websocket_devices(url: str, peers: List[str], timeout: float) -> int:
+    """
+    Remote devices in the first status frame of a /ws/status subscription to `peers`.
+    Dispositivos remotos en el primer frame de estado de una suscripción a `peers` en /ws/status.
+    """
+    import orjson
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(orjson.dumps({"action": "subscribe", "peers": peers, "fields": ["cpu"], "interval": 1}).decode())
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            frame = orjson.loads(await asyncio.wait_for(ws.recv(), deadline - time.monotonic()))
+            if frame.get("type") == "status":
+                return sum(1 for s in frame["status"] if s.get("peer") in peers)
+    return 0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peers", type=int, default=3, help="peer backends")
+    parser.add_argument("--devices", type=int, default=200, help="devices per peer")
+    parser.add_argument("--stub-port", type=int, default=18000)
+    parser.add_argument("--port", type=int, default=18700, help="hub port; peers use the following ones")
+    parser.add_argument("--monitor-interval", type=float, default=2.0, help="MONITOR_INTERVAL of the peers")
+    parser.add_argument("--stream-seconds", type=float, default=5.0, help="SSE_MAX_STREAM_SECONDS of the peers")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    import httpx
+
+    hub = f"http://127.0.0.1:{args.port}"
+    ips = device_ips(args.peers * args.devices)
+    names = [f"net{i}" for i in range(args.peers)]
+    processes: List[subprocess.Popen] = []
+    peers: Dict[str, subprocess.Popen] = {}
+    peer_envs: Dict[str, Dict[str, str]] = {}
+    ok = True
+    try:
+        stub = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "fleet_stub.py"), "--devices",
+                                 str(len(ips)), "--port", str(args.stub_port)], stdout=subprocess.PIPE, text=True)
+        processes.append(stub)
+        stub.stdout.readline()  # READY line / línea READY
+        for i, name in enumerate(names):
+            workdir = tempfile.mkdtemp(prefix=f"raingauge-{name}-")
+            env = peer_envs[name] = backend_env(workdir, args, SSE_MAX_STREAM_SECONDS=str(args.stream_seconds))
+            subprocess.run([sys.executable, "-W", "ignore", "-c", SEED_SCRIPT,
+                            *ips[i * args.devices:(i + 1) * args.devices]], env=env, check=True)
+            peers[name] = start_backend(args.port + 1 + i, env)
+        peer_list = ",".join(f"{name}=http://127.0.0.1:{args.port + 1 + i}" for i, name in enumerate(names))
+        hub_process = start_backend(args.port, backend_env(tempfile.mkdtemp(prefix="raingauge-hub-"), args,
+                                                           FEDERATION_PEERS=peer_list))
+        processes.append(hub_process)
+        print(f"hub {hub} following {peer_list}")
+
+        def remote_online() -> int:
+            status = httpx.get(f"{hub}/api/v1/status", timeout=10).json()
+            return sum(1 for s in status if s.get("peer") and s.get("online") and not s.get("stale"))
+
+        total = len(ips)
+        seconds = wait_for(lambda: remote_online() == total, args.timeout)
+        print(f"/api/v1/status shows all {total} remote devices online after {seconds} s")
+        ok &= seconds >= 0
+        seen = asyncio.run(websocket_devices(f"ws://127.0.0.1:{args.port}/ws/status", names[:1], 10))
+        print(f"/ws/status subscription to {names[0]}: {seen}/{args.devices} devices")
+        ok &= seen == args.devices
+
+        before = events_by_type(hub)
+        time.sleep(args.stream_seconds * 2 + 1)
+        after = events_by_type(hub)
+        info = httpx.get(f"{hub}/health/federation", timeout=5).json()["peers"]
+        reconnects = sum(p["reconnects"] for p in info)
+        new_snapshots = after.get("snapshot", 0) - before.get("snapshot", 0)
+        print(f"stream reconnects {reconnects}, new snapshots {new_snapshots:.0f}, "
+              f"status events {after.get('status', 0) - before.get('status', 0):.0f}")
+        ok &= reconnects > 0 and new_snapshots == 0
+
+        victim = names[0]
+        peers[victim].terminate()
+        peers[victim].wait()
+
+        def stale_count() -> int:
+            status = httpx.get(f"{hub}/api/v1/status", timeout=10).json()
+            return sum(1 for s in status if s.get("peer") == victim and s.get("stale"))
+
+        seconds = wait_for(lambda: stale_count() == args.devices, args.timeout)
+        print(f"{victim} stopped: its {args.devices} devices stale after {seconds} s")
+        ok &= seconds >= 0
+        peers[victim] = start_backend(args.port + 1, peer_envs[victim])
+        seconds = wait_for(lambda: stale_count() == 0 and remote_online() == total, args.timeout)
+        print(f"{victim} restarted: hub resynchronized after {seconds} s")
+        ok &= seconds >= 0
+    finally:
+        for process in list(peers.values()) + processes:
+            process.terminate()
+        for process in list(peers.values()) + processes:
+            process.wait()
+    print("federation OK" if ok else "federation FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
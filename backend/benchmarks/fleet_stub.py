@@ -0,0 +1,151 @@
+"""
+fleet_stub.py
+
+Simulated fleet of Raspberry Pi rain gauges for benchmarks. A single asyncio server answers
+`/api/v1/status` and `/log` for N virtual devices on loopback addresses (127.1.x.y); the device is
+identified by the local address the client connected to. Latency, failures, hanging devices and
+payload size are configurable.
+
+Flota simulada de pluviómetros Raspberry Pi para benchmarks. Un único servidor asyncio responde
+`/api/v1/status` y `/log` para N dispositivos virtuales en direcciones de loopback (127.1.x.y); el
+dispositivo se identifica por la dirección local a la que se conectó el cliente. La latencia, los
+fallos, los dispositivos colgados y el tamaño del payload son configurables.
+
+Usage / Uso:
+    python benchmarks/fleet_stub.py --devices 1000 --port 18000 --latency 0.02 --failure-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+def device_ip(index: int) -> str:
+    """
+    Loopback address of the virtual device with the given index (Linux routes all of 127.0.0.0/8 to lo).
+    Dirección de loopback del dispositivo virtual con el índice dado (Linux enruta todo 127.0.0.0/8 a lo).
+    """
+    return f"127.1.{index // 250}.{index % 250 + 1}"
+
+def device_ips(count: int) -> List[str]:
+    """
+    Loopback addresses of the first `count` virtual devices.
+    Direcciones de loopback de los primeros `count` dispositivos virtuales.
+    """
+    return [device_ip(i) for i in range(count)]
+
+class FleetStub:
+    """
+    Asyncio HTTP/1.1 server emulating the status and log API of many Raspberry Pi devices.
+    Servidor HTTP/1.1 asyncio que emula la API de estado y logs de muchas Raspberry Pi.
+    """
+    def __init__(self, devices: int, port: int, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, hang_rate: float = 0.0, payload_bytes: int = 0,
+                 log_lines: int = 50, bind: str = "0.0.0.0", seed: int = 42):
+        self.devices = devices
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.payload_bytes = payload_bytes
+        self.log_lines = log_lines
+        self.bind = bind
+        self.random = random.Random(seed)
+        self.known_ips = set(device_ips(devices))
+        # Hanging devices accept TCP but never answer (half-alive Pi)
+        # Los dispositivos colgados aceptan TCP pero nunca responden (Pi medio viva)
+        self.hanging = {ip for ip in self.known_ips if self.random.random() < hang_rate}
+        self.requests = 0
+        self.server: asyncio.AbstractServer = None
+
+    def status_body(self, ip: str) -> bytes:
+        rnd = self.random
+        data = {
+            "hostname": f"gauge-{ip.replace('.', '-')}",
+            "cpu": round(rnd.uniform(1, 90), 1),
+            "ram": round(rnd.uniform(10, 80), 1),
+            "disk": round(rnd.uniform(20, 95), 1),
+            "temp": round(rnd.uniform(35, 75), 1),
+            "battery": {"voltage": round(rnd.uniform(11.5, 13.8), 2), "status": "OK"},
+            "rain": {"count": rnd.randint(0, 500), "mm": round(rnd.uniform(0, 40), 1)},
+            "gps": {"lat": -0.2 + rnd.uniform(-1, 1), "lon": -78.5 + rnd.uniform(-1, 1)},
+        }
+        if self.payload_bytes:
+            data["padding"] = "x" * self.payload_bytes
+        return json.dumps({"data": data, "meta": {"version": "1.0", "ts": datetime.utcnow().isoformat()}}).encode()
+
+    def log_body(self) -> bytes:
+        now = datetime.utcnow()
+        entries = [
+            {"timestamp": (now - timedelta(minutes=i)).isoformat(), "status": "ONLINE" if i % 7 else "OFFLINE"}
+            for i in range(self.log_lines)
+        ]
+        return json.dumps(entries).encode()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        ip = writer.get_extra_info("sockname")[0]
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.requests += 1
+                path = head.split(b" ", 2)[1].decode()
+                if ip in self.hanging:
+                    await asyncio.sleep(3600)
+                delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+                if delay:
+                    await asyncio.sleep(delay)
+                if ip not in self.known_ips or path not in ("/api/v1/status", "/log"):
+                    status, body = b"404 Not Found", b'{"detail":"Not Found"}'
+                elif self.random.random() < self.failure_rate:
+                    status, body = b"500 Internal Server Error", b'{"detail":"simulated failure"}'
+                elif path == "/log":
+                    status, body = b"200 OK", self.log_body()
+                else:
+                    status, body = b"200 OK", self.status_body(ip)
+                writer.write(
+                    b"HTTP/1.1 " + status + b"\r\nContent-Type: application/json\r\nContent-Length: "
+                    + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle, self.bind, self.port, backlog=4096)
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+async def serve(args: argparse.Namespace) -> None:
+    stub = FleetStub(args.devices, args.port, latency=args.latency, jitter=args.jitter,
+                     failure_rate=args.failure_rate, hang_rate=args.hang_rate,
+                     payload_bytes=args.payload_bytes, log_lines=args.log_lines, bind=args.bind)
+    await stub.start()
+    print(f"READY {args.devices} devices on port {args.port}", flush=True)
+    await asyncio.Event().wait()
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Simulated Raspberry Pi fleet / Flota Raspberry Pi simulada")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Base response latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of devices that never answer")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="Extra padding in each status payload")
+    parser.add_argument("--log-lines", type=int, default=50)
+    parser.add_argument("--bind", default="0.0.0.0", help="Listen address; must cover 127.1.0.0/16")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,255 @@
+"""
+run_fleet_benchmark.py
+
+Fleet-scale benchmark for the backend. For each fleet size it starts the simulated fleet
+(fleet_stub.py) in a separate process, registers the virtual devices in a temporary SQLite database,
+serves the FastAPI app with uvicorn on loopback and drives the poller, `/api/v1/status`, `/log` and
+`/ws/status`, reporting throughput, p50/p99 latency and backend memory (RSS).
+
+Benchmark a escala de flota para el backend. Para cada tamaño de flota inicia la flota simulada
+(fleet_stub.py) en un proceso aparte, registra los dispositivos virtuales en una base SQLite temporal,
+sirve la app FastAPI con uvicorn en loopback y ejercita el sondeo, `/api/v1/status`, `/log` y
+`/ws/status`, reportando throughput, latencia p50/p99 y memoria del backend (RSS).
+
+Usage / Uso (from backend/ / desde backend/):
+    python benchmarks/run_fleet_benchmark.py --sizes 10,100,1000,5000 --latency 0.02 --failure-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of values (0 for an empty list).
+    Percentil por rango más cercano de una lista de valores (0 si la lista está vacía).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """
+    Throughput and latency percentiles (ms) for a phase.
+    Throughput y percentiles de latencia (ms) para una fase.
+    """
+    return {
+        "count": len(latencies),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+def raise_fd_limit() -> None:
+    """
+    Raise the open-file limit: thousands of devices mean thousands of sockets.
+    Eleva el límite de archivos abiertos: miles de dispositivos implican miles de sockets.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+async def timed_requests(client, path: str, requests: int, concurrency: int) -> Dict[str, float]:
+    """
+    Issue `requests` GETs to `path` with bounded concurrency and summarize their latency.
+    Realiza `requests` GET a `path` con concurrencia acotada y resume su latencia.
+    """
+    latencies: List[float] = []
+    sizes: List[int] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+            sizes.append(len(response.content))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result["bytes"] = max(sizes) if sizes else 0
+    return result
+
+async def websocket_clients(url: str, clients: int) -> Dict[str, float]:
+    """
+    Connect `clients` WebSocket clients and measure the time until each receives its first frame.
+    Conecta `clients` clientes WebSocket y mide el tiempo hasta que cada uno recibe su primer frame.
+    """
+    import websockets
+
+    latencies: List[float] = []
+    sizes: List[int] = []
+
+    async def one() -> None:
+        started = time.perf_counter()
+        async with websockets.connect(url, max_size=None) as ws:
+            frame = await ws.recv()
+            latencies.append(time.perf_counter() - started)
+            sizes.append(len(frame))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(clients)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result["frame_bytes"] = max(sizes) if sizes else 0
+    return result
+
+async def run_single(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Benchmark one fleet size inside this process (the backend is imported here).
+    Ejecuta el benchmark de un tamaño de flota dentro de este proceso (aquí se importa el backend).
+    """
+    workdir = tempfile.mkdtemp(prefix="raingauge-bench-")
+    # Configuration is read at import time, so it must be set before importing the backend
+    # La configuración se lee al importar, así que debe fijarse antes de importar el backend
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["DEVICE_API_PORT"] = str(args.stub_port)
+    os.environ["LOG_FILE_PATH"] = os.path.join(workdir, "backend.log")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, BACKEND_DIR)
+    sys.path.insert(0, BENCH_DIR)
+
+    import httpx
+    import psutil
+    import uvicorn
+    from sqlmodel import Session
+    from fleet_stub import device_ips
+    import main
+    from models import Device
+    from database import engine
+    from background.ping_task import poll_devices
+    from background.metric_task import flush_metrics
+
+    process = psutil.Process()
+    peak_rss = process.memory_info().rss
+
+    def sample_rss() -> None:
+        nonlocal peak_rss
+        peak_rss = max(peak_rss, process.memory_info().rss)
+
+    with Session(engine) as session:
+        session.add_all([Device(name=f"Gauge {ip}", ip=ip, enabled=True) for ip in device_ips(args.single)])
+        session.commit()
+
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fleet_stub.py"), "--devices", str(args.single),
+         "--port", str(args.stub_port), "--latency", str(args.latency), "--jitter", str(args.jitter),
+         "--failure-rate", str(args.failure_rate), "--hang-rate", str(args.hang_rate),
+         "--payload-bytes", str(args.payload_bytes)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    server = None
+    serve_task = None
+    try:
+        stub.stdout.readline()  # READY line / línea READY
+        config = uvicorn.Config(main.app, host="127.0.0.1", port=args.api_port, lifespan="off",
+                                log_level="warning", backlog=4096)
+        server = uvicorn.Server(config)
+        serve_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        result: Dict[str, Any] = {"devices": args.single}
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            cycle = time.perf_counter()
+            await poll_devices()
+            latencies.append(time.perf_counter() - cycle)
+            sample_rss()
+        await flush_metrics()
+        poller = summarize(latencies, time.perf_counter() - started)
+        poller["devices_per_s"] = round(args.single * args.rounds / (time.perf_counter() - started), 1)
+        result["poller"] = poller
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.api_port}", limits=limits,
+                                     timeout=120) as client:
+            for path in ("/api/v1/status", "/log"):
+                result[path] = await timed_requests(client, path, args.rounds, args.concurrency)
+                sample_rss()
+        result["/ws/status"] = await websocket_clients(f"ws://127.0.0.1:{args.api_port}/ws/status",
+                                                       args.ws_clients)
+        sample_rss()
+        result["peak_rss_mb"] = round(peak_rss / (1024 * 1024), 1)
+        return result
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await serve_task
+        stub.terminate()
+        stub.wait()
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    """
+    Print a compact summary table of all fleet sizes.
+    Imprime una tabla resumida de todos los tamaños de flota.
+    """
+    header = f"{'devices':>8} {'phase':<15} {'thr/s':>9} {'p50 ms':>10} {'p99 ms':>10} {'bytes':>10} {'rss MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        for phase in ("poller", "/api/v1/status", "/log", "/ws/status"):
+            stats = result[phase]
+            size = stats.get("bytes", stats.get("frame_bytes", ""))
+            print(f"{result['devices']:>8} {phase:<15} {stats['throughput_per_s']:>9} {stats['p50_ms']:>10} "
+                  f"{stats['p99_ms']:>10} {size:>10} {result['peak_rss_mb']:>8}")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fleet-scale backend benchmark / Benchmark del backend a escala de flota")
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="Comma-separated fleet sizes")
+    parser.add_argument("--rounds", type=int, default=5, help="Poll cycles and requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent REST requests")
+    parser.add_argument("--ws-clients", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=0)
+    parser.add_argument("--stub-port", type=int, default=18000)
+    parser.add_argument("--api-port", type=int, default=18080)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    parser.add_argument("--single", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main() -> None:
+    args = parse_args()
+    raise_fd_limit()
+    if args.single is not None:
+        print(json.dumps(asyncio.run(run_single(args))))
+        return
+    results = []
+    passthrough = []
+    for name, value in vars(args).items():
+        if name in ("sizes", "single", "json"):
+            continue
+        passthrough += [f"--{name.replace('_', '-')}", str(value)]
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"Benchmarking {size} devices...", file=sys.stderr, flush=True)
+        # Each fleet size runs in a fresh process with its own database and imports
+        # Cada tamaño de flota corre en un proceso nuevo con su propia base de datos e imports
+        out = subprocess.run([sys.executable, __file__, *passthrough, "--single", str(size)],
+                             capture_output=True, text=True, cwd=BACKEND_DIR)
+        if out.returncode != 0:
+            print(out.stderr[-4000:], file=sys.stderr)
+            sys.exit(f"Benchmark for {size} devices failed")
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+if __name__ == "__main__":
+    main()
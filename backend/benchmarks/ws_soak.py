@@ -0,0 +1,171 @@
+"""
+ws_soak.py
+
+WebSocket lifecycle soak test. Opens thousands of /ws/status connections in batches and abandons
+them the ways real clients do: TCP reset without a close frame ("abort"), a socket that stays open
+but never reads or answers pings, like a laptop gone to sleep ("silent"), a clean close ("polite"),
+and a well-behaved client that answers pings ("pong"). It then waits for the idle timeout and checks
+in /metrics that the live connection gauge returns to its baseline and no connection leaked.
+
+Prueba de resistencia del ciclo de vida del WebSocket. Abre miles de conexiones a /ws/status por
+lotes y las abandona como lo hacen los clientes reales: reset TCP sin frame de cierre ("abort"), un
+socket que sigue abierto pero nunca lee ni responde pings, como un portátil suspendido ("silent"),
+un cierre limpio ("polite") y un cliente correcto que responde pings ("pong"). Luego espera el
+timeout de inactividad y comprueba en /metrics que el gauge de conexiones vuelve a su valor base y
+que no hubo fugas.
+
+Usage / Uso (from backend/ / desde backend/):
+    python benchmarks/ws_soak.py --spawn --connections 3000 --batch 250
+    python benchmarks/ws_soak.py --url http://127.0.0.1:8000 --wait 75   (running backend / backend en marcha)
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+MODES = ("abort", "silent", "polite", "pong")
+
+def read_metrics(url: str) -> Dict[str, float]:
+    """
+    WebSocket series from /metrics: live connections, leaks and disconnects by reason.
+    Series de WebSocket de /metrics: conexiones vivas, fugas y desconexiones por motivo.
+    """
+    import httpx
+
+    values: Dict[str, float] = {}
+    for line in httpx.get(f"{url}/metrics", timeout=10).text.splitlines():
+        if line.startswith(("raingauge_ws_connections ", "raingauge_ws_leaked_connections_total ",
+                            "raingauge_ws_disconnects_total{")):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+async def raw_upgrade(host: str, port: int) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Open a WebSocket with a hand-written handshake, so the socket can be abandoned at TCP level.
+    Abre un WebSocket con un handshake escrito a mano, para poder abandonar el socket a nivel TCP.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(
+        f"GET /ws/status HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode()
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    if b" 101 " not in head.split(b"\r\n", 1)[0]:
+        raise ConnectionError(head.split(b"\r\n", 1)[0].decode())
+    return reader, writer
+
+async def client(mode: str, url: str, hold: float, silent: List[asyncio.StreamWriter], errors: Dict[str, int]) -> None:
+    parsed = urlparse(url)
+    try:
+        if mode in ("abort", "silent"):
+            _, writer = await raw_upgrade(parsed.hostname, parsed.port or 80)
+            if mode == "abort":
+                writer.transport.abort()
+            else:
+                silent.append(writer)
+            return
+        import websockets
+
+        async with websockets.connect(f"ws://{parsed.hostname}:{parsed.port or 80}/ws/status", max_size=None,
+                                      ping_interval=None) as ws:
+            deadline = time.monotonic() + (hold if mode == "pong" else 0.2)
+            while time.monotonic() < deadline:
+                try:
+                    frame = await asyncio.wait_for(ws.recv(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+                if frame.startswith('{"type":"ping"'):
+                    await ws.send('{"action":"pong"}')
+    except Exception as e:
+        errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+def spawn_backend(port: int, args: argparse.Namespace) -> subprocess.Popen:
+    workdir = tempfile.mkdtemp(prefix="raingauge-soak-")
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, LOG_LEVEL="CRITICAL", MONITOR_INTERVAL="3600",
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'soak.db')}",
+               WS_PING_INTERVAL=str(args.ping_interval), WS_IDLE_TIMEOUT=str(args.idle_timeout),
+               WS_SEND_TIMEOUT="2", WS_MAX_CONNECTIONS=str(args.max_connections))
+    return subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "main:app", "--port", str(port),
+         "--backlog", "4096", "--log-level", "warning", "--ws-ping-interval", "0"],
+        cwd=workdir, env=env,
+    )
+
+async def soak(args: argparse.Namespace) -> bool:
+    import httpx
+
+    url = args.url
+    backend = None
+    if args.spawn:
+        url = f"http://127.0.0.1:{args.port}"
+        backend = spawn_backend(args.port, args)
+        for _ in range(100):
+            try:
+                httpx.get(url, timeout=1)
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    try:
+        before = read_metrics(url)
+        silent: List[asyncio.StreamWriter] = []
+        errors: Dict[str, int] = {}
+        started = time.perf_counter()
+        opened = 0
+        while opened < args.connections:
+            batch = min(args.batch, args.connections - opened)
+            await asyncio.gather(*(client(MODES[(opened + k) % len(MODES)], url, args.hold, silent, errors)
+                                   for k in range(batch)))
+            opened += batch
+            print(f"opened {opened}/{args.connections}: live {read_metrics(url).get('raingauge_ws_connections', 0):.0f}")
+        print(f"{opened} connections in {time.perf_counter() - started:.1f} s, client errors {errors or 'none'}")
+        wait = args.wait if args.wait is not None else args.idle_timeout + 35
+        print(f"waiting {wait:.0f} s for heartbeats and the reaper...")
+        await asyncio.sleep(wait)
+        after = read_metrics(url)
+        for writer in silent:
+            writer.transport.abort()
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait()
+
+    print(f"\n{'series':<60}{'before':>10}{'after':>10}")
+    for name in sorted(set(before) | set(after)):
+        print(f"{name:<60}{before.get(name, 0):>10.0f}{after.get(name, 0):>10.0f}")
+    live_ok = after.get("raingauge_ws_connections", 0) <= before.get("raingauge_ws_connections", 0)
+    leaks = after.get("raingauge_ws_leaked_connections_total", 0) - before.get("raingauge_ws_leaked_connections_total", 0)
+    print(f"\nlive connections back to baseline: {'yes' if live_ok else 'NO'}; leaked: {leaks:.0f}")
+    return live_ok and leaks == 0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="backend base URL (without --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="start a backend with short heartbeat timeouts")
+    parser.add_argument("--port", type=int, default=18600, help="port of the spawned backend")
+    parser.add_argument("--connections", type=int, default=3000)
+    parser.add_argument("--batch", type=int, default=250, help="connections opened concurrently")
+    parser.add_argument("--hold", type=float, default=5.0, help="seconds a 'pong' client stays connected")
+    parser.add_argument("--wait", type=float, default=None, help="seconds to wait before the final check")
+    parser.add_argument("--ping-interval", type=float, default=5.0, help="WS_PING_INTERVAL of the spawned backend")
+    parser.add_argument("--idle-timeout", type=float, default=15.0, help="WS_IDLE_TIMEOUT of the spawned backend")
+    parser.add_argument("--max-connections", type=int, default=1000, help="WS_MAX_CONNECTIONS of the spawned backend")
+    args = parser.parse_args()
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    sys.exit(0 if asyncio.run(soak(args)) else 1)
+
+if __name__ == "__main__":
+    main()
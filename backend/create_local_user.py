@@ -8,14 +8,12 @@ Script utilitario para crear un usuario local en la base de datos de Raspberry P
 Permite crear o reemplazar un usuario con contraseña local y rol especificado.
 """
 
-from sqlmodel import Session, create_engine, select
+from sqlmodel import Session, select
 from models import User
+from database import engine
 import bcrypt
 from typing import Optional
 
-DATABASE_URL = "sqlite:///raspberry.db"
-engine = create_engine(DATABASE_URL)
-
 def prompt_user_input() -> tuple[str, str, str]:
     """
     Prompt the user for the necessary data to create a local user.
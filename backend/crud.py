@@ -10,10 +10,14 @@ Incluye funciones para crear, leer, actualizar y eliminar dispositivos, usuarios
 Todas las funciones usan sesiones de SQLModel y validan unicidad donde corresponde.
 """
 
-from sqlmodel import Session, select
-from models import Device, MetricHistory, Alert, User
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from sqlmodel import Session, select, func, update
+from models import Device, DeviceGroup, MetricHistory, Alert, Incident, User, DeviceOperation
+from typing import List, Optional, Dict, Any, Iterable
+from datetime import datetime, timedelta
+from services.metrics import observe_db
+from services.group_aggregates import group_aggregates
+from services.http_cache import DEVICES, ALERTS
+from services.device_registry import device_registry
 
 # Get a new SQLModel session for the given engine
 # Obtener una nueva sesión de SQLModel para el engine dado
@@ -25,6 +29,7 @@ def get_session(engine) -> Session:
     return Session(engine)
 
 # Device CRUD / CRUD de dispositivos
+@observe_db
 def create_device(session: Session, device: Device) -> Device:
     """
     Create a new device in the database, ensuring the IP is unique.
@@ -36,8 +41,39 @@ def create_device(session: Session, device: Device) -> Device:
     session.add(device)
     session.commit()
     session.refresh(device)
+    device_registry.put(device)
+    group_aggregates.set_device(device)
+    DEVICES.bump()
     return device
 
+@observe_db
+def create_devices(session: Session, devices: List[Device]) -> List[Device]:
+    """
+    Insert many devices in one transaction, skipping IPs that already exist (or repeat in the batch).
+    Returns the created devices.
+
+    Inserta muchos dispositivos en una sola transacción, omitiendo las IPs que ya existen (o se repiten
+    en el lote). Retorna los dispositivos creados.
+    """
+    existing = set(session.exec(select(Device.ip).where(Device.ip.in_([d.ip for d in devices]))).all())
+    created = []
+    for device in devices:
+        if device.ip not in existing:
+            existing.add(device.ip)
+            created.append(device)
+    if not created:
+        return []
+    session.add_all(created)
+    session.commit()
+    # Reload the new rows with one query instead of a refresh per device / Recargar las filas nuevas con una consulta en lugar de un refresh por dispositivo
+    created = session.exec(select(Device).where(Device.ip.in_([d.ip for d in created])).order_by(Device.id)).all()
+    for device in created:
+        device_registry.put(device)
+        group_aggregates.set_device(device)
+    DEVICES.bump()
+    return created
+
+@observe_db
 def get_devices(session: Session) -> List[Device]:
     """
     Return a list of all devices in the database.
@@ -45,6 +81,7 @@ def get_devices(session: Session) -> List[Device]:
     """
     return session.exec(select(Device)).all()
 
+@observe_db
 def get_device(session: Session, device_id: int) -> Optional[Device]:
     """
     Return a device by its ID, or None if it does not exist.
@@ -52,6 +89,7 @@ def get_device(session: Session, device_id: int) -> Optional[Device]:
     """
     return session.get(Device, device_id)
 
+@observe_db
 def update_device(session: Session, device_id: int, device_data: Dict[str, Any]) -> Optional[Device]:
     """
     Update a device by its ID with the provided data.
@@ -65,8 +103,12 @@ def update_device(session: Session, device_id: int, device_data: Dict[str, Any])
     session.add(device)
     session.commit()
     session.refresh(device)
+    device_registry.put(device)
+    group_aggregates.set_device(device)
+    DEVICES.bump()
     return device
 
+@observe_db
 def delete_device(session: Session, device_id: int) -> bool:
     """
     Delete a device by its ID.
@@ -77,9 +119,102 @@ def delete_device(session: Session, device_id: int) -> bool:
         return False
     session.delete(device)
     session.commit()
+    device_registry.remove(device_id)
+    group_aggregates.remove_device(device_id)
+    DEVICES.bump()
+    return True
+
+# Device groups / Grupos de dispositivos
+def check_group_parent(session: Session, group_id: Optional[int], parent_id: Optional[int]) -> None:
+    """
+    Ensure the parent group exists and would not create a cycle.
+    Verifica que el grupo padre exista y que no se forme un ciclo.
+    """
+    seen = set()
+    while parent_id is not None:
+        if parent_id == group_id or parent_id in seen:
+            raise ValueError("A group cannot be its own ancestor")
+        seen.add(parent_id)
+        parent = session.get(DeviceGroup, parent_id)
+        if not parent:
+            raise ValueError("Parent group not found")
+        parent_id = parent.parent_id
+
+@observe_db
+def create_group(session: Session, group: DeviceGroup) -> DeviceGroup:
+    """
+    Create a new device group, validating its parent.
+    Crea un nuevo grupo de dispositivos, validando su padre.
+    """
+    check_group_parent(session, None, group.parent_id)
+    session.add(group)
+    session.commit()
+    session.refresh(group)
+    group_aggregates.load(session)
+    return group
+
+@observe_db
+def get_groups(session: Session) -> List[DeviceGroup]:
+    """
+    Return a list of all device groups.
+    Retorna una lista de todos los grupos de dispositivos.
+    """
+    return session.exec(select(DeviceGroup)).all()
+
+@observe_db
+def get_group(session: Session, group_id: int) -> Optional[DeviceGroup]:
+    """
+    Return a device group by its ID, or None if it does not exist.
+    Retorna un grupo de dispositivos por su ID, o None si no existe.
+    """
+    return session.get(DeviceGroup, group_id)
+
+@observe_db
+def update_group(session: Session, group_id: int, group_data: Dict[str, Any]) -> Optional[DeviceGroup]:
+    """
+    Update a device group by its ID with the provided data.
+    Actualiza un grupo de dispositivos por su ID con los datos proporcionados.
+    """
+    group = session.get(DeviceGroup, group_id)
+    if not group:
+        return None
+    if "parent_id" in group_data:
+        check_group_parent(session, group_id, group_data["parent_id"])
+    for key, value in group_data.items():
+        if key != "id":
+            setattr(group, key, value)
+    session.add(group)
+    session.commit()
+    session.refresh(group)
+    group_aggregates.load(session)
+    return group
+
+@observe_db
+def delete_group(session: Session, group_id: int) -> bool:
+    """
+    Delete a device group. Its devices are left without group and its subgroups move to its parent.
+    Elimina un grupo de dispositivos. Sus dispositivos quedan sin grupo y sus subgrupos pasan a su padre.
+    """
+    group = session.get(DeviceGroup, group_id)
+    if not group:
+        return False
+    devices = session.exec(select(Device).where(Device.group_id == group_id)).all()
+    for device in devices:
+        device.group_id = None
+        session.add(device)
+    for child in session.exec(select(DeviceGroup).where(DeviceGroup.parent_id == group_id)).all():
+        child.parent_id = group.parent_id
+        session.add(child)
+    session.delete(group)
+    session.commit()
+    for device in devices:
+        device_registry.put(device)
+    group_aggregates.load(session)
+    DEVICES.bump()
     return True
 
 # CRUD for users / CRUD de usuarios
+@observe_db
 def create_user(session: Session, user: User) -> User:
     """
     Create a new user in the database, ensuring the username is unique.
@@ -93,6 +228,7 @@ def create_user(session: Session, user: User) -> User:
     session.refresh(user)
     return user
 
+@observe_db
 def get_users(session: Session) -> List[User]:
     """
     Return a list of all users in the database.
@@ -100,6 +236,7 @@ def get_users(session: Session) -> List[User]:
     """
     return session.exec(select(User)).all()
 
+@observe_db
 def get_user(session: Session, user_id: int) -> Optional[User]:
     """
     Return a user by their ID, or None if not found.
@@ -107,6 +244,7 @@ def get_user(session: Session, user_id: int) -> Optional[User]:
     """
     return session.get(User, user_id)
 
+@observe_db
 def update_user(session: Session, user_id: int, user_data: Dict[str, Any]) -> Optional[User]:
     """
     Update a user by their ID with the provided data.
@@ -122,6 +260,7 @@ def update_user(session: Session, user_id: int, user_data: Dict[str, Any]) -> Op
     session.refresh(user)
     return user
 
+@observe_db
 def delete_user(session: Session, user_id: int) -> bool:
     """
     Delete a user by their ID.
@@ -136,33 +275,88 @@ def delete_user(session: Session, user_id: int) -> bool:
 
 
 # Alerts / Alertas
-def create_alert(session: Session, device_id: int, level: str, message: str) -> Alert:
+@observe_db
+def create_alert(session: Session, device_id: int, level: str, message: str, resolved: bool = False) -> Alert:
     """
-    Create a new alert for a device.
-    Crea una nueva alerta para un dispositivo.
+    Create a new alert for a device. resolved=True records a notice (e.g. a recovery) that is sent but never active.
+    Crea una nueva alerta para un dispositivo. resolved=True registra un aviso (p. ej. una recuperación) que se
+    envía pero nunca está activo.
     """
+    now = datetime.utcnow()
     alert = Alert(
         device_id=device_id,
         level=level,
         message=message,
-        timestamp=datetime.utcnow(),
-        resolved=False
+        timestamp=now,
+        resolved=resolved,
+        resolved_at=now if resolved else None
     )
     session.add(alert)
     session.commit()
     session.refresh(alert)
+    if not resolved:
+        group_aggregates.adjust_alerts(device_id, 1)
+    ALERTS.bump()
     return alert
 
-def get_alerts(session: Session, unresolved_only: bool = False) -> List[Alert]:
+def filter_alerts(query, device_id: Optional[int] = None, level: Optional[str] = None,
+                  start: Optional[datetime] = None, end: Optional[datetime] = None):
     """
-    Return a list of alerts, optionally only unresolved ones.
-    Retorna una lista de alertas, opcionalmente solo las no resueltas.
+    Apply the common alert filters (device, level, time range) to a select/update statement.
+    Aplica los filtros comunes de alertas (dispositivo, nivel, rango de tiempo) a una sentencia select/update.
     """
-    query = select(Alert)
+    if device_id is not None:
+        query = query.where(Alert.device_id == device_id)
+    if level:
+        query = query.where(Alert.level == level)
+    if start:
+        query = query.where(Alert.timestamp >= start)
+    if end:
+        query = query.where(Alert.timestamp <= end)
+    return query
+
+@observe_db
+def get_alerts(session: Session, unresolved_only: bool = False, device_id: Optional[int] = None,
+               level: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               before: Optional[int] = None, limit: Optional[int] = None) -> List[Alert]:
+    """
+    Return alerts newest first, optionally only unresolved ones and filtered by device, level and time.
+    Keyset pagination: pass limit and, for the next page, before=<ID of the last alert received>.
+
+    Retorna las alertas de la más reciente a la más antigua, opcionalmente solo las no resueltas y
+    filtradas por dispositivo, nivel y tiempo. Paginación por clave: pasar limit y, para la página
+    siguiente, before=<ID de la última alerta recibida>.
+    """
+    query = filter_alerts(select(Alert), device_id, level, start, end)
     if unresolved_only:
         query = query.where(Alert.resolved == False)
-    return session.exec(query.order_by(Alert.timestamp.desc())).all()
+    if before is not None:
+        query = query.where(Alert.id < before)
+    query = query.order_by(Alert.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return session.exec(query).all()
+
+@observe_db
+def resolve_alerts(session: Session, device_id: Optional[int] = None, level: Optional[str] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """
+    Resolve every open alert matching the filters with a single UPDATE. Returns the number resolved.
+    Resuelve con un solo UPDATE todas las alertas abiertas que cumplen los filtros. Retorna cuántas se resolvieron.
+    """
+    open_alerts = filter_alerts(select(Alert.device_id, func.count()), device_id, level, start, end)
+    per_device = session.exec(open_alerts.where(Alert.resolved == False).group_by(Alert.device_id)).all()
+    if not per_device:
+        return 0
+    statement = filter_alerts(update(Alert), device_id, level, start, end).where(Alert.resolved == False)
+    result = session.execute(statement.values(resolved=True, resolved_at=datetime.utcnow()))
+    session.commit()
+    for alert_device_id, count in per_device:
+        group_aggregates.adjust_alerts(alert_device_id, -count)
+    ALERTS.bump()
+    return result.rowcount
 
+@observe_db
 def resolve_alert(session: Session, alert_id: int) -> bool:
     """
     Mark an alert as resolved by its ID.
@@ -171,7 +365,211 @@ def resolve_alert(session: Session, alert_id: int) -> bool:
     alert = session.get(Alert, alert_id)
     if not alert:
         return False
+    was_open = not alert.resolved
     alert.resolved = True
+    if was_open:
+        alert.resolved_at = datetime.utcnow()
     session.add(alert)
     session.commit()
+    if was_open:
+        group_aggregates.adjust_alerts(alert.device_id, -1)
+    ALERTS.bump()
     return True
+
+def recovery_notified(alert: Alert) -> bool:
+    """
+    Whether resolving this alert announces the recovery: only alerts raised once and not part of an incident
+    (flaps and incident members get no separate recovery notice).
+    Si resolver esta alerta anuncia la recuperación: solo alertas señaladas una vez y fuera de un incidente
+    (los aleteos y miembros de incidentes no reciben aviso de recuperación propio).
+    """
+    return alert.occurrences == 1 and alert.incident_id is None
+
+@observe_db
+def open_alert(session: Session, device_id: int, condition: str, level: str, message: str,
+               reopen_within: timedelta, recovery_notices: bool = False) -> Alert:
+    """
+    Raise a condition on a device. If an alert for it is open, count one more occurrence; if the last one
+    was resolved less than `reopen_within` ago (a flap), reopen it; otherwise create a new alert.
+    Reopened alerts keep their Telegram state, so flapping is not notified again, except when the condition
+    has `recovery_notices` and the recovery was announced: then the new drop is notified again.
+
+    Señala una condición en un dispositivo. Si hay una alerta abierta para ella, cuenta una ocurrencia más;
+    si la última se resolvió hace menos de `reopen_within` (un aleteo), la reabre; si no, crea una nueva.
+    Las alertas reabiertas conservan su estado de Telegram, así el aleteo no se notifica de nuevo, salvo
+    cuando la condición tiene `recovery_notices` y la recuperación se anunció: entonces la nueva caída se
+    notifica otra vez.
+    """
+    now = datetime.utcnow()
+    alert = session.exec(
+        select(Alert).where(Alert.device_id == device_id, Alert.condition == condition).order_by(Alert.id.desc()).limit(1)
+    ).first()
+    if alert is not None and not alert.resolved:
+        alert.occurrences += 1
+    elif alert is not None and alert.resolved_at is not None and now - alert.resolved_at <= reopen_within:
+        if recovery_notices and recovery_notified(alert):
+            # The last notice said it recovered / El último aviso dijo que se recuperó
+            alert.sent_to_telegram = False
+            alert.telegram_error = None
+        alert.resolved = False
+        alert.resolved_at = None
+        alert.occurrences += 1
+        group_aggregates.adjust_alerts(device_id, 1)
+    else:
+        alert = Alert(device_id=device_id, level=level, message=message, timestamp=now, condition=condition)
+        group_aggregates.adjust_alerts(device_id, 1)
+    alert.last_seen = now
+    session.add(alert)
+    session.commit()
+    session.refresh(alert)
+    ALERTS.bump()
+    return alert
+
+@observe_db
+def resolve_condition(session: Session, device_ids: Iterable[int], condition: str) -> List[Alert]:
+    """
+    Auto-resolve the open alerts of a condition for the given devices (on recovery). Returns the resolved alerts.
+    Resuelve automáticamente las alertas abiertas de una condición para los dispositivos dados (al recuperarse).
+    Retorna las alertas resueltas.
+    """
+    device_ids = list(device_ids)
+    if not device_ids:
+        return []
+    alerts = session.exec(
+        select(Alert).where(Alert.device_id.in_(device_ids), Alert.condition == condition, Alert.resolved == False)
+    ).all()
+    if not alerts:
+        return []
+    now = datetime.utcnow()
+    for alert in alerts:
+        alert.resolved = True
+        alert.resolved_at = now
+        session.add(alert)
+    session.commit()
+    for alert in alerts:
+        group_aggregates.adjust_alerts(alert.device_id, -1)
+    ALERTS.bump()
+    return alerts
+
+# Incidents / Incidentes
+@observe_db
+def get_incidents(session: Session, unresolved_only: bool = False) -> List[Incident]:
+    """
+    Return a list of incidents, newest first, optionally only unresolved ones.
+    Retorna una lista de incidentes, los más recientes primero, opcionalmente solo los no resueltos.
+    """
+    query = select(Incident)
+    if unresolved_only:
+        query = query.where(Incident.resolved == False)
+    return session.exec(query.order_by(Incident.opened_at.desc())).all()
+
+@observe_db
+def link_incident(session: Session, scope: str, key: str, condition: str, message: str,
+                  device_ids: List[int]) -> Incident:
+    """
+    Open (or reuse) the incident of a scope key and attach the open alerts of the given devices to it.
+    Linked alerts are marked as sent so only the incident is notified to Telegram.
+
+    Abre (o reutiliza) el incidente de una clave de alcance y le asocia las alertas abiertas de los
+    dispositivos dados. Las alertas asociadas se marcan como enviadas para notificar a Telegram solo el incidente.
+    """
+    now = datetime.utcnow()
+    incident = session.exec(
+        select(Incident).where(Incident.scope == scope, Incident.key == key, Incident.resolved == False)
+    ).first()
+    if incident is None:
+        incident = Incident(scope=scope, key=key, condition=condition, message=message, opened_at=now)
+    elif not incident.sent_to_telegram:
+        incident.message = message
+    alerts = session.exec(
+        select(Alert).where(Alert.device_id.in_(device_ids), Alert.condition == condition, Alert.resolved == False)
+    ).all()
+    session.add(incident)
+    session.flush()
+    for alert in alerts:
+        if alert.incident_id != incident.id:
+            alert.incident_id = incident.id
+            alert.sent_to_telegram = True
+            session.add(alert)
+            incident.device_count += 1
+            incident.last_seen = now
+    session.commit()
+    session.refresh(incident)
+    ALERTS.bump()
+    return incident
+
+@observe_db
+def resolve_finished_incidents(session: Session) -> List[Incident]:
+    """
+    Resolve the open incidents whose linked alerts are all resolved.
+    Resuelve los incidentes abiertos cuyas alertas asociadas están todas resueltas.
+    """
+    finished = session.exec(
+        select(Incident).where(Incident.resolved == False).where(
+            ~select(Alert.id).where(Alert.incident_id == Incident.id, Alert.resolved == False).exists()
+        )
+    ).all()
+    if not finished:
+        return []
+    now = datetime.utcnow()
+    for incident in finished:
+        incident.resolved = True
+        incident.resolved_at = now
+        session.add(incident)
+    session.commit()
+    ALERTS.bump()
+    return finished
+
+# Device operations / Operaciones sobre dispositivos
+@observe_db
+def create_operation(session: Session, operation: DeviceOperation) -> DeviceOperation:
+    """
+    Persist a new device operation record.
+    Persiste un nuevo registro de operación sobre dispositivos.
+    """
+    session.add(operation)
+    session.commit()
+    session.refresh(operation)
+    return operation
+
+@observe_db
+def get_operations(session: Session, limit: int = 50, before: Optional[int] = None) -> List[DeviceOperation]:
+    """
+    Return device operations newest first; the next page is requested with before=<last ID received>.
+    Retorna las operaciones sobre dispositivos de la más reciente a la más antigua; la página siguiente
+    se pide con before=<último ID recibido>.
+    """
+    query = select(DeviceOperation)
+    if before is not None:
+        query = query.where(DeviceOperation.id < before)
+    return session.exec(query.order_by(DeviceOperation.id.desc()).limit(limit)).all()
+
+@observe_db
+def get_operation(session: Session, operation_id: int) -> Optional[DeviceOperation]:
+    """
+    Get a device operation by its ID.
+    Obtiene una operación sobre dispositivos por su ID.
+    """
+    return session.get(DeviceOperation, operation_id)
+
+@observe_db
+def update_operation(session: Session, operation_id: int, values: Dict[str, Any]) -> None:
+    """
+    Write progress counters, status or results of a device operation in one statement.
+    Escribe en una sola sentencia los contadores de progreso, el estado o los resultados de una operación.
+    """
+    session.execute(update(DeviceOperation).where(DeviceOperation.id == operation_id).values(**values))
+    session.commit()
+
+@observe_db
+def interrupt_operations(session: Session) -> int:
+    """
+    Mark operations left 'running' by a previous process as 'interrupted'. Returns how many were marked.
+    Marca como 'interrupted' las operaciones que un proceso anterior dejó en 'running'. Retorna cuántas se marcaron.
+    """
+    result = session.execute(
+        update(DeviceOperation).where(DeviceOperation.status == "running")
+        .values(status="interrupted", finished_at=datetime.utcnow())
+    )
+    session.commit()
+    return result.rowcount
@@ -0,0 +1,36 @@
+"""
+database.py
+
+Database engine and schema initialization for the Raspberry Pi Dashboard backend.
+Importing this module only builds the engine (no connection, no DDL); tables are created and upgraded
+explicitly by `init_db`, called from the app factory (unless DB_AUTO_MIGRATE=false) or `migrate.py`.
+Admin scripts import this module instead of the API modules, so they skip the FastAPI import chain.
+
+Engine de base de datos e inicialización del esquema para el backend de Raspberry Pi Dashboard.
+Importar este módulo solo construye el engine (sin conexión ni DDL); las tablas se crean y actualizan
+explícitamente con `init_db`, llamada desde la fábrica de la app (salvo DB_AUTO_MIGRATE=false) o `migrate.py`.
+Los scripts de administración importan este módulo en lugar de los módulos de la API, así evitan la
+cadena de imports de FastAPI.
+"""
+
+import os
+from sqlmodel import SQLModel, create_engine
+# Imported to register the tables in SQLModel.metadata / Importado para registrar las tablas en SQLModel.metadata
+import models
+from services.schema_migrations import upgrade_schema
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///raspberry.db")
+# SQL echo is off by default: logging every statement dominates request time at fleet scale
+# El eco de SQL está desactivado por defecto: registrar cada sentencia domina el tiempo de petición a escala
+SQL_ECHO = os.environ.get("SQL_ECHO", "false").lower() in ("1", "true", "yes")
+DB_AUTO_MIGRATE = os.environ.get("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+engine = create_engine(DATABASE_URL, echo=SQL_ECHO)
+
+def init_db(bind=engine) -> None:
+    """
+    Create tables if they do not exist and add columns/indexes missing in older databases.
+    Crea las tablas si no existen y agrega columnas/índices que faltan en bases anteriores.
+    """
+    SQLModel.metadata.create_all(bind)
+    upgrade_schema(bind)
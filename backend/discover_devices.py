@@ -0,0 +1,57 @@
+"""
+discover_devices.py
+
+Utility script to find Raspberry Pi gauges on the network: sweeps CIDR ranges for hosts answering
+/api/v1/status on DEVICE_API_PORT and prints a summary. With --add the new hosts are inserted in bulk.
+
+Script utilitario para encontrar pluviómetros Raspberry Pi en la red: recorre rangos CIDR buscando hosts
+que respondan /api/v1/status en DEVICE_API_PORT e imprime un resumen. Con --add los hosts nuevos se
+insertan en bloque.
+
+Usage / Uso:
+    python discover_devices.py 10.0.0.0/16 192.168.1.0/24 [--add] [--concurrency 512]
+    (without ranges, DISCOVERY_CIDRS is used / sin rangos se usa DISCOVERY_CIDRS)
+"""
+
+import argparse
+import asyncio
+from sqlmodel import Session, select
+from models import Device
+from database import engine, init_db
+from dotenv import load_dotenv
+
+def main() -> None:
+    """
+    Main entry point for the script. Sweeps the ranges and optionally registers the hosts found.
+    Punto de entrada principal del script. Recorre los rangos y opcionalmente registra los hosts encontrados.
+    """
+    load_dotenv()
+    # Imported after load_dotenv so DISCOVERY_* and DEVICE_API_PORT from .env apply
+    # Importado tras load_dotenv para que apliquen DISCOVERY_* y DEVICE_API_PORT del .env
+    from services.discovery import DiscoverySweep, DISCOVERY_CIDRS, DISCOVERY_CONCURRENCY, add_devices, summary_message
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cidrs", nargs="*", help="CIDR ranges to sweep (default: DISCOVERY_CIDRS)")
+    parser.add_argument("--add", action="store_true", help="register the new hosts")
+    parser.add_argument("--concurrency", type=int, default=DISCOVERY_CONCURRENCY, help="probes in flight")
+    args = parser.parse_args()
+    cidrs = args.cidrs or DISCOVERY_CIDRS
+    if not cidrs:
+        parser.error("no CIDR ranges given and DISCOVERY_CIDRS is empty")
+
+    init_db()
+    with Session(engine) as session:
+        known = set(session.exec(select(Device.ip)).all())
+        try:
+            sweep = DiscoverySweep(cidrs, known, args.concurrency)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Sweeping {sweep.total} addresses with {sweep.concurrency} concurrent probes...")
+        found = asyncio.run(sweep.run())
+        summary = sweep.summary()
+        if args.add and found:
+            summary["added"] = [device.ip for device in add_devices(session, found)]
+    print(summary_message(summary))
+
+if __name__ == "__main__":
+    main()
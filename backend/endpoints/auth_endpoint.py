@@ -12,12 +12,13 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from sqlmodel import Session, select
 from models import User
-from endpoints.device_endpoint import engine
+from database import engine
 import bcrypt
 import jwt
 import os
 from datetime import datetime, timedelta
 from typing import Dict
+from services.request_timing import trace
 
 JWT_SECRET = os.environ.get("JWT_SECRET", "supersecretjwtkey")
 JWT_ALGORITHM = "HS256"
@@ -53,7 +54,9 @@ def local_login(data: LoginRequest) -> Dict[str, str]:
             raise HTTPException(status_code=401, detail="User not found")
         if not user.password_hash:
             raise HTTPException(status_code=401, detail="No local password set for this user")
-        if not bcrypt.checkpw(data.password.encode(), user.password_hash.encode()):
+        with trace("auth"):
+            valid = bcrypt.checkpw(data.password.encode(), user.password_hash.encode())
+        if not valid:
             raise HTTPException(status_code=401, detail="Incorrect password")
         payload = {
             "sub": data.username,
@@ -0,0 +1,60 @@
+"""
+debug_endpoint.py
+
+Admin endpoints to profile the running backend: a time-boxed sampling CPU profile (JSON summary or
+collapsed stacks for flame graph tools) and a tracemalloc memory snapshot.
+
+Endpoints de administración para perfilar el backend en ejecución: un perfil de CPU por muestreo de
+duración acotada (resumen JSON o pilas colapsadas para herramientas de flame graphs) y una
+instantánea de memoria con tracemalloc.
+"""
+
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Any, Literal
+from models import User
+from endpoints.user_endpoint import admin_required
+from services.profiling import sample_stacks, memory_snapshot, PROFILE_MAX_SECONDS
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+@router.get("/profile")
+async def read_profile(
+    seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS),
+    interval: float = Query(0.005, gt=0, le=1),
+    format: Literal["json", "collapsed"] = "json",
+    idle: bool = False,
+    top: int = Query(30, ge=1, le=500),
+    admin: User = Depends(admin_required),
+):
+    """
+    Sample the stacks of every thread for `seconds`. `format=collapsed` returns one "stack count" line per
+    stack (flamegraph.pl, speedscope); `idle=true` keeps samples of threads waiting for work.
+    Muestrea las pilas de todos los hilos durante `seconds`. `format=collapsed` retorna una línea "pila conteo"
+    por pila (flamegraph.pl, speedscope); `idle=true` conserva las muestras de hilos esperando trabajo.
+    """
+    try:
+        profile = await asyncio.to_thread(sample_stacks, seconds, interval, idle, top)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return PlainTextResponse(profile["collapsed"] + "\n")
+    profile.pop("collapsed")
+    return profile
+
+@router.get("/memory", response_model=Dict[str, Any])
+async def read_memory(
+    seconds: float = Query(5.0, ge=0, le=PROFILE_MAX_SECONDS),
+    top: int = Query(25, ge=1, le=500),
+    group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+    admin: User = Depends(admin_required),
+) -> Dict[str, Any]:
+    """
+    tracemalloc snapshot: largest allocation sites and their growth over `seconds`.
+    Instantánea tracemalloc: sitios con más memoria asignada y su crecimiento durante `seconds`.
+    """
+    try:
+        return await memory_snapshot(seconds, top, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
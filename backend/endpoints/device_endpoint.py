@@ -8,24 +8,28 @@ Endpoints para la gestión de dispositivos en el backend de Raspberry Pi Dashboa
 Incluye operaciones CRUD, métricas y alertas.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import SQLModel, create_engine, Session, select
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from pydantic import BaseModel
+from sqlmodel import Session, select, func
 from typing import List, Optional, Dict, Any
-from models import Device, MetricHistory, Alert
+from models import Device, MetricHistory, Metric, MetricSample, Alert, Incident
 import crud
-from datetime import datetime
+from datetime import datetime, timezone
 from auth_utils import get_current_user
-from utils import send_telegram_alert
+from utils import send_telegram_alert, escape_markdown
+from database import engine
+from services.serialization import ORJSONResponse, row_to_dict, rows_to_dicts, rows_to_columns
+from services.http_cache import DEVICES, ALERTS, cached_json_response
+from services.device_registry import device_registry
+from services.payload_schema import metric_catalog
+from services.ring_buffer import metric_rings, RING_FIELDS
+from services.forecast import forecasts
+import asyncio
+import hashlib
 import logging
+import time
 logger = logging.getLogger(__name__)
 
-DATABASE_URL = "sqlite:///raspberry.db"
-engine = create_engine(DATABASE_URL, echo=True)
-
-# Create tables if they do not exist
-# Crear tablas si no existen
-SQLModel.metadata.create_all(engine)
-
 def get_session():
     """
     Generator for database sessions for dependency injection.
@@ -46,7 +50,6 @@ async def create_device(device: Device, session: Session = Depends(get_session),
         created = crud.create_device(session, device)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    from utils import escape_markdown
     description = escape_markdown(device.description if device.description not in (None, "", "null") else "-")
     enabled = escape_markdown("Yes" if getattr(device, 'enabled', True) else "No")
     msg = (
@@ -60,20 +63,70 @@ async def create_device(device: Device, session: Session = Depends(get_session),
     return created
 
 @router.get("/", response_model=List[Device])
-def read_devices(session: Session = Depends(get_session)) -> List[Device]:
+def read_devices(request: Request, session: Session = Depends(get_session)) -> List[Device]:
     """
-    List all registered devices.
-    Lista todos los dispositivos registrados.
+    List all registered devices. Supports If-None-Match/If-Modified-Since (304 when unchanged).
+    Lista todos los dispositivos registrados. Admite If-None-Match/If-Modified-Since (304 si no hubo cambios).
     """
-    return crud.get_devices(session)
+    return cached_json_response(request, DEVICES, "all", lambda: rows_to_dicts(device_registry.all()))
+
+ALERT_PAGE_MAX = 1000
 
 @router.get("/alerts", response_model=List[Alert])
-def get_alerts(session: Session = Depends(get_session), unresolved_only: bool = False) -> List[Alert]:
+def get_alerts(request: Request, session: Session = Depends(get_session), unresolved_only: bool = False,
+               device_id: Optional[int] = None, level: Optional[str] = None,
+               start: Optional[datetime] = None, end: Optional[datetime] = None,
+               before: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=ALERT_PAGE_MAX)) -> List[Alert]:
+    """
+    List alerts newest first, optionally only unresolved ones and filtered by device, level and time range.
+    With limit, the next page is requested with before=<ID of the last alert received>.
+    Supports If-None-Match/If-Modified-Since (304 when unchanged).
+
+    Lista las alertas de la más reciente a la más antigua, opcionalmente solo las no resueltas y filtradas por
+    dispositivo, nivel y rango de tiempo. Con limit, la página siguiente se pide con before=<ID de la última
+    alerta recibida>. Admite If-None-Match/If-Modified-Since (304 si no hubo cambios).
+    """
+    filters = dict(unresolved_only=unresolved_only, device_id=device_id, level=level, start=start, end=end,
+                   before=before, limit=limit)
+    # Hashed so raw filter values (spaces, quotes) never reach the ETag / Con hash para que los valores crudos de los filtros (espacios, comillas) nunca lleguen al ETag
+    variant = hashlib.blake2b("&".join(f"{k}={v}" for k, v in filters.items()).encode(), digest_size=12).hexdigest()
+    return cached_json_response(
+        request, ALERTS, variant,
+        lambda: rows_to_dicts(crud.get_alerts(session, **filters)),
+    )
+
+class AlertFilter(BaseModel):
     """
-    List all alerts, optionally only unresolved ones.
-    Lista todas las alertas, opcionalmente solo las no resueltas.
+    Filters of a bulk resolve; at least one is required.
+    Filtros de una resolución masiva; se requiere al menos uno.
     """
-    return crud.get_alerts(session, unresolved_only=unresolved_only)
+    device_id: Optional[int] = None
+    level: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+@router.post("/alerts/resolve", response_model=Dict[str, Any])
+def resolve_alerts(filters: AlertFilter, session: Session = Depends(get_session),
+                   user: str = Depends(get_current_user)) -> Dict[str, Any]:
+    """
+    Resolve every open alert matching the filters in one statement.
+    Resuelve en una sola sentencia todas las alertas abiertas que cumplen los filtros.
+    """
+    values = filters.model_dump()
+    if all(v is None for v in values.values()):
+        raise HTTPException(status_code=400, detail="At least one filter is required")
+    return {"ok": True, "resolved": crud.resolve_alerts(session, **values)}
+
+@router.get("/incidents", response_model=List[Incident])
+def get_incidents(request: Request, session: Session = Depends(get_session), unresolved_only: bool = False) -> List[Incident]:
+    """
+    List correlated incidents (e.g. a whole subnet offline), newest first. Same caching as /alerts.
+    Lista los incidentes correlacionados (p. ej. una subred entera offline), los más recientes primero. Mismo caché que /alerts.
+    """
+    return cached_json_response(
+        request, ALERTS, f"incidents:unresolved={unresolved_only}",
+        lambda: rows_to_dicts(crud.get_incidents(session, unresolved_only=unresolved_only)),
+    )
 
 @router.post("/alerts/{alert_id}/resolve", response_model=Dict[str, Any])
 def resolve_alert(alert_id: int, session: Session = Depends(get_session), user: str = Depends(get_current_user)) -> Dict[str, Any]:
@@ -86,16 +139,24 @@ def resolve_alert(alert_id: int, session: Session = Depends(get_session), user:
         raise HTTPException(status_code=404, detail="Alert not found")
     return {"ok": True}
 
+@router.get("/metric-names", response_model=List[Metric])
+def get_metric_names(session: Session = Depends(get_session)) -> List[Metric]:
+    """
+    List the gauge readings recorded so far (names usable in /{device_id}/series) with their units.
+    Lista las lecturas de pluviómetro registradas hasta ahora (nombres usables en /{device_id}/series) con sus unidades.
+    """
+    return ORJSONResponse(rows_to_dicts(session.exec(select(Metric).order_by(Metric.name)).all()))
+
 @router.get("/{device_id}", response_model=Device)
-def read_device(device_id: int, session: Session = Depends(get_session)) -> Device:
+def read_device(device_id: int) -> Device:
     """
-    Get a device by its ID.
-    Obtiene un dispositivo por su ID.
+    Get a device by its ID, with its disk-fill and temperature forecast (null until enough samples).
+    Obtiene un dispositivo por su ID, con su pronóstico de llenado de disco y temperatura (null hasta tener suficientes muestras).
     """
-    device = crud.get_device(session, device_id)
+    device = device_registry.get(device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    return device
+    return ORJSONResponse({**row_to_dict(device), "forecast": forecasts.snapshot(device_id)})
 
 @router.put("/{device_id}", response_model=Device)
 async def update_device(device_id: int, device: Device, session: Session = Depends(get_session), user: str = Depends(get_current_user)) -> Device:
@@ -106,7 +167,6 @@ async def update_device(device_id: int, device: Device, session: Session = Depen
     updated = crud.update_device(session, device_id, device.dict(exclude_unset=True))
     if not updated:
         raise HTTPException(status_code=404, detail="Device not found")
-    from utils import escape_markdown
     description = escape_markdown(device.description if device.description not in (None, "", "null") else "-")
     enabled = escape_markdown("Yes" if getattr(device, 'enabled', True) else "No")
     msg = (
@@ -138,29 +198,114 @@ def delete_device(device_id: int, session: Session = Depends(get_session), user:
         f"• Requested by: {user}"
     )
     try:
-        import asyncio
         asyncio.create_task(send_telegram_alert(msg))
     except Exception as e:
-        import logging
-        logging.error(f"Error sending Telegram alert: {e}")
+        logger.error(f"Error sending Telegram alert: {e}")
     try:
         deleted = crud.delete_device(session, device_id)
     except Exception as e:
-        import logging
-        logging.error(f"Error deleting device {device_id}: {e}")
+        logger.error(f"Error deleting device {device_id}: {e}")
         return {"ok": False, "detail": f"Error deleting device: {str(e)}"}
     return {"ok": True}
 
+METRIC_SERIES_FIELDS = ("timestamp", "cpu", "ram", "disk", "temp", "status")
+
 @router.get("/{device_id}/metrics", response_model=List[MetricHistory])
 def get_device_metrics(device_id: int, session: Session = Depends(get_session),
-                      start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[MetricHistory]:
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      format: str = Query("rows", pattern="^(rows|columns)$")) -> List[MetricHistory]:
     """
     Get the metric history of a device within an optional date range.
+    With format=columns the series is returned as one array per field ({"timestamp": [...], "cpu": [...]}).
+    The recent part of the range comes from the in-memory ring buffer (one sample per poll, without id);
+    only older samples are read from the database.
+
     Obtiene el historial de métricas de un dispositivo en un rango de fechas opcional.
+    Con format=columns la serie se retorna como un arreglo por campo ({"timestamp": [...], "cpu": [...]}).
+    La parte reciente del rango sale del buffer circular en memoria (una muestra por sondeo, sin id);
+    solo las muestras más antiguas se leen de la base de datos.
+    """
+    start_ts = unix_seconds(start) if start else None
+    end_ts = unix_seconds(end) if end else None
+    oldest = metric_rings.oldest(device_id)
+    recent = []
+    before = None
+    if oldest is not None and (end_ts is None or end_ts >= oldest):
+        recent = metric_rings.rows(device_id, start_ts, end_ts)
+        before = datetime.utcfromtimestamp(oldest)
+    rows = []
+    if before is None or start_ts is None or start_ts < oldest:
+        if format == "columns":
+            columns = [getattr(MetricHistory, field) for field in METRIC_SERIES_FIELDS]
+            query = select(*columns).where(MetricHistory.device_id == device_id)
+        else:
+            query = select(MetricHistory).where(MetricHistory.device_id == device_id)
+        if start:
+            query = query.where(MetricHistory.timestamp >= start)
+        if end:
+            query = query.where(MetricHistory.timestamp <= end)
+        if before is not None:
+            query = query.where(MetricHistory.timestamp < before)
+        rows = session.exec(query.order_by(MetricHistory.timestamp)).all()
+    if format == "columns":
+        rows = list(rows) + [tuple(row[field] for field in METRIC_SERIES_FIELDS) for row in recent]
+        return ORJSONResponse(rows_to_columns(rows, METRIC_SERIES_FIELDS))
+    return ORJSONResponse(rows_to_dicts(rows) + recent)
+
+@router.get("/{device_id}/metrics/recent", response_model=Dict[str, Any])
+def get_recent_metrics(device_id: int, seconds: int = Query(3600, ge=1),
+                       fields: str = ",".join(RING_FIELDS)) -> Dict[str, Any]:
+    """
+    Recent samples from memory only, as Unix timestamps plus one array per field (for sparklines).
+    Muestras recientes solo desde memoria, como timestamps Unix más un arreglo por campo (para sparklines).
+    """
+    start = int(time.time()) - seconds
+    return ORJSONResponse(metric_rings.columns(device_id, start, [f for f in fields.split(",") if f]))
+
+def unix_seconds(value: datetime) -> int:
+    """
+    Unix timestamp of a datetime; naive values are UTC, like the rest of the API.
+    Timestamp Unix de un datetime; los valores sin zona son UTC, como en el resto de la API.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+SERIES_AGGREGATES = {"avg": func.avg, "min": func.min, "max": func.max, "sum": func.sum, "count": func.count}
+
+@router.get("/{device_id}/series", response_model=Dict[str, Any])
+def get_device_series(device_id: int, metric: str, session: Session = Depends(get_session),
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      bucket: Optional[int] = Query(None, ge=1),
+                      agg: str = Query("avg", pattern="^(avg|min|max|sum|count)$")) -> Dict[str, Any]:
+    """
+    Time series of a gauge reading (e.g. metric=rain.mm) in column format, with Unix timestamps.
+    With bucket=<seconds> the samples are aggregated per bucket with `agg` (e.g. hourly rainfall: bucket=3600&agg=sum).
+
+    Serie temporal de una lectura del pluviómetro (p. ej. metric=rain.mm) en formato de columnas, con timestamps Unix.
+    Con bucket=<segundos> las muestras se agregan por intervalo con `agg` (p. ej. lluvia por hora: bucket=3600&agg=sum).
     """
-    query = select(MetricHistory).where(MetricHistory.device_id == device_id)
+    metric_id = metric_catalog.id_of(session, metric)
+    if metric_id is None:
+        raise HTTPException(status_code=404, detail="Metric not found")
+    if bucket:
+        ts = (MetricSample.ts - MetricSample.ts % bucket).label("bucket_ts")
+        query = select(ts, SERIES_AGGREGATES[agg](MetricSample.value))
+    else:
+        ts = MetricSample.ts
+        query = select(ts, MetricSample.value)
+    query = query.where(MetricSample.device_id == device_id, MetricSample.metric_id == metric_id)
     if start:
-        query = query.where(MetricHistory.timestamp >= start)
+        query = query.where(MetricSample.ts >= unix_seconds(start))
     if end:
-        query = query.where(MetricHistory.timestamp <= end)
-    return session.exec(query.order_by(MetricHistory.timestamp)).all()
+        query = query.where(MetricSample.ts <= unix_seconds(end))
+    if bucket:
+        query = query.group_by(ts)
+    rows = session.exec(query.order_by(ts)).all()
+    return ORJSONResponse({
+        "metric": metric,
+        "bucket": bucket,
+        "agg": agg if bucket else None,
+        "timestamp": [row[0] for row in rows],
+        "value": [row[1] for row in rows],
+    })
@@ -0,0 +1,55 @@
+"""
+discovery_endpoint.py
+
+Admin endpoints for network discovery of Raspberry Pi gauges: start a sweep of CIDR ranges and read
+its progress and summary (new hosts found and, if requested, added).
+
+Endpoints de administración para el descubrimiento en red de pluviómetros Raspberry Pi: iniciar un
+barrido de rangos CIDR y leer su progreso y resumen (hosts nuevos encontrados y, si se pidió, agregados).
+"""
+
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
+from models import User
+from endpoints.user_endpoint import admin_required
+from background.discovery_task import discovery_state, start_sweep
+from services.discovery import DISCOVERY_CIDRS, DISCOVERY_CONCURRENCY
+
+router = APIRouter(prefix="/devices/discovery", tags=["discovery"])
+
+class DiscoveryRequest(BaseModel):
+    """
+    Ranges to sweep (default DISCOVERY_CIDRS) and whether to register the new hosts or only propose them.
+    Rangos a recorrer (por defecto DISCOVERY_CIDRS) y si registrar los hosts nuevos o solo proponerlos.
+    """
+    cidrs: List[str] = []
+    add: bool = False
+    concurrency: Optional[int] = None
+
+@router.post("/", response_model=Dict[str, Any], status_code=202)
+async def create_sweep(request: DiscoveryRequest, admin: User = Depends(admin_required)) -> Dict[str, Any]:
+    """
+    Start a discovery sweep in the background; progress and result via GET /devices/discovery.
+    Inicia un barrido de descubrimiento en segundo plano; progreso y resultado en GET /devices/discovery.
+    """
+    cidrs = request.cidrs or DISCOVERY_CIDRS
+    if not cidrs:
+        raise HTTPException(status_code=400, detail="No CIDR ranges given and DISCOVERY_CIDRS is empty")
+    try:
+        return start_sweep(cidrs, request.add, request.concurrency or DISCOVERY_CONCURRENCY)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/", response_model=Dict[str, Any])
+def read_sweep(admin: User = Depends(admin_required)) -> Dict[str, Any]:
+    """
+    Progress of the running sweep, or the summary of the last one.
+    Progreso del barrido en curso, o el resumen del último.
+    """
+    summary = discovery_state.summary()
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No discovery sweep has run")
+    return summary
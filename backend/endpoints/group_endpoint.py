@@ -0,0 +1,86 @@
+"""
+group_endpoint.py
+
+Endpoints for device groups (basins, networks, regions) and their aggregate status.
+Aggregates are maintained in memory by the poller and returned without scanning devices.
+
+Endpoints para grupos de dispositivos (cuencas, redes, regiones) y su estado agregado.
+Los agregados los mantiene en memoria el sondeo y se retornan sin recorrer los dispositivos.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends
+from sqlmodel import Session, select
+from typing import List, Dict, Any
+from models import Device, DeviceGroup
+import crud
+from endpoints.device_endpoint import get_session
+from endpoints.user_endpoint import admin_required
+from services.group_aggregates import group_aggregates
+from services.serialization import ORJSONResponse, rows_to_dicts
+
+router = APIRouter(prefix="/groups", tags=["groups"])
+
+@router.get("/", response_model=List[Dict[str, Any]])
+def read_groups() -> List[Dict[str, Any]]:
+    """
+    List all groups with their aggregate status (devices, online, worst temperature, max disk, active alerts).
+    Lista todos los grupos con su estado agregado (dispositivos, online, peor temperatura, disco máximo, alertas activas).
+    """
+    return ORJSONResponse(group_aggregates.snapshots())
+
+@router.post("/", response_model=DeviceGroup)
+def create_group(group: DeviceGroup, session: Session = Depends(get_session), admin=Depends(admin_required)) -> DeviceGroup:
+    """
+    Create a new group.
+    Crea un nuevo grupo.
+    """
+    try:
+        return crud.create_group(session, group)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{group_id}", response_model=Dict[str, Any])
+def read_group(group_id: int) -> Dict[str, Any]:
+    """
+    Get a group with its aggregate status and the IDs of its direct subgroups.
+    Obtiene un grupo con su estado agregado y los IDs de sus subgrupos directos.
+    """
+    if group_id not in group_aggregates.groups:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return ORJSONResponse({**group_aggregates.snapshot(group_id), "children": group_aggregates.children[group_id]})
+
+@router.get("/{group_id}/devices", response_model=List[Device])
+def read_group_devices(group_id: int, session: Session = Depends(get_session)) -> List[Device]:
+    """
+    List the devices of a group and of all its subgroups.
+    Lista los dispositivos de un grupo y de todos sus subgrupos.
+    """
+    if group_id not in group_aggregates.groups:
+        raise HTTPException(status_code=404, detail="Group not found")
+    group_ids = group_aggregates.descendants([group_id])
+    devices = session.exec(select(Device).where(Device.group_id.in_(group_ids))).all()
+    return ORJSONResponse(rows_to_dicts(devices))
+
+@router.put("/{group_id}", response_model=DeviceGroup)
+def update_group(group_id: int, group: DeviceGroup, session: Session = Depends(get_session), admin=Depends(admin_required)) -> DeviceGroup:
+    """
+    Update a group (name, kind, parent, description).
+    Actualiza un grupo (nombre, tipo, padre, descripción).
+    """
+    try:
+        updated = crud.update_group(session, group_id, group.model_dump(exclude_unset=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not updated:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return updated
+
+@router.delete("/{group_id}", response_model=Dict[str, Any])
+def delete_group(group_id: int, session: Session = Depends(get_session), admin=Depends(admin_required)) -> Dict[str, Any]:
+    """
+    Delete a group; its devices become ungrouped and its subgroups move up one level.
+    Elimina un grupo; sus dispositivos quedan sin grupo y sus subgrupos suben un nivel.
+    """
+    if not crud.delete_group(session, group_id):
+        raise HTTPException(status_code=404, detail="Group not found")
+    return {"ok": True}
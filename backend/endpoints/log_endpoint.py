@@ -0,0 +1,81 @@
+"""
+log_endpoint.py
+
+Search endpoints of the device log archive (services/log_archive.py): full-text queries over the
+collected log entries of the whole fleet, filtered by device, group and time range.
+
+Endpoints de búsqueda del archivo de logs de dispositivos (services/log_archive.py): consultas de
+texto completo sobre las entradas de log recolectadas de toda la flota, filtradas por dispositivo,
+grupo y rango de tiempo.
+"""
+
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Dict, Any, List, Optional
+from auth_utils import get_current_user
+from endpoints.device_endpoint import unix_seconds
+from endpoints.user_endpoint import admin_required
+from models import User
+from services.device_registry import device_registry
+from services.group_aggregates import group_aggregates
+from services.log_archive import log_archive, SearchError
+from services.serialization import ORJSONResponse
+
+router = APIRouter(prefix="/logs", tags=["logs"])
+
+LOG_SEARCH_MAX_LIMIT = 1000
+
+def archive_enabled() -> None:
+    if not log_archive.enabled:
+        raise HTTPException(status_code=503, detail="Log archive disabled")
+
+@router.get("/search", response_model=Dict[str, Any], dependencies=[Depends(archive_enabled)])
+async def search_logs(
+    q: str = Query(..., min_length=1, max_length=500),
+    device_id: List[int] = Query([]),
+    ip: List[str] = Query([]),
+    group: List[int] = Query([]),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = Query(None, pattern=r"^\d+(\.\d+)?:\d+$"),
+    limit: int = Query(100, ge=1, le=LOG_SEARCH_MAX_LIMIT),
+    user: str = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """
+    Archived log entries matching `q` (FTS5 syntax: words, "phrases", prefix*, AND/OR/NOT, level:ERROR), newest first, with
+    the device name and IP. `device_id`, `ip` and `group` (including subgroups) can be repeated and are combined;
+    `start`/`end` bound the time range. Pass the returned `next_cursor` as `cursor` to get the next page.
+
+    Entradas de log archivadas que coinciden con `q` (sintaxis FTS5: palabras, "frases", prefijo*, AND/OR/NOT, level:ERROR),
+    de la más reciente a la más antigua, con el nombre y la IP del dispositivo. `device_id`, `ip` y `group`
+    (incluyendo subgrupos) pueden repetirse y se combinan; `start`/`end` acotan el rango de tiempo. Pasar el
+    `next_cursor` retornado como `cursor` para obtener la página siguiente.
+    """
+    device_ids = None
+    if device_id or ip or group:
+        devices = [device_registry.get_by_ip(address) for address in ip]
+        device_ids = set(device_id) | {d.id for d in devices if d is not None} | group_aggregates.device_ids(group)
+    since = unix_seconds(start) if start else None
+    until = unix_seconds(end) if end else None
+    if cursor:
+        ts, seen = cursor.split(":")
+        cursor = (float(ts), int(seen))
+    try:
+        result = await asyncio.to_thread(log_archive.search, q, device_ids, since, until, limit, cursor)
+    except SearchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for entry in result["results"]:
+        device = device_registry.get(entry["device_id"])
+        entry["name"], entry["ip"] = (device.name, device.ip) if device else (None, None)
+    if result["next_cursor"]:
+        result["next_cursor"] = "%r:%d" % result["next_cursor"]
+    return ORJSONResponse(result)
+
+@router.get("/archive", response_model=Dict[str, Any], dependencies=[Depends(archive_enabled)])
+async def read_archive(admin: User = Depends(admin_required)) -> Dict[str, Any]:
+    """
+    Day partitions of the log archive with their entry counts, and its size on disk.
+    Particiones diarias del archivo de logs con su cantidad de entradas, y su tamaño en disco.
+    """
+    return await asyncio.to_thread(log_archive.stats)
@@ -0,0 +1,23 @@
+"""
+metrics_endpoint.py
+
+Prometheus/OpenMetrics scrape endpoint for the Raspberry Pi Dashboard backend.
+
+Endpoint de scraping Prometheus/OpenMetrics para el backend de Raspberry Pi Dashboard.
+"""
+
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+from prometheus_client import REGISTRY
+from prometheus_client.exposition import choose_encoder
+
+router = APIRouter()
+
+@router.get("/metrics")
+def metrics(request: Request) -> Response:
+    """
+    Expose all collected metrics, in OpenMetrics format if the scraper asks for it.
+    Expone todas las métricas recolectadas, en formato OpenMetrics si el scraper lo solicita.
+    """
+    encoder, content_type = choose_encoder(request.headers.get("accept", ""))
+    return Response(encoder(REGISTRY), media_type=content_type)
@@ -0,0 +1,113 @@
+"""
+operation_endpoint.py
+
+Admin endpoints for fleet-wide device operations (reboot, service restart, config push).
+An operation runs in the background against the selected devices; progress is streamed over
+/ws/status as "operation_progress" frames and the result record is read with GET /devices/operations/{id}.
+
+Endpoints de administración para operaciones sobre toda la flota (reinicio, reinicio de servicio,
+envío de configuración). Una operación se ejecuta en segundo plano sobre los dispositivos
+seleccionados; el progreso se transmite por /ws/status como frames "operation_progress" y el
+registro de resultados se lee con GET /devices/operations/{id}.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from pydantic import BaseModel
+from sqlmodel import Session
+from typing import List, Dict, Any, Optional
+import orjson
+from models import DeviceOperation, User
+import crud
+from endpoints.device_endpoint import get_session
+from endpoints.user_endpoint import admin_required
+from endpoints.status_ws import manager
+from services.operations import OPERATIONS, select_devices, start_operation, cancel_operation
+from services.serialization import ORJSONResponse, row_to_dict
+
+router = APIRouter(prefix="/devices/operations", tags=["operations"])
+
+OPERATION_PAGE_MAX = 200
+
+class OperationRequest(BaseModel):
+    """
+    Operation to run and its target: device IDs and/or groups (including subgroups).
+    No devices and no groups = every device.
+    Operación a ejecutar y su objetivo: IDs de dispositivos y/o grupos (incluidos subgrupos).
+    Sin dispositivos ni grupos = todos los dispositivos.
+    """
+    name: str
+    params: Dict[str, Any] = {}
+    devices: List[int] = []
+    groups: List[int] = []
+    enabled_only: bool = True
+
+def operation_to_dict(operation: DeviceOperation, with_results: bool = True) -> Dict[str, Any]:
+    """
+    Operation row with its JSON columns decoded.
+    Fila de operación con sus columnas JSON decodificadas.
+    """
+    data = row_to_dict(operation)
+    for field in ("params", "target", "results"):
+        data[field] = orjson.loads(data[field])
+    if not with_results:
+        del data["results"]
+    return data
+
+@router.get("/types", response_model=List[str])
+def read_operation_types(admin: User = Depends(admin_required)) -> List[str]:
+    """
+    Names of the available operations.
+    Nombres de las operaciones disponibles.
+    """
+    return sorted(OPERATIONS)
+
+@router.post("/", response_model=Dict[str, Any], status_code=202)
+async def create_operation(request: OperationRequest, session: Session = Depends(get_session),
+                           admin: User = Depends(admin_required)) -> Dict[str, Any]:
+    """
+    Start an operation in the background and return its record (status 'running').
+    Inicia una operación en segundo plano y retorna su registro (estado 'running').
+    """
+    if request.name not in OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown operation: {request.name}")
+    devices = select_devices(request.devices, request.groups, request.enabled_only)
+    if not devices:
+        raise HTTPException(status_code=400, detail="No devices match the target")
+    target = {"devices": request.devices, "groups": request.groups, "enabled_only": request.enabled_only}
+    operation = start_operation(session, request.name, request.params, target, devices,
+                                admin.username, manager.broadcast)
+    return ORJSONResponse(operation_to_dict(operation), status_code=202)
+
+@router.get("/", response_model=List[Dict[str, Any]])
+def read_operations(session: Session = Depends(get_session), admin: User = Depends(admin_required),
+                    before: Optional[int] = None,
+                    limit: int = Query(50, ge=1, le=OPERATION_PAGE_MAX)) -> List[Dict[str, Any]]:
+    """
+    List operations newest first, without per-device results; next page with before=<last ID received>.
+    Lista las operaciones de la más reciente a la más antigua, sin resultados por dispositivo; página
+    siguiente con before=<último ID recibido>.
+    """
+    operations = crud.get_operations(session, limit=limit, before=before)
+    return ORJSONResponse([operation_to_dict(o, with_results=False) for o in operations])
+
+@router.get("/{operation_id}", response_model=Dict[str, Any])
+def read_operation(operation_id: int, session: Session = Depends(get_session),
+                   admin: User = Depends(admin_required)) -> Dict[str, Any]:
+    """
+    Get an operation with its per-device results (filled in when it finishes).
+    Obtiene una operación con sus resultados por dispositivo (se completan al terminar).
+    """
+    operation = crud.get_operation(session, operation_id)
+    if not operation:
+        raise HTTPException(status_code=404, detail="Operation not found")
+    return ORJSONResponse(operation_to_dict(operation))
+
+@router.post("/{operation_id}/cancel", response_model=Dict[str, Any])
+async def cancel(operation_id: int, admin: User = Depends(admin_required)) -> Dict[str, Any]:
+    """
+    Cancel a running operation; calls already in flight are abandoned and the partial results stored.
+    Cancela una operación en curso; las llamadas en vuelo se abandonan y se guardan los resultados parciales.
+    """
+    if not cancel_operation(operation_id):
+        raise HTTPException(status_code=404, detail="Operation not running")
+    return {"ok": True}
@@ -8,17 +8,35 @@ Endpoints para el estado y logs de dispositivos en el backend de Raspberry Pi Da
 Proporciona rutas API para verificar el estado de la API, el estado de los dispositivos y los logs.
 """
 
-from fastapi import APIRouter
-from fastapi.responses import PlainTextResponse, Response
-from sqlmodel import Session, select
-from models import Device
-from utils import fetch_logs
-from endpoints.device_endpoint import engine
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional
+from utils import fetch_logs, fetch_status, pending_logs, pending_status
+from endpoints.status_ws import manager
+from services.fanout import gather_with_deadline, FANOUT_DEADLINE_SECONDS, FANOUT_MAX_DEADLINE_SECONDS
+from services.status_hub import status_hub
+from services.event_stream import event_bus, publish_statuses, snapshot_frame
+from services.metrics import SSE_CLIENTS
+from services.federation import federation
+from database import engine
+from services.device_registry import device_registry
+from services.circuit_breaker import breakers, CLOSED
 import logging
+import os
+import time
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# A comment line is sent after this many idle seconds so proxies keep the stream open
+# Se envía una línea de comentario tras estos segundos sin eventos para que los proxies mantengan el flujo abierto
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("SSE_KEEPALIVE_SECONDS", "15"))
+# Reconnection delay suggested to EventSource clients / Espera de reconexión sugerida a los clientes EventSource
+SSE_RETRY_MS = 3000
+# Streams are closed after this long; clients reconnect and resume, so shutdowns and proxies never wait on them
+# Los flujos se cierran tras este tiempo; los clientes se reconectan y continúan, así apagados y proxies no esperan por ellos
+SSE_MAX_STREAM_SECONDS = float(os.environ.get("SSE_MAX_STREAM_SECONDS", "300"))
+
 @router.get("/", response_class=PlainTextResponse)
 def root():
     """
@@ -35,67 +53,174 @@ def favicon():
     """
     return Response(content=b"", media_type="image/x-icon")
 
+@router.get("/health/tasks")
+def get_task_health(request: Request):
+    """
+    Health and last-run latency of the supervised background jobs.
+    Salud y latencia de la última ejecución de los trabajos supervisados en segundo plano.
+    """
+    supervisor = getattr(request.app.state, "supervisor", None)
+    if supervisor is None:
+        return {}
+    return supervisor.health()
+
+@router.get("/health/devices")
+def get_device_health():
+    """
+    Circuit breaker state, per endpoint, of the devices that are not healthy (open or half-open breaker, or recent failures).
+    Estado del circuit breaker, por endpoint, de los dispositivos que no están sanos (breaker abierto o semiabierto, o fallos recientes).
+    """
+    unhealthy: Dict[str, Dict[str, Any]] = {}
+    for (ip, endpoint), b in breakers.items():
+        if b.state != CLOSED or b.failures:
+            unhealthy.setdefault(ip, {})[endpoint] = b.info()
+    return {"open": sum(1 for b in breakers.values() if b.state != CLOSED), "devices": unhealthy}
+
+@router.get("/health/federation")
+def get_federation_health():
+    """
+    Link state of each federation peer: connection, cached devices and alerts, last event ID and reconnects.
+    Estado del enlace con cada par de la federación: conexión, dispositivos y alertas en caché, último ID de evento y reconexiones.
+    """
+    return {"enabled": federation.enabled, "peers": federation.info()}
+
+DeadlineQuery = Query(None, ge=0, le=FANOUT_MAX_DEADLINE_SECONDS,
+                      description="Seconds to wait for devices (default FANOUT_DEADLINE_SECONDS)")
+
+def status_result(ip: str, result: Any) -> Dict[str, Any]:
+    if isinstance(result, Exception):
+        logger.error("Error getting status from %s: %s", ip, result)
+        return {"ip": ip, "error": f"Could not get status from Raspberry Pi {ip}: {result}"}
+    return result
+
+def logs_result(ip: str, result: Any) -> Dict[str, Any]:
+    if isinstance(result, Exception):
+        logger.error("Error getting logs from %s: %s", ip, result)
+        return {"ip": ip, "logs": {"error": str(result)}}
+    return result
+
+async def push_late_status(ip: str, result: Any) -> None:
+    """
+    Publish a status that arrived after the response deadline to the status hub, the SSE stream and the WebSocket clients.
+    Publica un estado que llegó después del plazo de respuesta en el hub de estado, el flujo SSE y a los clientes WebSocket.
+    """
+    status = status_result(ip, result)
+    device = device_registry.get_by_ip(ip)
+    if device is not None:
+        status_hub.publish(device.id, {"device_id": device.id, "name": device.name, "online": "error" not in status, **status})
+        publish_statuses([device.id])
+    await manager.broadcast({"type": "late_status", "status": status})
+
+async def push_late_logs(ip: str, result: Any) -> None:
+    """
+    Send logs that arrived after the response deadline to the WebSocket clients.
+    Envía a los clientes WebSocket los logs que llegaron después del plazo de respuesta.
+    """
+    await manager.broadcast({"type": "late_logs", "logs": logs_result(ip, result)})
+
+async def fleet_status(deadline: Optional[float]) -> List[Dict[str, Any]]:
+    """
+    Status of all enabled devices, followed by the cached statuses of the federation peers (tagged with
+    "peer"). Devices that miss the deadline are returned as pending (with their last known values) and
+    their result is pushed over the WebSocket when it arrives.
+
+    Estado de todos los dispositivos habilitados, seguido de los estados en caché de los pares de la
+    federación (marcados con "peer"). Los que no responden antes del plazo se retornan como pendientes
+    (con sus últimos valores conocidos) y su resultado se envía por el WebSocket cuando llega.
+    """
+    # Get enabled devices from the registry cache / Obtener dispositivos habilitados desde la caché del registro
+    ips = [d.ip for d in device_registry.enabled()]
+    logger.debug("[STATUS] Consultando las siguientes IPs: %s", ips)
+    if not ips:
+        return federation.statuses()
+    results = await gather_with_deadline(
+        "status", ips, fetch_status, FANOUT_DEADLINE_SECONDS if deadline is None else deadline,
+        pending_status, push_late_status,
+    )
+    results = [status_result(ip, res) for ip, res in zip(ips, results)]
+    logger.debug("[STATUS] Resultados finales: %s", results)
+    return results + federation.statuses()
+
 @router.get("/status")
-async def get_status():
+async def get_status(deadline: Optional[float] = DeadlineQuery):
     """
     Get the status of all enabled devices (legacy route).
     Obtiene el estado de todos los dispositivos habilitados (ruta legacy).
     """
-    # Get enabled devices from the database / Obtener dispositivos habilitados desde la base de datos
-    with Session(engine) as session:
-        devices = session.exec(select(Device).where(Device.enabled == True)).all()
-        ips = [d.ip for d in devices]
-    logger.info(f"[STATUS] Consultando las siguientes IPs: {ips}")
-    if not ips:
-        return []
-    # Use fetch_status from utils.py for each IP / Usar fetch_status de utils.py para cada IP
-    from utils import fetch_status
-    import asyncio
-    results = await asyncio.gather(*(fetch_status(ip) for ip in ips))
-    logger.info(f"[STATUS] Resultados finales: {results}")
-    return results
+    return await fleet_status(deadline)
 
 @router.get("/api/v1/status")
-async def get_status_v1():
+async def get_status_v1(deadline: Optional[float] = DeadlineQuery):
     """
     Get the status of all enabled devices (v1 route).
     Obtiene el estado de todos los dispositivos habilitados (ruta v1).
     """
-    # Get enabled devices from the database / Obtener dispositivos habilitados desde la base de datos
-    with Session(engine) as session:
-        devices = session.exec(select(Device).where(Device.enabled == True)).all()
-        ips = [d.ip for d in devices]
-    logger.info(f"[STATUS] Consultando las siguientes IPs: {ips}")
-    if not ips:
-        return []
-    # Use fetch_status from utils.py for each IP / Usar fetch_status de utils.py para cada IP
-    from utils import fetch_status
-    import asyncio
-    results = await asyncio.gather(*(fetch_status(ip) for ip in ips))
-    logger.info(f"[STATUS] Resultados finales: {results}")
-    return results
+    return await fleet_status(deadline)
+
+def unresolved_alerts() -> List[Dict[str, Any]]:
+    alerts_by_device = status_hub.unresolved_alerts(engine)
+    return sorted((a for alerts in alerts_by_device.values() for a in alerts), key=lambda a: a["id"])
+
+async def event_frames(request: Request, cursor: Optional[int]) -> AsyncIterator[bytes]:
+    """
+    SSE frames for one client: a snapshot when it cannot resume, then every event after its cursor.
+    Frames SSE para un cliente: una instantánea si no puede continuar y luego cada evento posterior a su cursor.
+    """
+    SSE_CLIENTS.inc()
+    deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+        while time.monotonic() < deadline and not await request.is_disconnected():
+            frames = event_bus.since(cursor) if cursor is not None else None
+            if frames is None:
+                # New client, or it fell out of the replay buffer / Cliente nuevo, o quedó fuera del buffer de repetición
+                cursor = event_bus.last_id
+                yield snapshot_frame(unresolved_alerts())
+            elif frames:
+                cursor = frames[-1][0]
+                yield b"".join(frame for _, frame in frames)
+            await event_bus.wait(cursor, SSE_KEEPALIVE_SECONDS)
+            if event_bus.last_id == cursor:
+                yield b": keepalive\n\n"
+    finally:
+        SSE_CLIENTS.dec()
+
+@router.get("/api/v1/events")
+async def stream_events(request: Request, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of status and alert changes, for clients that cannot use the WebSocket.
+    Events: "snapshot" (all statuses and unresolved alerts), "status" (changed devices), "alerts"
+    (unresolved alerts) and "remove" (device IDs). A reconnecting client sends Last-Event-ID (or
+    ?last_event_id=) and receives only the events it missed while they are still buffered.
+
+    Flujo Server-Sent Events de cambios de estado y alertas, para clientes que no pueden usar el WebSocket.
+    Eventos: "snapshot" (todos los estados y alertas no resueltas), "status" (dispositivos que cambiaron),
+    "alerts" (alertas no resueltas) y "remove" (IDs de dispositivos). Un cliente que se reconecta envía
+    Last-Event-ID (o ?last_event_id=) y recibe solo los eventos que se perdió mientras sigan en el buffer.
+    """
+    cursor = event_bus.cursor(last_event_id or request.query_params.get("last_event_id"))
+    return StreamingResponse(
+        event_frames(request, cursor), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/log")
-async def get_logs():
-    """
-    Get logs from all enabled devices.
-    Obtiene los logs de todos los dispositivos habilitados.
-    """
-    with Session(engine) as session:
-        devices = session.exec(select(Device).where(Device.enabled == True)).all()
-        ips = [d.ip for d in devices]
-        try:
-            import asyncio
-            results = await asyncio.gather(*(fetch_logs(ip) for ip in ips), return_exceptions=True)
-            logs_list = []
-            for ip, res in zip(ips, results):
-                if isinstance(res, Exception):
-                    logger.error(f"Error getting logs from {ip}: {res}")
-                    logs_list.append({"ip": ip, "logs": {"error": str(res)}})
-                else:
-                    logs_list.append(res)
-            return logs_list
-        except Exception as e:
-            logger.error(f"General error in /log: {e}")
-            # Always return a valid JSON response and status 200 / Devolver siempre una respuesta JSON válida y status 200
-            return [{"ip": ip, "logs": {"error": f"General backend error: {str(e)}"}} for ip in ips]
+async def get_logs(deadline: Optional[float] = DeadlineQuery):
+    """
+    Get logs from all enabled devices. Devices that miss the deadline get their last known logs marked
+    as pending, and their logs are pushed over the WebSocket when they arrive.
+
+    Obtiene los logs de todos los dispositivos habilitados. Los que no responden antes del plazo reciben
+    sus últimos logs conocidos marcados como pendientes, y sus logs se envían por el WebSocket al llegar.
+    """
+    ips = [d.ip for d in device_registry.enabled()]
+    try:
+        results = await gather_with_deadline(
+            "log", ips, fetch_logs, FANOUT_DEADLINE_SECONDS if deadline is None else deadline,
+            pending_logs, push_late_logs,
+        )
+        return [logs_result(ip, res) for ip, res in zip(ips, results)]
+    except Exception as e:
+        logger.error("General error in /log: %s", e)
+        # Always return a valid JSON response and status 200 / Devolver siempre una respuesta JSON válida y status 200
+        return [{"ip": ip, "logs": {"error": f"General backend error: {str(e)}"}} for ip in ips]
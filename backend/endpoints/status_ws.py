@@ -2,70 +2,403 @@
 status_ws.py
 
 WebSocket endpoint for real-time transmission of device status, metrics, and alerts.
+Clients that send a subscribe message receive only the devices and fields they asked for, at their
+own update rate; the others keep receiving the full legacy frame every 5 seconds.
 
 Endpoint WebSocket para transmitir en tiempo real el estado de dispositivos, métricas y alertas.
+Los clientes que envían un mensaje de suscripción reciben solo los dispositivos y campos pedidos, a
+su propio ritmo; los demás siguen recibiendo el frame completo anterior cada 5 segundos.
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
 from sqlmodel import Session, select
-from models import Device, MetricHistory, Alert
-from endpoints.device_endpoint import engine
+from models import Alert
+from database import engine
 import asyncio
-from typing import List, Dict, Any
+import logging
+import os
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from services.metrics import WS_CONNECTIONS, WS_DISCONNECTS, WS_LEAKED_CONNECTIONS, WS_SEND_QUEUE_DEPTH, WS_SEND_SECONDS
+from services.serialization import dumps, rows_to_dicts
+from services.status_hub import status_hub
+from services.federation import federation
+from services.ring_buffer import metric_rings, RING_FIELDS
+from services.group_aggregates import group_aggregates
+from services.device_registry import device_registry
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+LEGACY_INTERVAL = 5.0
+WS_MIN_INTERVAL = float(os.environ.get("WS_MIN_INTERVAL", "1"))
+WS_MAX_INTERVAL = 300.0
+WS_MAX_CONNECTIONS = int(os.environ.get("WS_MAX_CONNECTIONS", "1000"))
+# The server sends {"type": "ping"} every WS_PING_INTERVAL; clients answer {"action": "pong"}
+# El servidor envía {"type": "ping"} cada WS_PING_INTERVAL; los clientes responden {"action": "pong"}
+WS_PING_INTERVAL = float(os.environ.get("WS_PING_INTERVAL", "20"))
+# A client that sends nothing (pongs included) for this long is closed / Un cliente que no envía nada (pongs incluidos) en este tiempo se cierra
+WS_IDLE_TIMEOUT = float(os.environ.get("WS_IDLE_TIMEOUT", "60"))
+WS_SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", "10"))
+WS_REAP_INTERVAL = 30.0
+
+class SubscribeMessage(BaseModel):
+    """
+    Client message selecting what to stream: devices by ID and/or by group (including subgroups), and
+    federation peers by name. No devices, groups or peers = all devices, local and remote; empty field
+    list = all fields.
+    Mensaje del cliente que elige qué transmitir: dispositivos por ID y/o por grupo (incluidos subgrupos),
+    y pares de la federación por nombre. Sin dispositivos, grupos ni pares = todos, locales y remotos;
+    lista de campos vacía = todos.
+    """
+    action: str
+    devices: List[int] = []
+    groups: List[int] = []
+    peers: List[str] = []
+    fields: List[str] = []
+    interval: float = LEGACY_INTERVAL
+
+class ClientState:
+    """
+    Per-connection subscription, the state token of the last frame sent and the heartbeat bookkeeping
+    (handler task and time of the last message received).
+    Suscripción por conexión, el token de estado del último frame enviado y los datos del heartbeat
+    (tarea del handler y hora del último mensaje recibido).
+    """
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.subscription: Optional[SubscribeMessage] = None
+        self.fields: Optional[tuple] = None
+        self.last_token: Optional[tuple] = None
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.last_seen = time.monotonic()
+        self.close_reason: Optional[str] = None
+
+    @property
+    def interval(self) -> float:
+        if self.subscription is None:
+            return LEGACY_INTERVAL
+        return min(max(self.subscription.interval, WS_MIN_INTERVAL), WS_MAX_INTERVAL)
+
 class ConnectionManager:
     """
-    Manages active WebSocket connections and message broadcasting.
-    Gestiona las conexiones WebSocket activas y el envío de mensajes.
+    Manages active WebSocket connections and message broadcasting. Every connection is registered with
+    its handler task, so a failed send or the periodic reaper can end it and its cleanup always runs.
+    Gestiona las conexiones WebSocket activas y el envío de mensajes. Cada conexión se registra con la
+    tarea de su handler, así un envío fallido o el recolector periódico pueden terminarla y su limpieza
+    siempre se ejecuta.
     """
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, max_connections: int = WS_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.clients: Dict[WebSocket, ClientState] = {}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
 
-    async def connect(self, websocket: WebSocket) -> None:
+    async def connect(self, websocket: WebSocket) -> Optional[ClientState]:
         """
-        Accept and register a new WebSocket connection.
-        Acepta y registra una nueva conexión WebSocket.
+        Accept and register a new WebSocket connection; over WS_MAX_CONNECTIONS it is closed with 1013
+        (try again later) and None is returned.
+        Acepta y registra una nueva conexión WebSocket; por encima de WS_MAX_CONNECTIONS se cierra con 1013
+        (reintentar más tarde) y se retorna None.
         """
         await websocket.accept()
-        self.active_connections.append(websocket)
+        if len(self.clients) >= self.max_connections:
+            WS_DISCONNECTS.labels("rejected").inc()
+            await close_quietly(websocket, 1013)
+            return None
+        state = self.clients[websocket] = ClientState(websocket)
+        state.task = asyncio.current_task()
+        WS_CONNECTIONS.set(len(self.clients))
+        return state
+
+    def disconnect(self, websocket: WebSocket, reason: str = "client") -> None:
+        """
+        Remove a closed WebSocket connection (safe to call more than once).
+        Elimina una conexión WebSocket cerrada (se puede llamar más de una vez).
+        """
+        if self.clients.pop(websocket, None) is not None:
+            WS_DISCONNECTS.labels(reason).inc()
+        WS_CONNECTIONS.set(len(self.clients))
 
-    def disconnect(self, websocket: WebSocket) -> None:
+    def evict(self, state: ClientState, reason: str) -> None:
         """
-        Remove a closed WebSocket connection.
-        Elimina una conexión WebSocket cerrada.
+        End a connection from outside its handler: the handler task is cancelled and cleans up.
+        Termina una conexión desde fuera de su handler: la tarea del handler se cancela y hace la limpieza.
         """
-        self.active_connections.remove(websocket)
+        if state.close_reason is None:
+            state.close_reason = reason
+        if state.task is not None and not state.task.done():
+            state.task.cancel()
 
     async def broadcast(self, message: Dict[str, Any]) -> None:
         """
-        Send a message to all active connections.
-        Envía un mensaje a todas las conexiones activas.
+        Send a message to all active connections concurrently; clients whose send fails or times out are evicted.
+        Envía un mensaje a todas las conexiones activas en paralelo; los clientes cuyo envío falla o vence se expulsan.
         """
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        frame = dumps(message)
+
+        async def send(state: ClientState) -> None:
+            try:
+                await send_frame(state.websocket, frame)
+            except asyncio.TimeoutError:
+                self.evict(state, "send_timeout")
+            except Exception as e:
+                logger.debug("Broadcast to a WebSocket client failed: %s", e)
+                self.evict(state, "error")
+
+        await asyncio.gather(*(send(state) for state in list(self.clients.values())))
+
+    def reap(self) -> None:
+        """
+        Drop connections whose handler already exited (leaks, counted in WS_LEAKED_CONNECTIONS) and evict
+        the ones silent for longer than the idle timeout whose handler did not close them.
+        Quita las conexiones cuyo handler ya terminó (fugas, contadas en WS_LEAKED_CONNECTIONS) y expulsa
+        las que llevan en silencio más que el timeout de inactividad sin que su handler las cerrara.
+        """
+        now = time.monotonic()
+        for websocket, state in list(self.clients.items()):
+            if state.task is None or state.task.done():
+                WS_LEAKED_CONNECTIONS.inc()
+                self.disconnect(websocket, "leaked")
+            elif now - state.last_seen > WS_IDLE_TIMEOUT + WS_SEND_TIMEOUT:
+                self.evict(state, "idle")
 
 manager = ConnectionManager()
 
+async def send_frame(websocket: WebSocket, frame: bytes) -> None:
+    """
+    Send an already serialized JSON frame as text within WS_SEND_TIMEOUT, tracking pending sends and
+    write time. Raises asyncio.TimeoutError when the client does not drain its socket in time.
+    Envía como texto un frame JSON ya serializado dentro de WS_SEND_TIMEOUT, registrando los envíos
+    pendientes y el tiempo de escritura. Lanza asyncio.TimeoutError si el cliente no vacía su socket a tiempo.
+    """
+    WS_SEND_QUEUE_DEPTH.inc()
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(websocket.send_text(frame.decode()), WS_SEND_TIMEOUT)
+    finally:
+        WS_SEND_QUEUE_DEPTH.dec()
+        WS_SEND_SECONDS.observe(time.perf_counter() - started)
+
+async def close_quietly(websocket: WebSocket, code: int) -> None:
+    """
+    Close a connection without waiting more than WS_SEND_TIMEOUT or raising (it may already be gone).
+    Cierra una conexión sin esperar más de WS_SEND_TIMEOUT ni lanzar errores (puede que ya no exista).
+    """
+    try:
+        await asyncio.wait_for(websocket.close(code=code), WS_SEND_TIMEOUT)
+    except Exception:
+        pass
+
+async def reap_connections() -> None:
+    """
+    Periodic job running the connection manager's reaper.
+    Trabajo periódico que ejecuta el recolector del gestor de conexiones.
+    """
+    manager.reap()
+
+def legacy_frame() -> bytes:
+    """
+    Full frame with every device, its latest metric sample (from the ring buffers), unresolved alerts and
+    group aggregates, for clients without a subscription.
+    Frame completo con todos los dispositivos, su última muestra de métricas (de los buffers circulares),
+    las alertas no resueltas y los agregados de grupo, para clientes sin suscripción.
+    """
+    devices = device_registry.all()
+    with Session(engine) as session:
+        alerts = session.exec(select(Alert).where(Alert.resolved == False)).all()
+        frame = {
+            "devices": rows_to_dicts(devices),
+            "metrics": metric_rings.latest_rows(),
+            "alerts": rows_to_dicts(alerts) + federation.alerts(),
+            "groups": group_aggregates.snapshots(),
+        }
+    if federation.enabled:
+        frame["remote_status"] = federation.statuses()
+    return dumps(frame)
+
+def history_frame(device_ids: List[int], fields: Optional[Tuple[str, ...]]) -> bytes:
+    """
+    Catch-up frame with the buffered recent samples of the given devices, sent after a subscription.
+    Frame de puesta al día con las muestras recientes en buffer de los dispositivos dados, enviado tras una suscripción.
+    """
+    wanted = [f for f in fields if f in RING_FIELDS] if fields else RING_FIELDS
+    return dumps({
+        "type": "history",
+        "history": {device_id: metric_rings.columns(device_id, None, wanted) for device_id in device_ids},
+    })
+
+def subscribed_peers(subscription: SubscribeMessage) -> Optional[List[str]]:
+    """
+    Federation peers a subscription follows: None for all (nothing selected), its `peers` otherwise.
+    Pares de la federación que sigue una suscripción: None para todos (nada seleccionado), si no sus `peers`.
+    """
+    if not federation.enabled:
+        return []
+    if not (subscription.devices or subscription.groups or subscription.peers):
+        return None
+    return subscription.peers
+
+def join_arrays(first: bytes, second: bytes) -> bytes:
+    """
+    Concatenate two encoded JSON arrays.
+    Concatena dos arreglos JSON codificados.
+    """
+    if first == b"[]":
+        return second
+    if second == b"[]":
+        return first
+    return first[:-1] + b"," + second[1:]
+
+def subscribed_frame(state: ClientState) -> Optional[bytes]:
+    """
+    Filtered frame for a subscribed client built from the status hub's cached fragments and the
+    group aggregates (plus the cached statuses of the federation peers it follows), or None when none
+    of its devices or groups changed since the last frame.
+    Frame filtrado para un cliente suscrito construido con los fragmentos en caché del hub de
+    estado y los agregados de grupo (más los estados en caché de los pares de la federación que sigue),
+    o None si ninguno de sus dispositivos o grupos cambió desde el último frame.
+    """
+    subscription = state.subscription
+    wanted = None
+    if subscription.devices or subscription.groups or subscription.peers:
+        wanted = set(subscription.devices) | group_aggregates.device_ids(subscription.groups)
+    peers = subscribed_peers(subscription)
+    device_ids = status_hub.device_ids(wanted)
+    group_ids = subscription.groups or sorted(group_aggregates.groups)
+    device_token = status_hub.state_token(device_ids) if wanted is not None else (status_hub.version,)
+    token = device_token + group_aggregates.versions(group_ids)
+    if peers != []:
+        token += (federation.version,)
+    if token == state.last_token:
+        return None
+    state.last_token = token
+    alerts_by_device = status_hub.unresolved_alerts(engine)
+    alerts = [a for d in device_ids for a in alerts_by_device.get(d, ())]
+    status = status_hub.status_array(device_ids, state.fields)
+    if peers != []:
+        alerts += federation.alerts(peers)
+        status = join_arrays(status, federation.status_array(state.fields, peers))
+    return (b'{"type":"status","status":' + status
+            + b',"alerts":' + dumps(alerts)
+            + b',"groups":' + dumps(group_aggregates.snapshots(group_ids)) + b"}")
+
+async def receive_messages(websocket: WebSocket, state: ClientState) -> None:
+    """
+    Read subscribe/unsubscribe/pong messages from the client until it disconnects. Any message counts
+    as a sign of life for the idle timeout.
+    Lee mensajes subscribe/unsubscribe/pong del cliente hasta que se desconecta. Cualquier mensaje
+    cuenta como señal de vida para el timeout de inactividad.
+    """
+    while True:
+        text = await websocket.receive_text()
+        state.last_seen = time.monotonic()
+        try:
+            message = SubscribeMessage.model_validate_json(text)
+        except ValidationError as e:
+            await send_frame(websocket, dumps({"type": "error", "detail": e.errors(include_url=False)}))
+            continue
+        if message.action == "pong":
+            continue
+        if message.action == "subscribe":
+            state.subscription = message
+            state.fields = tuple(sorted(set(message.fields))) or None
+        elif message.action == "unsubscribe":
+            state.subscription = None
+            state.fields = None
+        else:
+            await send_frame(websocket, dumps({"type": "error", "detail": f"Unknown action: {message.action}"}))
+            continue
+        state.last_token = None
+        await send_frame(websocket, dumps({
+            "type": "subscribed" if state.subscription else "unsubscribed",
+            "devices": message.devices,
+            "groups": message.groups,
+            "peers": message.peers,
+            "fields": list(state.fields or ()),
+            "interval": state.interval,
+        }))
+        if state.subscription is not None:
+            wanted = None
+            if message.devices or message.groups or message.peers:
+                wanted = set(message.devices) | group_aggregates.device_ids(message.groups)
+            await send_frame(websocket, history_frame(status_hub.device_ids(wanted), state.fields))
+        state.wakeup.set()
+
+PING_FRAME = dumps({"type": "ping"})
+
 @router.websocket("/ws/status")
 async def websocket_status(websocket: WebSocket) -> None:
     """
-    WebSocket that periodically transmits device status, metrics, and alerts.
-    WebSocket que transmite periódicamente el estado de dispositivos, métricas y alertas.
+    WebSocket that periodically transmits device status, metrics, and alerts, filtered and
+    throttled per client once it subscribes. Sends a ping every WS_PING_INTERVAL and closes clients
+    silent for WS_IDLE_TIMEOUT or whose sends time out; the connection is unregistered on every exit path.
+
+    WebSocket que transmite periódicamente el estado de dispositivos, métricas y alertas,
+    filtrado y regulado por cliente una vez que se suscribe. Envía un ping cada WS_PING_INTERVAL y
+    cierra los clientes en silencio durante WS_IDLE_TIMEOUT o cuyos envíos vencen; la conexión se
+    da de baja en cualquier salida.
     """
-    await manager.connect(websocket)
+    state = await manager.connect(websocket)
+    if state is None:
+        return
+    receiver = asyncio.create_task(receive_messages(websocket, state))
+    # Wake the loop as soon as the client goes away / Despertar el ciclo en cuanto el cliente se va
+    receiver.add_done_callback(lambda _: state.wakeup.set())
+    reason = "client"
     try:
-        while True:
-            await asyncio.sleep(5)
-            with Session(engine) as session:
-                devices = session.exec(select(Device)).all()
-                metrics = session.exec(select(MetricHistory)).all()
-                alerts = session.exec(select(Alert).where(Alert.resolved == False)).all()
-                await websocket.send_json({
-                    "devices": [d.dict() for d in devices],
-                    "metrics": [m.dict() for m in metrics],
-                    "alerts": [a.dict() for a in alerts],
-                })
+        now = time.monotonic()
+        next_frame = now + state.interval
+        next_ping = now + WS_PING_INTERVAL
+        while not receiver.done():
+            idle_deadline = state.last_seen + WS_IDLE_TIMEOUT
+            timeout = max(min(next_frame, next_ping, idle_deadline) - time.monotonic(), 0)
+            try:
+                await asyncio.wait_for(state.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            woken = state.wakeup.is_set()
+            state.wakeup.clear()
+            if receiver.done():
+                break
+            now = time.monotonic()
+            if now - state.last_seen >= WS_IDLE_TIMEOUT:
+                reason = "idle"
+                break
+            if now >= next_ping:
+                next_ping = now + WS_PING_INTERVAL
+                await send_frame(websocket, PING_FRAME)
+            if woken or now >= next_frame:
+                next_frame = now + state.interval
+                frame = legacy_frame() if state.subscription is None else subscribed_frame(state)
+                if frame is not None:
+                    await send_frame(websocket, frame)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    except asyncio.TimeoutError:
+        reason = "send_timeout"
+    except asyncio.CancelledError:
+        # Evicted by a failed broadcast or the reaper / Expulsado por un broadcast fallido o el recolector
+        reason = state.close_reason or "cancelled"
+        if state.close_reason is None:
+            raise
+    except Exception as e:
+        logger.debug("WebSocket client loop failed: %s", e)
+        reason = "error"
+    finally:
+        if reason == "client" and receiver.done() and not receiver.cancelled():
+            error = receiver.exception()
+            if isinstance(error, asyncio.TimeoutError):
+                reason = "send_timeout"
+            elif error is not None and not isinstance(error, WebSocketDisconnect):
+                reason = "error"
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+        manager.disconnect(websocket, reason)
+        if reason != "client":
+            await close_quietly(websocket, 1001 if reason == "idle" else 1011)
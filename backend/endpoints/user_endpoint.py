@@ -14,8 +14,9 @@ from typing import List, Dict, Any
 from models import User, Alert
 import crud
 from auth_utils import get_current_user
-from endpoints.device_endpoint import engine
-from utils import send_telegram_alert
+from database import engine
+from utils import send_telegram_alert, escape_markdown
+import asyncio
 import logging
 logger = logging.getLogger(__name__)
 
@@ -48,10 +49,8 @@ async def create_user(user_obj: User, session: Session = Depends(get_session), a
     try:
         created = crud.create_user(session, user_obj)
     except Exception as e:
-        import logging
-        logging.error(f"Error en create_user: {e}")
+        logger.error(f"Error en create_user: {e}")
         raise HTTPException(status_code=400, detail=str(e))
-    from utils import escape_markdown
     msg = (
         "👤🆕 *New user created*\n"
         f"• Username: {escape_markdown(user_obj.username)}\n"
@@ -71,8 +70,7 @@ def read_users(session: Session = Depends(get_session), admin: User = Depends(ad
     try:
         return crud.get_users(session)
     except Exception as e:
-        import logging
-        logging.error(f"Error in read_users: {e}")
+        logger.error(f"Error in read_users: {e}")
         raise HTTPException(status_code=400, detail=f"Error getting users: {str(e)}")
 
 @router.get("/alerts", response_model=List[Alert])
@@ -106,7 +104,6 @@ async def update_user(user_id: int, user_obj: User, session: Session = Depends(g
     updated = crud.update_user(session, user_id, user_obj.dict(exclude_unset=True))
     if not updated:
         raise HTTPException(status_code=404, detail="User not found")
-    from utils import escape_markdown
     msg = (
         "🔄 *User updated*\n"
         f"• Username: {escape_markdown(user_obj.username)}\n"
@@ -128,15 +125,12 @@ def delete_user(user_id: int, session: Session = Depends(get_session), admin: Us
         return {"ok": False, "detail": "User not found"}
     msg = f"User {admin.username} deleted user {user.username}"
     try:
-        import asyncio
         asyncio.create_task(send_telegram_alert(msg))
     except Exception as e:
-        import logging
-        logging.error(f"Error sending Telegram alert: {e}")
+        logger.error(f"Error sending Telegram alert: {e}")
     try:
         deleted = crud.delete_user(session, user_id)
     except Exception as e:
-        import logging
-        logging.error(f"Error deleting user {user_id}: {e}")
+        logger.error(f"Error deleting user {user_id}: {e}")
         return {"ok": False, "detail": f"Error deleting user: {str(e)}"}
     return {"ok": True}
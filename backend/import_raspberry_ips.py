@@ -11,7 +11,7 @@ Evita duplicados y permite la importación masiva de múltiples dispositivos.
 import os
 from sqlmodel import Session, select
 from models import Device
-from endpoints.device_endpoint import engine
+from database import engine, init_db
 from dotenv import load_dotenv
 from typing import List
 
@@ -61,6 +61,7 @@ def main() -> None:
     Punto de entrada principal del script. Maneja el proceso de importación.
     """
     ips = get_ips_from_env()
+    init_db()
     import_ips(ips)
 
 if __name__ == "__main__":
@@ -2,63 +2,146 @@
 main.py
 
 Entry point for the Raspberry Pi Dashboard backend API.
-Initializes FastAPI application, configures logging, CORS, and registers API routers.
-Starts background monitoring for device status.
+`create_app()` builds the FastAPI application: configures logging, initializes the database schema,
+CORS, and registers API routers. Starts and stops the supervised background jobs (monitoring, alerts, metrics, retention) with the app lifespan.
 
 Punto de entrada para la API backend de Raspberry Pi Dashboard.
-Inicializa la aplicación FastAPI, configura logging, CORS y registra los routers de la API.
-Inicia la monitorización en segundo plano del estado de los dispositivos.
+`create_app()` construye la aplicación FastAPI: configura logging, inicializa el esquema de la base de
+datos, CORS y registra los routers de la API. Inicia y detiene los trabajos supervisados en segundo plano (monitoreo, alertas, métricas, retención) con el ciclo de vida de la app.
 """
 
 from dotenv import load_dotenv
-import logging
-import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from endpoints.status_endpoint import router as status_router
+from endpoints.operation_endpoint import router as operation_router
+from endpoints.discovery_endpoint import router as discovery_router
 from endpoints.device_endpoint import router as device_router
 from endpoints.auth_endpoint import router as auth_router
 from endpoints.user_endpoint import router as user_router
-from endpoints.status_ws import router as ws_router
-from background.ping_task import start_monitoring
+from endpoints.status_ws import router as ws_router, reap_connections, WS_REAP_INTERVAL
+from endpoints.metrics_endpoint import router as metrics_router
+from endpoints.group_endpoint import router as group_router
+from endpoints.debug_endpoint import router as debug_router
+from endpoints.log_endpoint import router as log_router
+from database import engine, init_db, DB_AUTO_MIGRATE
+from sqlmodel import Session
+from background.supervisor import TaskSupervisor
+from background.ping_task import poll_devices, MONITOR_INTERVAL
+from background.alert_task import send_pending_alerts, ALERT_SEND_INTERVAL
+from background.metric_task import flush_metrics, METRIC_FLUSH_INTERVAL
+from background.retention_task import purge_expired, RETENTION_INTERVAL
+from background.log_task import collect_logs, flush_logs, LOG_ARCHIVE_INTERVAL
+from background.discovery_task import discover_devices, stop_sweep, DISCOVERY_INTERVAL
+from services.discovery import DISCOVERY_CIDRS
+from services.metrics import measure_loop_lag
+from services.group_aggregates import group_aggregates
+from services.device_registry import device_registry
+from services.logging_utils import setup_logging
+from services.serialization import ORJSONResponse
+from services.compression import CompressionMiddleware, COMPRESSION_ENABLED
+from services.request_timing import ServerTimingMiddleware, SERVER_TIMING_ENABLED, instrument_engine
+from services.operations import cancel_all as cancel_operations
+from services.federation import federation
+import crud
+from utils import close_client
 
 # Load environment variables from .env file
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
 
-# Configure logging to file and console
-# Configurar logging a archivo y consola
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("backend.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the background job supervisor on startup and cancel its jobs on shutdown.
+    Inicia el supervisor de trabajos en segundo plano al arrancar y cancela sus trabajos al apagar.
+    """
+    # Load the group tree before the first poll cycle / Cargar el árbol de grupos antes del primer ciclo de sondeo
+    with Session(engine) as session:
+        group_aggregates.load(session)
+        # Operations of a previous process can no longer finish / Las operaciones de un proceso anterior ya no pueden terminar
+        crud.interrupt_operations(session)
+    supervisor = TaskSupervisor()
+    supervisor.add("poller", poll_devices, MONITOR_INTERVAL)
+    supervisor.add("alert_sender", send_pending_alerts, ALERT_SEND_INTERVAL)
+    supervisor.add("metric_flusher", flush_metrics, METRIC_FLUSH_INTERVAL)
+    supervisor.add("retention", purge_expired, RETENTION_INTERVAL)
+    supervisor.add("loop_lag", measure_loop_lag, 0)
+    supervisor.add("ws_reaper", reap_connections, WS_REAP_INTERVAL)
+    supervisor.add("log_collector", collect_logs, LOG_ARCHIVE_INTERVAL)
+    if DISCOVERY_INTERVAL > 0 and DISCOVERY_CIDRS:
+        supervisor.add("discovery", discover_devices, DISCOVERY_INTERVAL)
+    app.state.supervisor = supervisor
+    supervisor.start()
+    # Follow the event streams of the peer backends / Seguir los flujos de eventos de los backends pares
+    federation.start()
+    try:
+        yield
+    finally:
+        await federation.stop()
+        await supervisor.stop()
+        await cancel_operations()
+        await stop_sweep()
+        # Persist samples still in the buffer / Persistir las muestras que quedan en el buffer
+        await flush_metrics()
+        await flush_logs()
+        await close_client()
 
-# Create FastAPI application instance
-# Crear instancia de la aplicación FastAPI
-app = FastAPI()
+def create_app() -> FastAPI:
+    """
+    Build the FastAPI application. Configures logging and, unless DB_AUTO_MIGRATE=false, creates or
+    upgrades the database schema (otherwise run `python migrate.py` first).
+    Construye la aplicación FastAPI. Configura logging y, salvo DB_AUTO_MIGRATE=false, crea o actualiza
+    el esquema de la base de datos (si no, ejecutar antes `python migrate.py`).
+    """
+    # Configure queued logging to a rotating JSON file and the console
+    # Configurar logging encolado a un archivo JSON rotativo y la consola
+    setup_logging()
+    if DB_AUTO_MIGRATE:
+        init_db()
+    device_registry.bind(engine)
 
-# Configure CORS to allow all origins and credentials
-# Configurar CORS para permitir todos los orígenes y credenciales
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
-# Register API routers for different endpoints
-# Registrar routers de la API para los diferentes endpoints
-app.include_router(status_router)
-app.include_router(device_router)
-app.include_router(auth_router)
-app.include_router(user_router)
-app.include_router(ws_router)
+    # Configure CORS to allow all origins and credentials
+    # Configurar CORS para permitir todos los orígenes y credenciales
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
-# Start background monitoring thread for device status
-# Iniciar hilo de monitorización en segundo plano para el estado de los dispositivos
-threading.Thread(target=start_monitoring, daemon=True).start()
+    # Compress large JSON responses (status, logs, metrics) for slow field links
+    # Comprimir respuestas JSON grandes (estado, logs, métricas) para enlaces lentos en campo
+    if COMPRESSION_ENABLED:
+        app.add_middleware(CompressionMiddleware)
+
+    # Per-request timing breakdown for requests sending X-Server-Timing (outermost, so its total covers the rest)
+    # Desglose de tiempos por petición para las que envían X-Server-Timing (el más externo, así su total cubre el resto)
+    if SERVER_TIMING_ENABLED:
+        instrument_engine(engine)
+        app.add_middleware(ServerTimingMiddleware)
+
+    # Register API routers for different endpoints
+    # Registrar routers de la API para los diferentes endpoints
+    app.include_router(status_router)
+    # Before the device router so /devices/operations is not taken as /devices/{device_id}
+    # Antes del router de dispositivos para que /devices/operations no se tome como /devices/{device_id}
+    app.include_router(operation_router)
+    app.include_router(discovery_router)
+    app.include_router(device_router)
+    app.include_router(auth_router)
+    app.include_router(user_router)
+    app.include_router(ws_router)
+    app.include_router(metrics_router)
+    app.include_router(group_router)
+    app.include_router(debug_router)
+    app.include_router(log_router)
+    return app
+
+# Application instance served by uvicorn (main:app)
+# Instancia de la aplicación servida por uvicorn (main:app)
+app = create_app()
@@ -0,0 +1,22 @@
+"""
+migrate.py
+
+Utility script to create or upgrade the database schema (tables, new columns and indexes).
+Run it before starting the backend with DB_AUTO_MIGRATE=false.
+
+Script utilitario para crear o actualizar el esquema de la base de datos (tablas, columnas e índices nuevos).
+Ejecutarlo antes de iniciar el backend con DB_AUTO_MIGRATE=false.
+"""
+
+from database import DATABASE_URL, init_db
+
+def main() -> None:
+    """
+    Main entry point for the script. Applies the schema to DATABASE_URL.
+    Punto de entrada principal del script. Aplica el esquema a DATABASE_URL.
+    """
+    init_db()
+    print(f"Schema up to date: {DATABASE_URL}")
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,28 @@
 models.py
 
 Data models for the Raspberry Pi Dashboard backend.
-Defines the main tables: Device, MetricHistory, User, and Alert.
+Defines the main tables: DeviceGroup, Device, MetricHistory, Metric, MetricSample, User, Alert, Incident, and DeviceOperation.
 
 Modelos de datos para el backend de Raspberry Pi Dashboard.
-Define las tablas principales: Device, MetricHistory, User y Alert.
+Define las tablas principales: DeviceGroup, Device, MetricHistory, Metric, MetricSample, User, Alert, Incident y DeviceOperation.
 """
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 from typing import Optional
 from datetime import datetime
 
+class DeviceGroup(SQLModel, table=True):
+    """
+    Group of devices (basin, network, region...). Groups can be nested through parent_id.
+    Grupo de dispositivos (cuenca, red, región...). Los grupos se pueden anidar mediante parent_id.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(description="Group name")
+    kind: str = Field(default="region", description="Group kind, e.g. 'basin', 'network', 'region'")
+    parent_id: Optional[int] = Field(default=None, foreign_key="devicegroup.id", index=True, description="Parent group ID")
+    description: Optional[str] = Field(default=None, description="Optional description")
+
 class Device(SQLModel, table=True):
     """
     Represents a registered device (Raspberry Pi) in the system.
@@ -22,6 +34,8 @@ class Device(SQLModel, table=True):
     ip: str = Field(description="Device IP address")
     description: Optional[str] = Field(default=None, description="Optional description ")
     enabled: bool = Field(default=True, description="Whether the device is enabled")
+    group_id: Optional[int] = Field(default=None, foreign_key="devicegroup.id", index=True, description="Group ID")
+    device_type: str = Field(default="raingauge", description="Payload schema used to extract its readings")
 
 class MetricHistory(SQLModel, table=True):
     """
@@ -37,6 +51,28 @@ class MetricHistory(SQLModel, table=True):
     temp: Optional[float] = Field(default=None, description="Temperature (°C)")
     status: Optional[str] = Field(default=None, description="Reported status")
 
+class Metric(SQLModel, table=True):
+    """
+    Interned name of a reading extracted from device payloads (e.g. 'rain.mm').
+    Nombre internado de una lectura extraída de los payloads de los dispositivos (p. ej. 'rain.mm').
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(index=True, unique=True, description="Metric name")
+    unit: Optional[str] = Field(default=None, description="Unit, e.g. 'mm' or 'V'")
+
+class MetricSample(SQLModel, table=True):
+    """
+    One reading of a device: narrow time series keyed by (device, metric, ts).
+    Una lectura de un dispositivo: serie temporal estrecha indexada por (dispositivo, métrica, ts).
+    """
+    __table_args__ = (Index("ix_metricsample_device_metric_ts", "device_id", "metric_id", "ts"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    device_id: int = Field(foreign_key="device.id", description="Associated device ID")
+    metric_id: int = Field(foreign_key="metric.id", description="Metric ID")
+    ts: int = Field(index=True, description="Unix timestamp (s, UTC)")
+    value: float = Field(description="Reading value")
+
 class User(SQLModel, table=True):
     """
     System user with role and credentials.
@@ -51,12 +87,64 @@ class User(SQLModel, table=True):
 class Alert(SQLModel, table=True):
     """
     Alert generated by a status change or relevant event on a device.
+    Alerts with a condition (e.g. 'offline') are a state: one row stays open per device and condition,
+    repeats increase `occurrences`, and recovery resolves it.
+
     Alerta generada por un cambio de estado o evento relevante en un dispositivo.
+    Las alertas con condición (p. ej. 'offline') son un estado: queda una fila abierta por dispositivo y
+    condición, las repeticiones incrementan `occurrences` y la recuperación la resuelve.
     """
+    __table_args__ = (Index("ix_alert_device_condition", "device_id", "condition", "resolved"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     device_id: int = Field(foreign_key="device.id", description="Associated device ID")
-    timestamp: datetime = Field(default_factory=datetime.utcnow, description="Alert timestamp")
-    level: str = Field(description="Alert level: CRITICAL, WARNING, INFO")
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True, description="Alert timestamp")
+    level: str = Field(index=True, description="Alert level: CRITICAL, WARNING, INFO")
     message: str = Field(description="Alert message")
-    resolved: bool = Field(default=False, description="Whether the alert has been resolved")
+    resolved: bool = Field(default=False, index=True, description="Whether the alert has been resolved")
     sent_to_telegram: bool = Field(default=False, description="Whether the alert was sent to Telegram")
+    condition: Optional[str] = Field(default=None, description="Condition key, e.g. 'offline'")
+    occurrences: int = Field(default=1, description="Times the condition was raised while this alert was open or reopened")
+    last_seen: Optional[datetime] = Field(default=None, description="Last time the condition was raised")
+    resolved_at: Optional[datetime] = Field(default=None, description="Resolution timestamp")
+    incident_id: Optional[int] = Field(default=None, foreign_key="incident.id", index=True, description="Correlated incident ID")
+    telegram_error: Optional[str] = Field(default=None, description="Why Telegram permanently rejected the alert, if it did")
+
+class Incident(SQLModel, table=True):
+    """
+    Correlated outage grouping the alerts of several devices, e.g. a whole subnet going offline.
+    Incidente correlacionado que agrupa las alertas de varios dispositivos, p. ej. una subred entera offline.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    scope: str = Field(default="subnet", description="Correlation scope, e.g. 'subnet'")
+    key: str = Field(index=True, description="Scope key, e.g. '10.0.3.0/24'")
+    condition: str = Field(description="Condition of the grouped alerts")
+    message: str = Field(description="Incident message")
+    opened_at: datetime = Field(default_factory=datetime.utcnow, description="Opening timestamp")
+    last_seen: datetime = Field(default_factory=datetime.utcnow, description="Last time a device joined the incident")
+    device_count: int = Field(default=0, description="Devices linked to the incident")
+    resolved: bool = Field(default=False, index=True, description="Whether every linked device recovered")
+    resolved_at: Optional[datetime] = Field(default=None, description="Resolution timestamp")
+    sent_to_telegram: bool = Field(default=False, description="Whether the opening was sent to Telegram")
+    resolution_sent: bool = Field(default=False, description="Whether the resolution was sent to Telegram")
+    telegram_error: Optional[str] = Field(default=None, description="Why Telegram permanently rejected the opening or resolution, if it did")
+
+class DeviceOperation(SQLModel, table=True):
+    """
+    A named operation (reboot, service restart, config push) run against a set of devices, with its
+    progress counters and per-device results (JSON list).
+    Una operación con nombre (reinicio, reinicio de servicio, envío de configuración) ejecutada sobre
+    un conjunto de dispositivos, con sus contadores de progreso y resultados por dispositivo (lista JSON).
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(index=True, description="Operation name, e.g. 'reboot'")
+    params: str = Field(default="{}", description="JSON body sent to every device")
+    target: str = Field(default="{}", description="JSON filter that selected the devices")
+    status: str = Field(default="running", index=True, description="'running', 'completed', 'cancelled', 'failed' or 'interrupted'")
+    created_by: Optional[str] = Field(default=None, description="User who started the operation")
+    created_at: datetime = Field(default_factory=datetime.utcnow, description="Start timestamp")
+    finished_at: Optional[datetime] = Field(default=None, description="End timestamp")
+    total: int = Field(default=0, description="Targeted devices")
+    succeeded: int = Field(default=0, description="Devices that answered with a 2xx status")
+    failed: int = Field(default=0, description="Devices that failed or timed out")
+    results: str = Field(default="[]", description="JSON list of per-device results")
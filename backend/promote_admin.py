@@ -6,13 +6,11 @@ Utility script to promote an existing user to admin role in the Raspberry Pi Das
 Script utilitario para promover un usuario existente al rol de administrador en la base de datos del Raspberry Pi Dashboard.
 """
 
-from sqlmodel import Session, create_engine, select
+from sqlmodel import Session, select
 from models import User
+from database import engine
 from typing import Optional
 
-DATABASE_URL = "sqlite:///raspberry.db"
-engine = create_engine(DATABASE_URL)
-
 def promote_to_admin(session: Session, username: str) -> None:
     """
     Promote an existing user to admin role.
@@ -0,0 +1,100 @@
+"""
+circuit_breaker.py
+
+Per-device circuit breakers for requests to the Raspberry Pis. After BREAKER_FAILURE_THRESHOLD
+consecutive failures a device's breaker opens and requests fail fast for BREAKER_RESET_SECONDS;
+then one trial request is let through (half-open) and its result closes or reopens the breaker.
+Each device endpoint (status, log) has its own breaker, so failing log fetches never gate the
+status requests that decide whether a device is offline.
+
+Circuit breakers por dispositivo para las peticiones a las Raspberry Pi. Tras
+BREAKER_FAILURE_THRESHOLD fallos consecutivos el breaker del dispositivo se abre y las peticiones
+fallan de inmediato durante BREAKER_RESET_SECONDS; luego se deja pasar una petición de prueba
+(semiabierto) y su resultado cierra o vuelve a abrir el breaker. Cada endpoint del dispositivo
+(status, log) tiene su propio breaker, así los fallos al obtener logs nunca bloquean las peticiones
+de estado que deciden si un dispositivo está offline.
+"""
+
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from services.metrics import BREAKERS_OPEN, BREAKER_TRANSITIONS
+
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open state machine for one device.
+    Máquina de estados cerrado / abierto / semiabierto para un dispositivo.
+    """
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+        if state == OPEN and self.state == CLOSED:
+            BREAKERS_OPEN.inc()
+        elif state == CLOSED:
+            BREAKERS_OPEN.dec()
+        BREAKER_TRANSITIONS.labels(state).inc()
+        self.state = state
+
+    def allow(self) -> bool:
+        """
+        True if a request may be sent now. In half-open state only one trial request is allowed.
+        True si ahora se puede enviar una petición. En estado semiabierto solo se permite una petición de prueba.
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """
+        Forget an allowed request that was cancelled before it finished.
+        Olvida una petición permitida que se canceló antes de terminar.
+        """
+        self.trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.trial_in_flight = False
+        self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.state != CLOSED else None,
+        }
+
+# One breaker per device IP and endpoint / Un breaker por IP de dispositivo y endpoint
+breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+def breaker_for(ip: str, endpoint: str) -> CircuitBreaker:
+    breaker = breakers.get((ip, endpoint))
+    if breaker is None:
+        breaker = breakers[(ip, endpoint)] = CircuitBreaker()
+    return breaker
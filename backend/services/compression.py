@@ -0,0 +1,117 @@
+"""
+compression.py
+
+Negotiated HTTP response compression (brotli when the optional `brotli` package is installed, gzip
+otherwise) for JSON and text bodies above a size threshold. Streaming responses such as event
+streams are passed through untouched. Bytes saved and compression time are exported as metrics.
+WebSocket frames are compressed by the server with permessage-deflate (see docs/api.md).
+
+Compresión negociada de respuestas HTTP (brotli si el paquete opcional `brotli` está instalado, gzip
+en caso contrario) para cuerpos JSON y de texto que superan un umbral de tamaño. Las respuestas en
+streaming, como los flujos de eventos, pasan sin modificar. Los bytes ahorrados y el tiempo de
+compresión se exportan como métricas. Los frames WebSocket los comprime el servidor con
+permessage-deflate (ver docs/api.md).
+"""
+
+import gzip
+import os
+import time
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from services.metrics import COMPRESSION_BYTES, COMPRESSION_SECONDS
+
+try:
+    import brotli
+except ImportError:  # Optional dependency / Dependencia opcional
+    brotli = None
+
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+# Bodies larger than this are compressed in a worker thread to keep the event loop responsive
+# Los cuerpos mayores que esto se comprimen en un hilo para mantener el event loop ágil
+COMPRESSION_THREAD_MIN_SIZE = 256 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv")
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best supported encoding from an Accept-Encoding header ("br", "gzip" or None).
+    Elige la mejor codificación soportada de una cabecera Accept-Encoding ("br", "gzip" o None).
+    """
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compress a body with the given encoding.
+    Comprime un cuerpo con la codificación dada.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing single-chunk JSON/text responses above a size threshold.
+    Middleware ASGI que comprime respuestas JSON/texto de un solo bloque por encima de un umbral de tamaño.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            response_start, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=response_start["headers"])
+            content_type = headers.get("content-type", "").split(";")[0].strip()
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or "content-encoding" in headers or content_type not in COMPRESSIBLE_TYPES):
+                await send(response_start)
+                await send(message)
+                return
+            started = time.perf_counter()
+            if len(body) >= COMPRESSION_THREAD_MIN_SIZE:
+                compressed = await run_in_threadpool(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            COMPRESSION_SECONDS.labels(encoding).observe(time.perf_counter() - started)
+            COMPRESSION_BYTES.labels(encoding, "original").inc(len(body))
+            COMPRESSION_BYTES.labels(encoding, "compressed").inc(len(compressed))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(response_start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
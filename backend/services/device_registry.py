@@ -0,0 +1,133 @@
+"""
+device_registry.py
+
+In-process cache of the device table. Devices change a few times a day but are read on every poll
+cycle, status/log request and WebSocket tick, so they are loaded once and kept in memory with O(1)
+lookups by ID and IP. The CRUD functions write changes through to the cache; a periodic reload
+(DEVICE_REGISTRY_TTL) picks up rows written directly by the import scripts.
+
+Caché en proceso de la tabla de dispositivos. Los dispositivos cambian pocas veces al día pero se
+leen en cada ciclo de sondeo, petición de estado/logs y tick del WebSocket, así que se cargan una vez
+y se mantienen en memoria con búsquedas O(1) por ID e IP. Las funciones CRUD escriben los cambios
+también en la caché; una recarga periódica (DEVICE_REGISTRY_TTL) recoge las filas escritas
+directamente por los scripts de importación.
+"""
+
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+from sqlmodel import Session, select
+from models import Device
+from services.group_aggregates import group_aggregates
+from services.http_cache import DEVICES
+from services.serialization import row_to_dict
+
+logger = logging.getLogger(__name__)
+
+DEVICE_REGISTRY_TTL = float(os.environ.get("DEVICE_REGISTRY_TTL", "300"))
+
+def detached_copy(device: Device) -> Device:
+    """
+    Copy of a device that does not depend on any session.
+    Copia de un dispositivo que no depende de ninguna sesión.
+    """
+    return Device(**row_to_dict(device))
+
+class DeviceRegistry:
+    """
+    Devices by ID and by IP, plus the cached list of enabled devices.
+    Dispositivos por ID y por IP, más la lista en caché de dispositivos habilitados.
+    """
+    def __init__(self, ttl: float = DEVICE_REGISTRY_TTL):
+        self.ttl = ttl
+        self.engine = None
+        self.by_id: Dict[int, Device] = {}
+        self.by_ip: Dict[str, Device] = {}
+        self._enabled: Optional[List[Device]] = None
+        self.loaded_at: Optional[float] = None
+
+    def bind(self, engine) -> None:
+        """
+        Set the engine used to (re)load the registry.
+        Define el engine usado para (re)cargar el registro.
+        """
+        self.engine = engine
+        self.loaded_at = None
+
+    def reload(self) -> None:
+        """
+        Load every device from the database. External changes also refresh the group tree and the
+        device list ETag.
+        Carga todos los dispositivos de la base de datos. Los cambios externos también refrescan el
+        árbol de grupos y el ETag de la lista de dispositivos.
+        """
+        with Session(self.engine) as session:
+            rows = session.exec(select(Device)).all()
+            loaded = {d.id: detached_copy(d) for d in rows}
+            changed = self.loaded_at is not None and (
+                {i: row_to_dict(d) for i, d in loaded.items()} != {i: row_to_dict(d) for i, d in self.by_id.items()}
+            )
+            if changed:
+                logger.info("Device registry: external changes detected, %d devices", len(loaded))
+                group_aggregates.load(session)
+                DEVICES.bump()
+        self.by_id = loaded
+        self.by_ip = {d.ip: d for d in loaded.values()}
+        self._enabled = None
+        self.loaded_at = time.monotonic()
+
+    def _fresh(self) -> None:
+        if self.engine is not None and (self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl):
+            self.reload()
+
+    def get(self, device_id: int) -> Optional[Device]:
+        self._fresh()
+        return self.by_id.get(device_id)
+
+    def get_by_ip(self, ip: str) -> Optional[Device]:
+        self._fresh()
+        return self.by_ip.get(ip)
+
+    def all(self) -> List[Device]:
+        """
+        Every device ordered by ID.
+        Todos los dispositivos ordenados por ID.
+        """
+        self._fresh()
+        return [self.by_id[i] for i in sorted(self.by_id)]
+
+    def enabled(self) -> List[Device]:
+        """
+        Enabled devices ordered by ID, cached until the next change.
+        Dispositivos habilitados ordenados por ID, en caché hasta el próximo cambio.
+        """
+        self._fresh()
+        if self._enabled is None:
+            self._enabled = [d for d in self.all() if d.enabled]
+        return self._enabled
+
+    def put(self, device: Device) -> None:
+        """
+        Write-through after a device is created or updated.
+        Escritura directa tras crear o actualizar un dispositivo.
+        """
+        previous = self.by_id.get(device.id)
+        if previous is not None and self.by_ip.get(previous.ip) is previous:
+            del self.by_ip[previous.ip]
+        copy = detached_copy(device)
+        self.by_id[device.id] = copy
+        self.by_ip[copy.ip] = copy
+        self._enabled = None
+
+    def remove(self, device_id: int) -> None:
+        """
+        Write-through after a device is deleted.
+        Escritura directa tras eliminar un dispositivo.
+        """
+        previous = self.by_id.pop(device_id, None)
+        if previous is not None and self.by_ip.get(previous.ip) is previous:
+            del self.by_ip[previous.ip]
+        self._enabled = None
+
+device_registry = DeviceRegistry()
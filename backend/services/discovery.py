@@ -0,0 +1,206 @@
+"""
+discovery.py
+
+Network discovery of Raspberry Pi gauges. Configured CIDR ranges are swept with asyncio TCP connect
+probes to DEVICE_API_PORT by a pool of DISCOVERY_CONCURRENCY workers; hosts that accept the connection
+are confirmed with a GET /api/v1/status on that same connection. The connect timeout adapts to the
+measured round-trip time (smoothed RTT + 4 x deviation, as TCP does for retransmissions), so on a LAN
+dead addresses are given up in a fraction of a second and a /16 is swept in minutes. New hosts are
+reported as one summary and optionally inserted in bulk.
+
+Descubrimiento en red de pluviómetros Raspberry Pi. Los rangos CIDR configurados se recorren con
+sondas de conexión TCP asyncio al DEVICE_API_PORT mediante un pool de DISCOVERY_CONCURRENCY workers;
+los hosts que aceptan la conexión se confirman con un GET /api/v1/status sobre esa misma conexión. El
+timeout de conexión se adapta al tiempo de ida y vuelta medido (RTT suavizado + 4 x desviación, como
+hace TCP para las retransmisiones), así en una LAN las direcciones muertas se abandonan en una
+fracción de segundo y una /16 se recorre en minutos. Los hosts nuevos se reportan en un solo resumen
+y opcionalmente se insertan en bloque.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+from sqlmodel import Session
+from models import Device
+import crud
+from services.metrics import DISCOVERY_PROBES
+from utils import DEVICE_API_PORT, DEVICE_STATUS_READ_TIMEOUT
+
+try:
+    import resource
+except ImportError:  # Not available on Windows / No disponible en Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated CIDR ranges, e.g. "10.0.0.0/16,192.168.1.0/24" / Rangos CIDR separados por comas
+DISCOVERY_CIDRS = [c.strip() for c in os.environ.get("DISCOVERY_CIDRS", "").split(",") if c.strip()]
+DISCOVERY_CONCURRENCY = int(os.environ.get("DISCOVERY_CONCURRENCY", "512"))
+DISCOVERY_MIN_TIMEOUT = float(os.environ.get("DISCOVERY_MIN_TIMEOUT", "0.25"))
+DISCOVERY_MAX_TIMEOUT = float(os.environ.get("DISCOVERY_MAX_TIMEOUT", "2"))
+DISCOVERY_INITIAL_TIMEOUT = float(os.environ.get("DISCOVERY_INITIAL_TIMEOUT", "1"))
+# Largest range accepted in one sweep (a /16) / Rango más grande aceptado en un barrido (una /16)
+DISCOVERY_MAX_HOSTS = int(os.environ.get("DISCOVERY_MAX_HOSTS", "65536"))
+# File descriptors kept free for the rest of the app / Descriptores de archivo reservados para el resto de la app
+RESERVED_FDS = 128
+
+class AdaptiveTimeout:
+    """
+    Connect timeout derived from observed connect times: srtt + 4 * rttvar, clamped to
+    [DISCOVERY_MIN_TIMEOUT, DISCOVERY_MAX_TIMEOUT]. Refused connections count too, since the host answered.
+    Timeout de conexión derivado de los tiempos de conexión observados: srtt + 4 * rttvar, acotado a
+    [DISCOVERY_MIN_TIMEOUT, DISCOVERY_MAX_TIMEOUT]. Las conexiones rechazadas también cuentan, ya que el host respondió.
+    """
+    __slots__ = ("srtt", "rttvar", "value")
+
+    def __init__(self, initial: float = DISCOVERY_INITIAL_TIMEOUT):
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.value = initial
+
+    def observe(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.value = min(max(self.srtt + 4 * self.rttvar, DISCOVERY_MIN_TIMEOUT), DISCOVERY_MAX_TIMEOUT)
+
+def parse_ranges(cidrs: List[str]) -> List[ipaddress._BaseNetwork]:
+    """
+    Validate CIDR ranges; raises ValueError if one is invalid or the total exceeds DISCOVERY_MAX_HOSTS.
+    Valida rangos CIDR; lanza ValueError si uno no es válido o el total supera DISCOVERY_MAX_HOSTS.
+    """
+    networks = [ipaddress.ip_network(cidr, strict=False) for cidr in cidrs]
+    total = sum(n.num_addresses for n in networks)
+    if total > DISCOVERY_MAX_HOSTS:
+        raise ValueError(f"{total} addresses exceed DISCOVERY_MAX_HOSTS ({DISCOVERY_MAX_HOSTS})")
+    return networks
+
+def concurrency_limit(requested: int) -> int:
+    """
+    Requested concurrency capped by the open file limit (one socket per probe).
+    Concurrencia pedida limitada por el límite de archivos abiertos (un socket por sonda).
+    """
+    if resource is None:
+        return requested
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(min(requested, soft - RESERVED_FDS), 1)
+
+class DiscoverySweep:
+    """
+    One sweep over a set of ranges, with live progress counters.
+    Un barrido sobre un conjunto de rangos, con contadores de progreso en vivo.
+    """
+    def __init__(self, cidrs: List[str], known: Set[str], concurrency: int = DISCOVERY_CONCURRENCY,
+                 port: int = DEVICE_API_PORT):
+        self.networks = parse_ranges(cidrs)
+        self.cidrs = [str(n) for n in self.networks]
+        self.known = known
+        self.port = port
+        self.concurrency = concurrency_limit(concurrency)
+        self.timeout = AdaptiveTimeout()
+        self.total = sum(n.num_addresses if n.num_addresses <= 2 else n.num_addresses - 2 for n in self.networks)
+        self.scanned = 0
+        self.open = 0
+        self.found: List[str] = []
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+    def addresses(self) -> Iterator[str]:
+        seen: Set[str] = set()
+        for network in self.networks:
+            for address in network.hosts():
+                ip = str(address)
+                if ip not in seen:
+                    seen.add(ip)
+                    yield ip
+
+    async def probe(self, ip: str) -> bool:
+        """
+        Whether `ip` answers /api/v1/status with HTTP 200.
+        Si `ip` responde /api/v1/status con HTTP 200.
+        """
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, self.port), self.timeout.value)
+        except asyncio.TimeoutError:
+            DISCOVERY_PROBES.labels("timeout").inc()
+            return False
+        except ConnectionRefusedError:
+            self.timeout.observe(time.perf_counter() - started)
+            DISCOVERY_PROBES.labels("refused").inc()
+            return False
+        except OSError:
+            DISCOVERY_PROBES.labels("unreachable").inc()
+            return False
+        self.timeout.observe(time.perf_counter() - started)
+        self.open += 1
+        try:
+            writer.write(f"GET /api/v1/status HTTP/1.0\r\nHost: {ip}\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), DEVICE_STATUS_READ_TIMEOUT)
+            ok = status_line.split(b" ")[1:2] == [b"200"]
+        except (asyncio.TimeoutError, OSError):
+            ok = False
+        finally:
+            writer.close()
+        DISCOVERY_PROBES.labels("found" if ok else "open").inc()
+        return ok
+
+    async def run(self) -> List[str]:
+        """
+        Probe every address of the ranges not already registered and return the new hosts found.
+        Sondea cada dirección de los rangos que no esté ya registrada y retorna los hosts nuevos encontrados.
+        """
+        # Workers share one iterator: next() never awaits, so each address is taken exactly once
+        # Los workers comparten un iterador: next() nunca espera, así cada dirección se toma una sola vez
+        pending = self.addresses()
+
+        async def worker() -> None:
+            for ip in pending:
+                if ip not in self.known and await self.probe(ip):
+                    self.found.append(ip)
+                self.scanned += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, self.total) or 1)))
+        self.finished = time.time()
+        self.found.sort(key=ipaddress.ip_address)
+        return self.found
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.finished or time.time()
+        return {
+            "cidrs": self.cidrs, "running": self.finished is None, "total": self.total, "scanned": self.scanned,
+            "open": self.open, "found": list(self.found), "added": [],
+            "timeout": round(self.timeout.value, 3), "concurrency": self.concurrency,
+            "seconds": round(end - self.started, 1),
+        }
+
+def add_devices(session: Session, ips: List[str]) -> List[Device]:
+    """
+    Register discovered hosts in one bulk insert.
+    Registra los hosts descubiertos con una sola inserción en bloque.
+    """
+    return crud.create_devices(session, [
+        Device(name=f"Raspberry {ip}", ip=ip, description="Found by network discovery", enabled=True) for ip in ips
+    ])
+
+def summary_message(summary: Dict[str, Any]) -> str:
+    """
+    One-line-per-fact text summary of a sweep (plain text, for logs, Telegram and the CLI).
+    Resumen en texto de un barrido, un dato por línea (texto plano, para logs, Telegram y la CLI).
+    """
+    lines = [
+        f"Discovery of {', '.join(summary['cidrs'])}: {len(summary['found'])} new device(s) "
+        f"in {summary['seconds']} s ({summary['scanned']} addresses, {summary['open']} with port open)",
+    ]
+    added = set(summary["added"])
+    for ip in summary["found"]:
+        lines.append(f"- {ip}{' (added)' if ip in added else ''}")
+    return "\n".join(lines)
@@ -0,0 +1,162 @@
+"""
+event_stream.py
+
+Shared stream of status and alert events for Server-Sent Events clients. The poller publishes one
+"status" event per cycle with the devices whose status changed, an "alerts" event when the unresolved
+alerts change and a "remove" event for devices that left; late fan-out results are published as they
+arrive. Each event is encoded once as an SSE frame with an ID ("<boot>:<n>") and kept in a bounded
+replay buffer (EVENT_REPLAY_SIZE events, EVENT_REPLAY_MAX_MB), so a client reconnecting with
+Last-Event-ID receives only what it missed. Clients read the buffer with their own cursor, so a slow
+client costs no memory; one that fell out of the buffer (or comes from another process) gets a snapshot.
+
+Flujo compartido de eventos de estado y alertas para clientes Server-Sent Events. El sondeo publica un
+evento "status" por ciclo con los dispositivos cuyo estado cambió, un evento "alerts" cuando cambian
+las alertas no resueltas y un evento "remove" para los dispositivos que salieron; los resultados
+atrasados del fan-out se publican al llegar. Cada evento se codifica una vez como frame SSE con un ID
+("<arranque>:<n>") y se guarda en un buffer de repetición acotado (EVENT_REPLAY_SIZE eventos,
+EVENT_REPLAY_MAX_MB), así un cliente que se reconecta con Last-Event-ID recibe solo lo que se perdió.
+Los clientes leen el buffer con su propio cursor, así un cliente lento no cuesta memoria; uno que quedó
+fuera del buffer (o viene de otro proceso) recibe una instantánea.
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from services.http_cache import BOOT_ID
+from services.serialization import dumps
+from services.status_hub import status_hub
+
+EVENT_REPLAY_SIZE = int(os.environ.get("EVENT_REPLAY_SIZE", "1000"))
+EVENT_REPLAY_MAX_MB = float(os.environ.get("EVENT_REPLAY_MAX_MB", "16"))
+
+class EventBus:
+    """
+    Numbered SSE frames in a bounded replay buffer, with a wakeup for waiting readers.
+    Frames SSE numerados en un buffer de repetición acotado, con aviso para los lectores en espera.
+    """
+    def __init__(self, size: int = EVENT_REPLAY_SIZE, max_bytes: int = int(EVENT_REPLAY_MAX_MB * 1024 * 1024)):
+        self.epoch = BOOT_ID
+        self.max_bytes = max_bytes
+        self.last_id = 0
+        self.buffer: Deque[Tuple[int, bytes]] = deque(maxlen=size)
+        self.bytes = 0
+        self._changed = asyncio.Event()
+
+    def event_id(self, n: int) -> str:
+        return f"{self.epoch}:{n}"
+
+    def frame(self, event: str, data: bytes, n: int) -> bytes:
+        return b"id: " + self.event_id(n).encode() + b"\nevent: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+    def publish(self, event: str, data: Any) -> int:
+        """
+        Append an event (data is JSON-encoded unless already bytes) and wake the readers. Returns its number.
+        Agrega un evento (data se codifica en JSON salvo que ya sean bytes) y despierta a los lectores. Retorna su número.
+        """
+        self.last_id += 1
+        frame = self.frame(event, data if isinstance(data, bytes) else dumps(data), self.last_id)
+        if len(self.buffer) == self.buffer.maxlen:
+            self.bytes -= len(self.buffer[0][1])
+        self.buffer.append((self.last_id, frame))
+        self.bytes += len(frame)
+        while self.bytes > self.max_bytes and len(self.buffer) > 1:
+            self.bytes -= len(self.buffer.popleft()[1])
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        return self.last_id
+
+    def cursor(self, last_event_id: Optional[str]) -> Optional[int]:
+        """
+        Event number a client resumes after, or None if it must start from a snapshot (no ID, another
+        process, or events it missed were already dropped from the buffer).
+        Número de evento tras el que continúa un cliente, o None si debe empezar con una instantánea (sin ID,
+        otro proceso, o los eventos que se perdió ya salieron del buffer).
+        """
+        if not last_event_id:
+            return None
+        epoch, _, n = last_event_id.partition(":")
+        if epoch != self.epoch or not n.isdigit() or int(n) > self.last_id:
+            return None
+        n = int(n)
+        oldest = self.buffer[0][0] if self.buffer else self.last_id + 1
+        return n if n + 1 >= oldest else None
+
+    def since(self, n: int) -> Optional[List[Tuple[int, bytes]]]:
+        """
+        Frames after event `n`, or None if some of them were already dropped.
+        Frames posteriores al evento `n`, o None si algunos ya se descartaron.
+        """
+        if n >= self.last_id:
+            return []
+        if not self.buffer or self.buffer[0][0] > n + 1:
+            return None
+        start = n + 1 - self.buffer[0][0]
+        return [self.buffer[i] for i in range(start, len(self.buffer))]
+
+    async def wait(self, n: int, timeout: float) -> None:
+        """
+        Wait until an event after `n` is published or `timeout` seconds pass.
+        Espera hasta que se publique un evento posterior a `n` o pasen `timeout` segundos.
+        """
+        if self.last_id > n:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+event_bus = EventBus()
+
+# Last JSON fragment sent per device, to publish only changed statuses
+# Último fragmento JSON enviado por dispositivo, para publicar solo los estados que cambiaron
+_sent_fragments: Dict[int, bytes] = {}
+_alerts_version: Optional[int] = None
+
+def publish_statuses(device_ids: Iterable[int]) -> Optional[int]:
+    """
+    Publish a "status" event with the given devices whose status hub fragment changed since it was last sent.
+    Publica un evento "status" con los dispositivos dados cuyo fragmento del hub de estado cambió desde el último envío.
+    """
+    changed = []
+    for device_id in device_ids:
+        if device_id not in status_hub.snapshots:
+            continue
+        fragment = status_hub.fragment(device_id, None)
+        if _sent_fragments.get(device_id) != fragment:
+            _sent_fragments[device_id] = fragment
+            changed.append(fragment)
+    if not changed:
+        return None
+    return event_bus.publish("status", b'{"status":[' + b",".join(changed) + b"]}")
+
+def publish_removed(device_ids: List[int]) -> None:
+    """
+    Publish a "remove" event for devices that were deleted or disabled.
+    Publica un evento "remove" para dispositivos eliminados o deshabilitados.
+    """
+    for device_id in device_ids:
+        _sent_fragments.pop(device_id, None)
+    if device_ids:
+        event_bus.publish("remove", {"device_ids": device_ids})
+
+def publish_alerts(version: int, load: Callable[[], List[Dict[str, Any]]]) -> None:
+    """
+    Publish an "alerts" event with every unresolved alert (from `load`) when the alert version changed.
+    Publica un evento "alerts" con todas las alertas no resueltas (de `load`) cuando cambió la versión de alertas.
+    """
+    global _alerts_version
+    if version != _alerts_version:
+        _alerts_version = version
+        event_bus.publish("alerts", {"alerts": load()})
+
+def snapshot_frame(alerts: List[Dict[str, Any]]) -> bytes:
+    """
+    "snapshot" frame with every known status and the unresolved alerts, tagged with the current event ID
+    so the client resumes from there.
+    Frame "snapshot" con todos los estados conocidos y las alertas no resueltas, con el ID de evento
+    actual para que el cliente continúe desde ahí.
+    """
+    data = (b'{"status":' + status_hub.status_array(status_hub.device_ids(), None)
+            + b',"alerts":' + dumps(alerts) + b"}")
+    return event_bus.frame("snapshot", data, event_bus.last_id)
@@ -0,0 +1,65 @@
+"""
+fanout.py
+
+Fleet fan-out with a response deadline. Requests to every device start together; the results ready
+by the deadline are returned at once and the late devices get a placeholder (pending or last known
+value). Late requests keep running in the background and their results are handed to a callback
+(pushed over the WebSocket) when they arrive, so one slow gauge no longer sets the latency of the
+whole response.
+
+Fan-out a la flota con plazo de respuesta. Las peticiones a todos los dispositivos empiezan juntas;
+los resultados listos antes del plazo se retornan de inmediato y los dispositivos atrasados reciben
+un valor provisional (pendiente o último valor conocido). Las peticiones atrasadas siguen en segundo
+plano y sus resultados se entregan a un callback (enviados por el WebSocket) cuando llegan, así un
+pluviómetro lento ya no fija la latencia de toda la respuesta.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, List, Set
+from services.metrics import FANOUT_LATE
+
+logger = logging.getLogger(__name__)
+
+FANOUT_DEADLINE_SECONDS = float(os.environ.get("FANOUT_DEADLINE_SECONDS", "2"))
+FANOUT_MAX_DEADLINE_SECONDS = 30.0
+
+# Strong references to running late-result callbacks / Referencias fuertes a los callbacks de resultados atrasados
+_late_tasks: Set[asyncio.Task] = set()
+
+async def _deliver(name: str, key: str, task: asyncio.Future, on_late: Callable[[str, Any], Awaitable[None]]) -> None:
+    try:
+        await on_late(key, task.exception() or task.result())
+    except Exception as e:
+        logger.error("Error delivering late %s result for %s: %s", name, key, e)
+
+async def gather_with_deadline(name: str, keys: List[str], fetch: Callable[[str], Awaitable[Any]], deadline: float,
+                               placeholder: Callable[[str], Any],
+                               on_late: Callable[[str, Any], Awaitable[None]]) -> List[Any]:
+    """
+    Run fetch(key) for every key and return the results in order after at most `deadline` seconds.
+    Exceptions are returned in place of results (like gather with return_exceptions=True); late keys
+    get placeholder(key) and on_late(key, result) is awaited when their request finishes.
+
+    Ejecuta fetch(key) para cada clave y retorna los resultados en orden tras como máximo `deadline`
+    segundos. Las excepciones se retornan en lugar del resultado (como gather con return_exceptions=True);
+    las claves atrasadas reciben placeholder(key) y se espera on_late(key, result) cuando su petición termina.
+    """
+    tasks = [asyncio.ensure_future(fetch(key)) for key in keys]
+    if tasks:
+        await asyncio.wait(tasks, timeout=deadline)
+    results = []
+    for key, task in zip(keys, tasks):
+        if task.done():
+            results.append(task.exception() or task.result())
+            continue
+        FANOUT_LATE.labels(name).inc()
+        results.append(placeholder(key))
+        task.add_done_callback(lambda t, key=key: _spawn(_deliver(name, key, t, on_late)))
+    return results
+
+def _spawn(coro: Awaitable[None]) -> None:
+    task = asyncio.ensure_future(coro)
+    _late_tasks.add(task)
+    task.add_done_callback(_late_tasks.discard)
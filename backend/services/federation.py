@@ -0,0 +1,304 @@
+"""
+federation.py
+
+Federation of several backends into one view. Each peer in FEDERATION_PEERS (one backend per
+observatory network) is followed through its Server-Sent Events stream (/api/v1/events): the first
+"snapshot" fills a per-peer cache of device statuses and unresolved alerts, and later "status",
+"alerts" and "remove" events update it incrementally. When the link drops it reconnects with backoff
+and sends Last-Event-ID, so the peer replays only what was missed (or a fresh snapshot if the peer
+restarted). The cached entries, tagged with "peer" (and "stale" while the link is down), are merged
+into /api/v1/status and /ws/status; remote devices are never polled from here. Only each instance's
+own devices travel in its event stream, so peers may follow each other without loops.
+
+Federación de varios backends en una sola vista. Cada par de FEDERATION_PEERS (un backend por red de
+observatorios) se sigue mediante su flujo Server-Sent Events (/api/v1/events): la primera
+"snapshot" llena una caché por par con los estados de dispositivos y las alertas no resueltas, y los
+eventos "status", "alerts" y "remove" posteriores la actualizan de forma incremental. Cuando el enlace
+se corta se reconecta con backoff y envía Last-Event-ID, así el par repite solo lo que se perdió (o
+una instantánea nueva si el par se reinició). Las entradas en caché, marcadas con "peer" (y "stale"
+mientras el enlace está caído), se combinan en /api/v1/status y /ws/status; los dispositivos remotos
+nunca se sondean desde aquí. En el flujo de eventos de cada instancia solo viajan sus propios
+dispositivos, así los pares pueden seguirse mutuamente sin ciclos.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import httpx
+import orjson
+from services.metrics import FEDERATION_EVENTS, FEDERATION_PEERS_CONNECTED, FEDERATION_RECONNECTS
+from services.serialization import dumps
+from services.status_hub import BASE_FIELDS, FieldSet
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated peers, "name=http://host:port" or just the URL (named after host:port)
+# Pares separados por comas, "nombre=http://host:puerto" o solo la URL (se nombran por host:puerto)
+FEDERATION_PEERS = os.environ.get("FEDERATION_PEERS", "")
+FEDERATION_CONNECT_TIMEOUT = float(os.environ.get("FEDERATION_CONNECT_TIMEOUT", "5"))
+# Peers send a keepalive every SSE_KEEPALIVE_SECONDS (15); a longer silence means the link is dead
+# Los pares envían un keepalive cada SSE_KEEPALIVE_SECONDS (15); un silencio mayor significa que el enlace murió
+FEDERATION_READ_TIMEOUT = float(os.environ.get("FEDERATION_READ_TIMEOUT", "45"))
+FEDERATION_MAX_BACKOFF = float(os.environ.get("FEDERATION_MAX_BACKOFF", "60"))
+FEDERATION_HTTP_TIMEOUT = httpx.Timeout(FEDERATION_READ_TIMEOUT, connect=FEDERATION_CONNECT_TIMEOUT)
+# Fields added to every remote entry / Campos agregados a cada entrada remota
+PEER_FIELDS = ("peer", "stale")
+
+def parse_peers(value: str) -> List[Tuple[str, str]]:
+    """
+    (name, base URL) pairs from a FEDERATION_PEERS value. Raises ValueError for invalid URLs or repeated names.
+    Pares (nombre, URL base) de un valor de FEDERATION_PEERS. Lanza ValueError para URLs no válidas o nombres repetidos.
+    """
+    peers: List[Tuple[str, str]] = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, url = item.partition("=") if "=" in item.split("://")[0] else ("", "", item)
+        url = url.strip().rstrip("/")
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            raise ValueError(f"Invalid federation peer URL: {url!r}")
+        name = name.strip() or parsed.netloc
+        if any(name == existing for existing, _ in peers):
+            raise ValueError(f"Repeated federation peer name: {name!r}")
+        peers.append((name, url))
+    return peers
+
+class Peer:
+    """
+    Link to one peer backend: its cached statuses and alerts, the last event ID received and link health.
+    Enlace con un backend par: sus estados y alertas en caché, el último ID de evento recibido y la salud del enlace.
+    """
+    def __init__(self, name: str, url: str, on_change):
+        self.name = name
+        self.url = url
+        self.on_change = on_change
+        self.statuses: Dict[int, Dict[str, Any]] = {}
+        self.alerts: List[Dict[str, Any]] = []
+        self.last_event_id: Optional[str] = None
+        self.connected = False
+        self.synced = False
+        self.retry = 3.0
+        self.failures = 0
+        self.reconnects = 0
+        self.events = 0
+        self.connected_at: Optional[float] = None
+        self.last_event_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def tag(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        entry["peer"] = self.name
+        return entry
+
+    def apply(self, event: str, data: bytes) -> None:
+        """
+        Update the cache with one event of the peer's stream.
+        Actualiza la caché con un evento del flujo del par.
+        """
+        payload = orjson.loads(data)
+        if event == "snapshot":
+            self.statuses = {s["device_id"]: self.tag(s) for s in payload.get("status", ())}
+            self.alerts = [self.tag(a) for a in payload.get("alerts", ())]
+            self.synced = True
+        elif event == "status":
+            for status in payload.get("status", ()):
+                self.statuses[status["device_id"]] = self.tag(status)
+        elif event == "alerts":
+            self.alerts = [self.tag(a) for a in payload.get("alerts", ())]
+        elif event == "remove":
+            for device_id in payload.get("device_ids", ()):
+                self.statuses.pop(device_id, None)
+        else:
+            return
+        self.events += 1
+        FEDERATION_EVENTS.labels(self.name, event).inc()
+        self.on_change()
+
+    async def follow(self, client: httpx.AsyncClient) -> None:
+        """
+        Read the peer's event stream until it ends or fails, resuming after the last event received.
+        Lee el flujo de eventos del par hasta que termina o falla, continuando tras el último evento recibido.
+        """
+        headers = {"Accept": "text/event-stream"}
+        if self.last_event_id:
+            headers["Last-Event-ID"] = self.last_event_id
+        async with client.stream("GET", f"{self.url}/api/v1/events", headers=headers) as response:
+            response.raise_for_status()
+            self.set_connected(True)
+            self.failures = 0
+            event_id, event, data = None, "message", []
+            async for line in response.aiter_lines():
+                self.last_event_at = time.time()
+                if line:
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "data":
+                        data.append(value)
+                    elif field == "event":
+                        event = value
+                    elif field == "id":
+                        event_id = value
+                    elif field == "retry" and value.isdigit():
+                        self.retry = int(value) / 1000
+                    continue
+                # Blank line: dispatch the event / Línea en blanco: despachar el evento
+                if data:
+                    self.apply(event, "\n".join(data).encode())
+                    if event_id is not None:
+                        self.last_event_id = event_id
+                event_id, event, data = None, "message", []
+
+    def set_connected(self, connected: bool) -> None:
+        if connected == self.connected:
+            return
+        self.connected = connected
+        self.connected_at = time.time() if connected else None
+        if connected:
+            FEDERATION_PEERS_CONNECTED.inc()
+        else:
+            FEDERATION_PEERS_CONNECTED.dec()
+        # Entries switch between live and stale / Las entradas cambian entre vivas y viejas
+        self.on_change()
+
+    async def run(self, client: httpx.AsyncClient) -> None:
+        """
+        Follow the peer forever: reconnect at once after a clean end of stream, with exponential backoff
+        (from the peer's retry delay up to FEDERATION_MAX_BACKOFF, with jitter) after a failure.
+        Sigue al par indefinidamente: reconecta enseguida tras un fin de flujo limpio y con backoff
+        exponencial (desde la espera de reintento del par hasta FEDERATION_MAX_BACKOFF, con jitter) tras un fallo.
+        """
+        while True:
+            try:
+                await self.follow(client)
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning("Federation link to %s failed: %s", self.name, self.last_error)
+            self.set_connected(False)
+            self.reconnects += 1
+            FEDERATION_RECONNECTS.labels(self.name).inc()
+            if self.failures:
+                delay = min(self.retry * 2 ** (self.failures - 1), FEDERATION_MAX_BACKOFF)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "url": self.url,
+            "connected": self.connected,
+            "synced": self.synced,
+            "devices": len(self.statuses),
+            "alerts": len(self.alerts),
+            "last_event_id": self.last_event_id,
+            "events": self.events,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "connected_at": self.connected_at,
+            "last_event_at": self.last_event_at,
+        }
+
+class Federation:
+    """
+    The configured peers, their link tasks and the merged view of their caches (versioned, with
+    the encoded status array cached per field selection).
+    Los pares configurados, las tareas de sus enlaces y la vista combinada de sus cachés (versionada,
+    con el arreglo de estados codificado en caché por selección de campos).
+    """
+    def __init__(self, peers: List[Tuple[str, str]]):
+        self.peers: Dict[str, Peer] = {name: Peer(name, url, self.changed) for name, url in peers}
+        self.version = 0
+        self._arrays: Dict[Tuple[FieldSet, Optional[Tuple[str, ...]]], Tuple[int, bytes]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.peers)
+
+    def changed(self) -> None:
+        self.version += 1
+
+    def selected(self, names: Optional[List[str]] = None) -> List[Peer]:
+        if names is None:
+            return list(self.peers.values())
+        return [self.peers[name] for name in names if name in self.peers]
+
+    def statuses(self, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Cached statuses of the peers (all or `names`); entries of disconnected peers are marked stale.
+        Estados en caché de los pares (todos o `names`); las entradas de pares desconectados se marcan como viejas.
+        """
+        result = []
+        for peer in self.selected(names):
+            if peer.connected:
+                result.extend(peer.statuses.values())
+            else:
+                result.extend({**status, "stale": True} for status in peer.statuses.values())
+        return result
+
+    def alerts(self, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Unresolved alerts of the peers (all or `names`), tagged with "peer".
+        Alertas no resueltas de los pares (todos o `names`), marcadas con "peer".
+        """
+        return [alert for peer in self.selected(names) for alert in peer.alerts]
+
+    def status_array(self, fields: FieldSet, names: Optional[List[str]] = None) -> bytes:
+        """
+        JSON array of the peers' statuses restricted to `fields` (all keys if None), rebuilt only when
+        a peer's cache changed.
+        Arreglo JSON de los estados de los pares restringidos a `fields` (todas las claves si es None),
+        reconstruido solo cuando cambió la caché de algún par.
+        """
+        key = (fields, None if names is None else tuple(names))
+        cached = self._arrays.get(key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        statuses = self.statuses(names)
+        if fields is not None:
+            keep = BASE_FIELDS + PEER_FIELDS + fields
+            statuses = [{k: s[k] for k in keep if k in s} for s in statuses]
+        encoded = dumps(statuses)
+        self._arrays[key] = (self.version, encoded)
+        return encoded
+
+    def info(self) -> List[Dict[str, Any]]:
+        return [peer.info() for peer in self.peers.values()]
+
+    def start(self) -> None:
+        """
+        Start one link task per peer on the running event loop.
+        Inicia una tarea de enlace por par en el event loop actual.
+        """
+        if not self.peers or self._tasks:
+            return
+        self._client = httpx.AsyncClient(timeout=FEDERATION_HTTP_TIMEOUT)
+        self._tasks = [asyncio.create_task(peer.run(self._client), name=f"federation:{peer.name}")
+                       for peer in self.peers.values()]
+        logger.info("Federation started: %s", ", ".join(f"{p.name} ({p.url})" for p in self.peers.values()))
+
+    async def stop(self) -> None:
+        """
+        Cancel the link tasks and close their HTTP client (on shutdown).
+        Cancela las tareas de enlace y cierra su cliente HTTP (al apagar).
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for peer in self.peers.values():
+            peer.set_connected(False)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+federation = Federation(parse_peers(FEDERATION_PEERS))
@@ -0,0 +1,184 @@
+"""
+forecast.py
+
+Streaming trend forecasts of disk usage and temperature per device, updated on every poll sample in
+O(1) time and memory: an EWMA gives the current level and a time-decayed online linear regression
+gives the slope, so no history is ever rescanned. From them the poller raises "disk full in ~N hours"
+and "temperature trending to threshold" warnings (conditions 'disk_forecast' and 'temp_forecast'),
+and /devices/{id} exposes the current forecast.
+
+Pronósticos de tendencia del uso de disco y la temperatura por dispositivo, actualizados con cada
+muestra del sondeo en tiempo y memoria O(1): un EWMA da el nivel actual y una regresión lineal en
+línea con decaimiento temporal da la pendiente, así nunca se recorre el historial. Con ellos el
+sondeo genera avisos de "disco lleno en ~N horas" y "temperatura subiendo hacia el umbral"
+(condiciones 'disk_forecast' y 'temp_forecast') y /devices/{id} expone el pronóstico actual.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from services.payload_schema import as_float
+
+FORECAST_HALF_LIFE_HOURS = float(os.environ.get("FORECAST_HALF_LIFE_HOURS", "6"))
+FORECAST_EWMA_ALPHA = float(os.environ.get("FORECAST_EWMA_ALPHA", "0.2"))
+# Minimum observed span before a forecast is trusted / Intervalo observado mínimo antes de confiar en un pronóstico
+FORECAST_MIN_SPAN_MINUTES = float(os.environ.get("FORECAST_MIN_SPAN_MINUTES", "30"))
+FORECAST_DISK_FULL_PERCENT = float(os.environ.get("FORECAST_DISK_FULL_PERCENT", "95"))
+FORECAST_DISK_ALERT_HOURS = float(os.environ.get("FORECAST_DISK_ALERT_HOURS", "48"))
+FORECAST_TEMP_THRESHOLD = float(os.environ.get("FORECAST_TEMP_THRESHOLD", "80"))
+FORECAST_TEMP_ALERT_HOURS = float(os.environ.get("FORECAST_TEMP_ALERT_HOURS", "6"))
+# A warning clears once the forecast is this many times the alert horizon
+# Un aviso se despeja cuando el pronóstico supera este múltiplo del horizonte de alerta
+FORECAST_CLEAR_FACTOR = 1.5
+
+class TrendEstimator:
+    """
+    EWMA level plus weighted least-squares slope with exponential forgetting. The time origin is
+    kept at the latest sample (sums are shifted on each update), which keeps the sums small.
+    Nivel EWMA más pendiente por mínimos cuadrados ponderados con olvido exponencial. El origen de
+    tiempo se mantiene en la última muestra (las sumas se desplazan en cada actualización), lo que
+    mantiene las sumas pequeñas.
+    """
+    __slots__ = ("level", "last_t", "first_t", "sw", "st", "sv", "stt", "stv")
+
+    def __init__(self):
+        self.level: Optional[float] = None
+        self.last_t: Optional[float] = None
+        self.first_t: Optional[float] = None
+        self.sw = self.st = self.sv = self.stt = self.stv = 0.0
+
+    def update(self, t: float, value: float) -> None:
+        """
+        Add a sample taken at Unix time `t` (seconds).
+        Agrega una muestra tomada en el tiempo Unix `t` (segundos).
+        """
+        if self.last_t is None:
+            self.first_t = t
+        else:
+            dt = (t - self.last_t) / 3600.0
+            if dt < 0:
+                return
+            decay = 0.5 ** (dt / FORECAST_HALF_LIFE_HOURS)
+            # Move the origin to the new sample (t' = t - dt), then forget old weight
+            # Mover el origen a la nueva muestra (t' = t - dt) y luego olvidar el peso antiguo
+            self.stt = decay * (self.stt - 2 * dt * self.st + dt * dt * self.sw)
+            self.stv = decay * (self.stv - dt * self.sv)
+            self.st = decay * (self.st - dt * self.sw)
+            self.sw *= decay
+            self.sv *= decay
+        self.last_t = t
+        self.sw += 1.0
+        self.sv += value
+        self.level = value if self.level is None else self.level + FORECAST_EWMA_ALPHA * (value - self.level)
+
+    def slope(self) -> Optional[float]:
+        """
+        Trend in units per hour, or None until FORECAST_MIN_SPAN_MINUTES of data were seen.
+        Tendencia en unidades por hora, o None hasta haber visto FORECAST_MIN_SPAN_MINUTES de datos.
+        """
+        if self.last_t is None or self.last_t - self.first_t < FORECAST_MIN_SPAN_MINUTES * 60:
+            return None
+        denominator = self.sw * self.stt - self.st * self.st
+        if denominator <= 1e-12:
+            return None
+        return (self.sw * self.stv - self.st * self.sv) / denominator
+
+    def hours_to(self, target: float) -> Optional[float]:
+        """
+        Hours until the level reaches `target` at the current slope; None if it is not heading there.
+        Horas hasta que el nivel alcance `target` con la pendiente actual; None si no va hacia allí.
+        """
+        slope = self.slope()
+        if slope is None or slope <= 0 or self.level is None:
+            return None
+        return max((target - self.level) / slope, 0.0)
+
+class DeviceForecast:
+    """
+    Disk and temperature estimators of one device and whether each warning is raised
+    (None until the first trusted evaluation).
+    Estimadores de disco y temperatura de un dispositivo y si cada aviso está activo
+    (None hasta la primera evaluación confiable).
+    """
+    __slots__ = ("disk", "temp", "alerting")
+
+    def __init__(self):
+        self.disk = TrendEstimator()
+        self.temp = TrendEstimator()
+        self.alerting: Dict[str, Optional[bool]] = {"disk_forecast": None, "temp_forecast": None}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "disk": {
+                "level": rounded(self.disk.level, 2),
+                "slope_per_hour": rounded(self.disk.slope(), 4),
+                "hours_to_full": rounded(self.disk.hours_to(FORECAST_DISK_FULL_PERCENT), 1),
+                "full_percent": FORECAST_DISK_FULL_PERCENT,
+            },
+            "temp": {
+                "level": rounded(self.temp.level, 2),
+                "slope_per_hour": rounded(self.temp.slope(), 4),
+                "hours_to_threshold": rounded(self.temp.hours_to(FORECAST_TEMP_THRESHOLD), 1),
+                "threshold": FORECAST_TEMP_THRESHOLD,
+            },
+        }
+
+def rounded(value: Optional[float], digits: int) -> Optional[float]:
+    # Adding 0.0 turns -0.0 into 0.0 / Sumar 0.0 convierte -0.0 en 0.0
+    return round(value, digits) + 0.0 if value is not None else None
+
+def warning_state(hours: Optional[float], horizon: float, current: Optional[bool]) -> bool:
+    """
+    Whether a warning should be raised, with hysteresis so it does not flap around the horizon.
+    Si se debe activar un aviso, con histéresis para que no oscile alrededor del horizonte.
+    """
+    if hours is None:
+        return False
+    if current:
+        return hours <= horizon * FORECAST_CLEAR_FACTOR
+    return hours <= horizon
+
+class ForecastStore:
+    """
+    Forecasts of every polled device.
+    Pronósticos de todos los dispositivos sondeados.
+    """
+    def __init__(self):
+        self.devices: Dict[int, DeviceForecast] = {}
+
+    def observe(self, device_id: int, status: Dict[str, Any], t: float) -> List[Tuple[str, bool, Optional[float]]]:
+        """
+        Feed one online poll result and return the warning changes as (condition, raised, hours).
+        The first trusted evaluation always reports its state so stale warnings from a previous run get resolved.
+
+        Alimenta un resultado de sondeo online y retorna los cambios de avisos como (condición, activo, horas).
+        La primera evaluación confiable siempre reporta su estado para resolver avisos viejos de una ejecución anterior.
+        """
+        forecast = self.devices.get(device_id)
+        if forecast is None:
+            forecast = self.devices[device_id] = DeviceForecast()
+        changes = []
+        for condition, estimator, value, target, horizon in (
+            ("disk_forecast", forecast.disk, as_float(status.get("disk")), FORECAST_DISK_FULL_PERCENT, FORECAST_DISK_ALERT_HOURS),
+            ("temp_forecast", forecast.temp, as_float(status.get("temp")), FORECAST_TEMP_THRESHOLD, FORECAST_TEMP_ALERT_HOURS),
+        ):
+            if value is None:
+                continue
+            estimator.update(t, value)
+            if estimator.slope() is None:
+                continue
+            hours = estimator.hours_to(target)
+            current = forecast.alerting[condition]
+            raised = warning_state(hours, horizon, current)
+            if raised != current:
+                forecast.alerting[condition] = raised
+                changes.append((condition, raised, hours))
+        return changes
+
+    def remove(self, device_id: int) -> None:
+        self.devices.pop(device_id, None)
+
+    def snapshot(self, device_id: int) -> Optional[Dict[str, Any]]:
+        forecast = self.devices.get(device_id)
+        return forecast.snapshot() if forecast is not None else None
+
+forecasts = ForecastStore()
@@ -0,0 +1,277 @@
+"""
+group_aggregates.py
+
+Running per-group aggregates of device status: device and online counts, worst temperature, max disk
+usage and active alerts. Each status change or alert adjusts the device's group and its ancestors by
+the difference, so fleet views never rescan every device. The group tree is reloaded only when groups
+change.
+
+Agregados en curso por grupo del estado de los dispositivos: cantidad de dispositivos y online, peor
+temperatura, uso máximo de disco y alertas activas. Cada cambio de estado o alerta ajusta el grupo del
+dispositivo y sus ancestros por la diferencia, así las vistas de la flota nunca recorren todos los
+dispositivos. El árbol de grupos se recarga solo cuando cambian los grupos.
+"""
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+from sqlalchemy import func
+from sqlmodel import Session, select
+from models import Alert, Device, DeviceGroup
+from services.serialization import row_to_dict
+
+class MaxTracker:
+    """
+    Maximum of a keyed set of values; only rescans when the current holder drops or leaves.
+    Máximo de un conjunto de valores con clave; solo recorre de nuevo cuando el poseedor actual baja o sale.
+    """
+    __slots__ = ("values", "best", "holder")
+
+    def __init__(self):
+        self.values: Dict[int, float] = {}
+        self.best: Optional[float] = None
+        self.holder: Optional[int] = None
+
+    def set(self, key: int, value: Optional[float]) -> None:
+        if value is None:
+            self.values.pop(key, None)
+        else:
+            self.values[key] = value
+        if value is not None and (self.best is None or value >= self.best):
+            self.best, self.holder = value, key
+        elif key == self.holder:
+            if self.values:
+                self.holder = max(self.values, key=self.values.__getitem__)
+                self.best = self.values[self.holder]
+            else:
+                self.best = self.holder = None
+
+class DeviceState:
+    """
+    Last values a device contributes to its groups.
+    Últimos valores que un dispositivo aporta a sus grupos.
+    """
+    __slots__ = ("group_id", "online", "temp", "disk", "alerts")
+
+    def __init__(self, group_id: Optional[int]):
+        self.group_id = group_id
+        self.online = False
+        self.temp: Optional[float] = None
+        self.disk: Optional[float] = None
+        self.alerts = 0
+
+class Aggregate:
+    """
+    Running totals of one group, including all its descendant groups.
+    Totales en curso de un grupo, incluidos todos sus grupos descendientes.
+    """
+    __slots__ = ("devices", "online", "alerts", "temp", "disk", "version")
+
+    def __init__(self):
+        self.devices = 0
+        self.online = 0
+        self.alerts = 0
+        self.temp = MaxTracker()
+        self.disk = MaxTracker()
+        self.version = 0
+
+    def add(self, device_id: int, state: DeviceState) -> None:
+        self.devices += 1
+        self.online += state.online
+        self.alerts += state.alerts
+        self.temp.set(device_id, state.temp)
+        self.disk.set(device_id, state.disk)
+        self.version += 1
+
+    def discard(self, device_id: int, state: DeviceState) -> None:
+        self.devices -= 1
+        self.online -= state.online
+        self.alerts -= state.alerts
+        self.temp.set(device_id, None)
+        self.disk.set(device_id, None)
+        self.version += 1
+
+def as_number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+class GroupAggregates:
+    """
+    Group tree plus running aggregates per group. `load` runs in threadpool endpoints while statuses and
+    alerts are applied on the event loop, so every change and every read spanning several maps holds `_lock`.
+    Árbol de grupos más agregados en curso por grupo. `load` se ejecuta en endpoints del threadpool mientras
+    los estados y alertas se aplican en el event loop, así cada cambio y cada lectura de varios mapas toma `_lock`.
+    """
+    def __init__(self):
+        self.groups: Dict[int, Dict[str, Any]] = {}
+        self.children: Dict[int, List[int]] = {}
+        self.members: Dict[int, Set[int]] = {}
+        self.devices: Dict[int, DeviceState] = {}
+        self.aggregates: Dict[int, Aggregate] = {}
+        self._lock = threading.RLock()
+
+    def load(self, session: Session) -> None:
+        """
+        Reload the group tree and device membership, keeping the last known device statuses.
+        Recarga el árbol de grupos y la pertenencia de dispositivos, conservando los últimos estados conocidos.
+        """
+        groups = {g.id: row_to_dict(g) for g in session.exec(select(DeviceGroup)).all()}
+        children: Dict[int, List[int]] = {group_id: [] for group_id in groups}
+        for group in groups.values():
+            if group["parent_id"] in children:
+                children[group["parent_id"]].append(group["id"])
+        alert_counts = dict(session.exec(
+            select(Alert.device_id, func.count()).where(Alert.resolved == False).group_by(Alert.device_id)
+        ).all())
+        rows = session.exec(select(Device.id, Device.group_id).where(Device.enabled == True)).all()
+        with self._lock:
+            # New states copy the statuses applied until now, the old ones are never modified
+            # Los estados nuevos copian los estados aplicados hasta ahora, los viejos nunca se modifican
+            devices: Dict[int, DeviceState] = {}
+            for device_id, group_id in rows:
+                state = devices[device_id] = DeviceState(group_id)
+                previous = self.devices.get(device_id)
+                if previous is not None:
+                    state.online, state.temp, state.disk = previous.online, previous.temp, previous.disk
+                state.alerts = alert_counts.get(device_id, 0)
+            self.groups, self.children, self.devices = groups, children, devices
+            self.members = {group_id: set() for group_id in groups}
+            self.aggregates = {group_id: Aggregate() for group_id in groups}
+            for device_id, state in devices.items():
+                self._attach(device_id, state)
+
+    def chain(self, group_id: Optional[int]) -> List[int]:
+        """
+        The group and all its ancestors, nearest first.
+        El grupo y todos sus ancestros, del más cercano al más lejano.
+        """
+        result: List[int] = []
+        while group_id in self.groups and group_id not in result:
+            result.append(group_id)
+            group_id = self.groups[group_id]["parent_id"]
+        return result
+
+    def _attach(self, device_id: int, state: DeviceState) -> None:
+        if state.group_id in self.members:
+            self.members[state.group_id].add(device_id)
+        for group_id in self.chain(state.group_id):
+            self.aggregates[group_id].add(device_id, state)
+
+    def _detach(self, device_id: int, state: DeviceState) -> None:
+        if state.group_id in self.members:
+            self.members[state.group_id].discard(device_id)
+        for group_id in self.chain(state.group_id):
+            self.aggregates[group_id].discard(device_id, state)
+
+    def set_device(self, device: Device) -> None:
+        """
+        Add, move or remove (when disabled) a device after it is created or updated.
+        Agrega, mueve o quita (si está deshabilitado) un dispositivo tras crearlo o actualizarlo.
+        """
+        with self._lock:
+            state = self.devices.get(device.id)
+            if state is not None:
+                self._detach(device.id, state)
+            if not device.enabled:
+                self.devices.pop(device.id, None)
+                return
+            if state is None:
+                state = self.devices[device.id] = DeviceState(device.group_id)
+            state.group_id = device.group_id
+            self._attach(device.id, state)
+
+    def remove_device(self, device_id: int) -> None:
+        """
+        Forget a deleted device.
+        Olvida un dispositivo eliminado.
+        """
+        with self._lock:
+            state = self.devices.pop(device_id, None)
+            if state is not None:
+                self._detach(device_id, state)
+
+    def update_status(self, device_id: int, online: bool, status: Dict[str, Any]) -> None:
+        """
+        Apply a new poll result of a device to its groups.
+        Aplica un nuevo resultado de sondeo de un dispositivo a sus grupos.
+        """
+        temp, disk = as_number(status.get("temp")), as_number(status.get("disk"))
+        with self._lock:
+            state = self.devices.get(device_id)
+            if state is None:
+                return
+            if state.online == online and state.temp == temp and state.disk == disk:
+                return
+            online_delta = int(online) - int(state.online)
+            state.online, state.temp, state.disk = online, temp, disk
+            for group_id in self.chain(state.group_id):
+                aggregate = self.aggregates[group_id]
+                aggregate.online += online_delta
+                aggregate.temp.set(device_id, temp)
+                aggregate.disk.set(device_id, disk)
+                aggregate.version += 1
+
+    def adjust_alerts(self, device_id: int, delta: int) -> None:
+        """
+        Count alerts opened (+1) or resolved (-1) for a device.
+        Cuenta alertas abiertas (+1) o resueltas (-1) de un dispositivo.
+        """
+        with self._lock:
+            state = self.devices.get(device_id)
+            if state is None:
+                return
+            state.alerts += delta
+            for group_id in self.chain(state.group_id):
+                self.aggregates[group_id].alerts += delta
+                self.aggregates[group_id].version += 1
+
+    def descendants(self, group_ids: Iterable[int]) -> Set[int]:
+        """
+        The given groups plus all groups below them.
+        Los grupos dados más todos los grupos debajo de ellos.
+        """
+        pending = [g for g in group_ids if g in self.groups]
+        seen: Set[int] = set()
+        while pending:
+            group_id = pending.pop()
+            if group_id not in seen:
+                seen.add(group_id)
+                pending.extend(self.children.get(group_id, ()))
+        return seen
+
+    def device_ids(self, group_ids: Iterable[int]) -> Set[int]:
+        """
+        Enabled devices in the given groups or any of their descendants.
+        Dispositivos habilitados en los grupos dados o en cualquiera de sus descendientes.
+        """
+        with self._lock:
+            return {d for g in self.descendants(group_ids) for d in self.members[g]}
+
+    def versions(self, group_ids: Iterable[int]) -> tuple:
+        aggregates = self.aggregates
+        return tuple(aggregates[g].version if g in aggregates else 0 for g in group_ids)
+
+    def snapshot(self, group_id: int) -> Dict[str, Any]:
+        """
+        Group fields plus its current aggregates.
+        Campos del grupo más sus agregados actuales.
+        """
+        with self._lock:
+            group = self.groups[group_id]
+            aggregate = self.aggregates[group_id]
+            return {
+                **group,
+                "devices": aggregate.devices,
+                "online": aggregate.online,
+                "offline": aggregate.devices - aggregate.online,
+                "worst_temp": aggregate.temp.best,
+                "worst_temp_device": aggregate.temp.holder,
+                "max_disk": aggregate.disk.best,
+                "max_disk_device": aggregate.disk.holder,
+                "active_alerts": aggregate.alerts,
+            }
+
+    def snapshots(self, group_ids: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            ids = sorted(self.groups) if group_ids is None else sorted(g for g in set(group_ids) if g in self.groups)
+            return [self.snapshot(g) for g in ids]
+
+group_aggregates = GroupAggregates()
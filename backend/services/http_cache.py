@@ -0,0 +1,133 @@
+"""
+http_cache.py
+
+Conditional GET support for list endpoints. Each cached resource (devices, alerts) has a version
+counter bumped by the CRUD mutators; ETag and Last-Modified are derived from it, so an unchanged
+resource is answered with 304 before touching the database, and a changed one is serialized once
+per version and shared by every client.
+
+Soporte de GET condicional para endpoints de listas. Cada recurso en caché (dispositivos, alertas)
+tiene un contador de versión que incrementan las funciones CRUD que lo modifican; ETag y
+Last-Modified se derivan de él, así un recurso sin cambios se responde con 304 sin tocar la base de
+datos y uno modificado se serializa una vez por versión y se comparte entre todos los clientes.
+"""
+
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Dict, Tuple
+from fastapi import Request, Response
+from services.metrics import HTTP_CACHE_RESPONSES
+from services.serialization import dumps
+
+# Rows written by other processes (import scripts) are not seen by the counters; validators also
+# expire every HTTP_CACHE_REVALIDATE_SECONDS so those changes show up without a restart.
+# Las filas escritas por otros procesos (scripts de importación) no las ven los contadores; los
+# validadores también expiran cada HTTP_CACHE_REVALIDATE_SECONDS para que aparezcan sin reiniciar.
+HTTP_CACHE_REVALIDATE_SECONDS = max(int(os.environ.get("HTTP_CACHE_REVALIDATE_SECONDS", "60")), 1)
+MAX_CACHED_VARIANTS = 32
+
+# Differs on every start, so validators from a previous process never match
+# Cambia en cada arranque, así los validadores de un proceso anterior nunca coinciden
+BOOT_ID = uuid.uuid4().hex[:8]
+
+class CachedResource:
+    """
+    Version counter, modification time and serialized bodies of one resource.
+    Contador de versión, fecha de modificación y cuerpos serializados de un recurso.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.version = 0
+        self.modified_at = time.time()
+        self._bodies: Dict[str, Tuple[str, bytes]] = {}
+
+    def bump(self) -> None:
+        """
+        Mark the resource as changed. Called by the CRUD mutators.
+        Marca el recurso como modificado. Lo llaman las funciones CRUD que lo modifican.
+        """
+        self.version += 1
+        self.modified_at = time.time()
+        self._bodies.clear()
+
+    def validators(self, variant: str) -> Tuple[str, float]:
+        """
+        Weak ETag and Last-Modified timestamp of a variant (query-string combination) of the resource.
+        ETag débil y fecha Last-Modified de una variante (combinación de parámetros) del recurso.
+        """
+        epoch = int(time.time() // HTTP_CACHE_REVALIDATE_SECONDS)
+        etag = f'W/"{BOOT_ID}-{self.version}-{epoch}-{variant}"'
+        return etag, max(self.modified_at, epoch * HTTP_CACHE_REVALIDATE_SECONDS)
+
+    def body(self, variant: str, etag: str, build: Callable[[], Any]) -> bytes:
+        """
+        Serialized body of a variant, built at most once per ETag.
+        Cuerpo serializado de una variante, construido como máximo una vez por ETag.
+        """
+        cached = self._bodies.get(variant)
+        if cached is not None and cached[0] == etag:
+            return cached[1]
+        body = dumps(build())
+        if len(self._bodies) >= MAX_CACHED_VARIANTS:
+            self._bodies.clear()
+        self._bodies[variant] = (etag, body)
+        return body
+
+DEVICES = CachedResource("devices")
+ALERTS = CachedResource("alerts")
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against the current ETag.
+    Comparación débil de una cabecera If-None-Match con el ETag actual.
+    """
+    if header.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == current:
+            return True
+    return False
+
+def is_fresh(request: Request, etag: str, modified_at: float) -> bool:
+    """
+    True if the client's cached copy is still valid. If-None-Match takes precedence over If-Modified-Since.
+    True si la copia en caché del cliente sigue siendo válida. If-None-Match tiene prioridad sobre If-Modified-Since.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(modified_at) <= since.timestamp()
+    return False
+
+def cached_json_response(request: Request, resource: CachedResource, variant: str,
+                         build: Callable[[], Any]) -> Response:
+    """
+    304 if the client's copy is current; otherwise the (cached) JSON body. Both carry the validators
+    and Cache-Control: no-cache, so browsers always revalidate instead of showing stale data.
+
+    304 si la copia del cliente está al día; si no, el cuerpo JSON (en caché). Ambos llevan los
+    validadores y Cache-Control: no-cache, así los navegadores siempre revalidan en lugar de mostrar
+    datos viejos.
+    """
+    etag, modified_at = resource.validators(variant)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(datetime.fromtimestamp(int(modified_at), timezone.utc), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if is_fresh(request, etag, modified_at):
+        HTTP_CACHE_RESPONSES.labels(resource.name, "not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    HTTP_CACHE_RESPONSES.labels(resource.name, "full").inc()
+    return Response(resource.body(variant, etag, build), media_type="application/json", headers=headers)
@@ -0,0 +1,67 @@
+"""
+incidents.py
+
+Correlation of offline alerts into incidents. When at least INCIDENT_MIN_DEVICES devices and
+INCIDENT_MIN_FRACTION of the enabled devices of a subnet (IPv4 /24, IPv6 /64) are offline at the same
+time, their alerts are grouped into one incident and only the incident is notified. The incident is
+resolved when every linked device has recovered.
+
+Correlación de alertas offline en incidentes. Cuando al menos INCIDENT_MIN_DEVICES dispositivos y
+INCIDENT_MIN_FRACTION de los dispositivos habilitados de una subred (IPv4 /24, IPv6 /64) están
+offline a la vez, sus alertas se agrupan en un incidente y solo se notifica el incidente. El
+incidente se resuelve cuando todos los dispositivos asociados se han recuperado.
+"""
+
+import ipaddress
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from sqlmodel import Session
+import crud
+from models import Device
+from utils import escape_markdown
+
+logger = logging.getLogger(__name__)
+
+INCIDENT_MIN_DEVICES = int(os.environ.get("INCIDENT_MIN_DEVICES", "3"))
+INCIDENT_MIN_FRACTION = float(os.environ.get("INCIDENT_MIN_FRACTION", "0.5"))
+
+@lru_cache(maxsize=4096)
+def subnet_of(ip: str) -> Optional[str]:
+    """
+    Subnet of an address (IPv4 /24, IPv6 /64), or None for hostnames.
+    Subred de una dirección (IPv4 /24, IPv6 /64), o None para nombres de host.
+    """
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+def correlate(session: Session, devices: Iterable[Device], offline_ips: Iterable[str]) -> None:
+    """
+    Open or extend one incident per subnet with enough offline devices and resolve the incidents
+    whose devices all recovered.
+    Abre o amplía un incidente por subred con suficientes dispositivos offline y resuelve los
+    incidentes cuyos dispositivos se recuperaron todos.
+    """
+    offline_ips = set(offline_ips)
+    totals: Dict[str, int] = {}
+    offline: Dict[str, List[int]] = {}
+    for device in devices:
+        subnet = subnet_of(device.ip)
+        if subnet is None:
+            continue
+        totals[subnet] = totals.get(subnet, 0) + 1
+        if device.ip in offline_ips:
+            offline.setdefault(subnet, []).append(device.id)
+    for subnet, device_ids in offline.items():
+        if len(device_ids) < INCIDENT_MIN_DEVICES or len(device_ids) < INCIDENT_MIN_FRACTION * totals[subnet]:
+            continue
+        msg = "🔴🌐 " + escape_markdown(f"Incidente: {len(device_ids)} Raspberry Pi de la subred {subnet} están OFFLINE.")
+        incident = crud.link_incident(session, "subnet", subnet, "offline", msg, device_ids)
+        logger.info("Incident %s: %d devices offline in %s", incident.id, incident.device_count, subnet)
+    for incident in crud.resolve_finished_incidents(session):
+        logger.info("Incident %s resolved (%s)", incident.id, incident.key)
@@ -0,0 +1,398 @@
+"""
+log_archive.py
+
+Full-text archive of the log entries collected from the Raspberry Pi devices. Every successful
+`fetch_logs` result is buffered in memory and flushed in one transaction to a separate SQLite file
+(LOG_ARCHIVE_PATH) indexed with FTS5. Entries are stored incrementally: a per-device high-water mark
+skips what was already archived, and a (device, key) table deduplicates the rest, where the key is
+the entry's `offset`/`seq` when the device reports one and a hash of the entry otherwise. The index is
+partitioned by day (one FTS5 table per UTC day), so retention drops whole partitions and a time-range
+search only touches the days it covers, newest first, stopping once it has enough results.
+
+Archivo de texto completo de las entradas de log recolectadas de las Raspberry Pi. Cada resultado
+exitoso de `fetch_logs` se guarda en un buffer en memoria y se vuelca en una sola transacción a un
+archivo SQLite separado (LOG_ARCHIVE_PATH) indexado con FTS5. Las entradas se guardan de forma
+incremental: una marca de agua por dispositivo omite lo ya archivado, y una tabla (dispositivo, clave)
+deduplica el resto, donde la clave es el `offset`/`seq` de la entrada cuando el dispositivo lo reporta y
+un hash de la entrada en caso contrario. El índice se particiona por día (una tabla FTS5 por día UTC),
+así la retención elimina particiones enteras y una búsqueda por rango de tiempo solo toca los días que
+cubre, del más reciente al más antiguo, y se detiene al tener suficientes resultados.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from services.device_registry import device_registry
+from services.metrics import LOG_ARCHIVE_ENTRIES, LOG_SEARCH_SECONDS
+from services.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+LOG_ARCHIVE_ENABLED = os.environ.get("LOG_ARCHIVE_ENABLED", "true").lower() == "true"
+LOG_ARCHIVE_PATH = os.environ.get("LOG_ARCHIVE_PATH", "log_archive.db")
+LOG_ARCHIVE_RETENTION_DAYS = int(os.environ.get("LOG_ARCHIVE_RETENTION_DAYS", "30"))
+# Entries held between flushes; more are dropped / Entradas retenidas entre volcados; las demás se descartan
+LOG_ARCHIVE_MAX_BUFFER = 100_000
+DAY_SECONDS = 86400
+PARTITION_PREFIX = "logs_"
+# Fields holding the text of an entry, in order of preference / Campos con el texto de una entrada, por preferencia
+MESSAGE_FIELDS = ("message", "msg", "line", "text")
+LEVEL_FIELDS = ("level", "severity", "status")
+OFFSET_FIELDS = ("offset", "seq", "id")
+TIME_FIELDS = ("timestamp", "ts", "time")
+# Device filters up to this size are matched in the full-text index / Filtros de dispositivos hasta este tamaño se buscan en el índice
+LOG_SEARCH_DEVICE_TERMS = 200
+
+def fts5_available() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE probe USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def partition_day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%d")
+
+def day_start(day: str) -> float:
+    return datetime.strptime(day, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+
+def entry_time(entry: Any, default: float) -> float:
+    """
+    Unix time of a log entry (ISO 8601 string or number; naive times are UTC), or `default`.
+    Hora unix de una entrada de log (cadena ISO 8601 o número; las horas sin zona son UTC), o `default`.
+    """
+    if not isinstance(entry, dict):
+        return default
+    for field in TIME_FIELDS:
+        value = entry.get(field)
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str):
+            try:
+                parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+    return default
+
+def entry_fields(entry: Any) -> Tuple[str, str, str]:
+    """
+    (key, level, message) of a log entry: a plain string line, or a dict whose message field is used
+    as text (other scalar fields are appended as key=value so they are searchable too).
+    (clave, nivel, mensaje) de una entrada de log: una línea de texto, o un dict cuyo campo de mensaje
+    se usa como texto (los demás campos escalares se agregan como clave=valor para poder buscarlos).
+    """
+    if not isinstance(entry, dict):
+        text = str(entry)
+        return hashlib.blake2b(text.encode(), digest_size=12).hexdigest(), "", text
+    offset = next((entry[f] for f in OFFSET_FIELDS if isinstance(entry.get(f), (int, str))), None)
+    level = next((str(entry[f]) for f in LEVEL_FIELDS if entry.get(f) is not None), "")
+    parts = [str(entry[f]) for f in MESSAGE_FIELDS if entry.get(f) is not None][:1]
+    skip = set(MESSAGE_FIELDS) | set(OFFSET_FIELDS) | set(TIME_FIELDS) | {"level", "severity"}
+    parts += [f"{k}={v}" for k, v in entry.items() if k not in skip and isinstance(v, (str, int, float, bool))]
+    key = f"o:{offset}" if offset is not None else hashlib.blake2b(dumps(entry), digest_size=12).hexdigest()
+    return key, level, " ".join(parts)
+
+def balanced(query: str) -> bool:
+    """
+    Whether the parentheses outside "quoted strings" of a query balance, so it cannot close the column filter
+    it is wrapped in.
+    Si los paréntesis fuera de las "cadenas entre comillas" de una consulta están balanceados, de modo que no
+    puede cerrar el filtro de columnas que la envuelve.
+    """
+    depth, quoted = 0, False
+    for char in query:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+class SearchError(ValueError):
+    """
+    Invalid search query.
+    Consulta de búsqueda no válida.
+    """
+
+class LogArchive:
+    """
+    Buffered writer and day-partitioned FTS5 index of device log entries.
+    Escritor con buffer e índice FTS5 particionado por día de las entradas de log de los dispositivos.
+    """
+    def __init__(self, path: str = LOG_ARCHIVE_PATH, retention_days: int = LOG_ARCHIVE_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        # (device_id, entries, received at) / (device_id, entradas, hora de recepción)
+        self._buffer: List[Tuple[int, List[Any], float]] = []
+        self._buffered = 0
+        # Last time each IP's logs were buffered / Última vez que se guardaron en buffer los logs de cada IP
+        self.collected: Dict[str, float] = {}
+        self._watermarks: Optional[Dict[int, float]] = None
+        self._partitions: Optional[set] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._buffer_lock = threading.Lock()
+        self.enabled = LOG_ARCHIVE_ENABLED and fts5_available()
+        if LOG_ARCHIVE_ENABLED and not self.enabled:
+            logger.warning("SQLite was built without FTS5: the log archive is disabled")
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _writer(self) -> sqlite3.Connection:
+        """
+        Write connection, created on first use with the watermark table (importing touches no file).
+        Conexión de escritura, creada en el primer uso con la tabla de marcas de agua (importar no toca ningún archivo).
+        """
+        if self._conn is None:
+            conn = self.connect()
+            conn.execute("CREATE TABLE IF NOT EXISTS log_watermark (device_id INTEGER PRIMARY KEY, ts REAL NOT NULL)")
+            self._watermarks = dict(conn.execute("SELECT device_id, ts FROM log_watermark"))
+            self._partitions = set(self.partitions(conn))
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def partitions(conn: sqlite3.Connection) -> List[str]:
+        """
+        Days with a partition, oldest first.
+        Días con partición, del más antiguo al más reciente.
+        """
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?", (PARTITION_PREFIX + "[0-9]*",)
+        )
+        return sorted(name[len(PARTITION_PREFIX):] for (name,) in rows if name[len(PARTITION_PREFIX):].isdigit())
+
+    def _ensure_partition(self, conn: sqlite3.Connection, day: str) -> None:
+        if day in self._partitions:
+            return
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {PARTITION_PREFIX}{day} USING fts5("
+                     "message, level, device, device_id UNINDEXED, ts UNINDEXED, tokenize = 'unicode61')")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS logkeys_{day} ("
+                     "device_id INTEGER NOT NULL, key TEXT NOT NULL, PRIMARY KEY (device_id, key)) WITHOUT ROWID")
+        self._partitions.add(day)
+
+    def add(self, ip: str, entries: Any) -> None:
+        """
+        Buffer the entries of one fetch_logs result (ignored unless it is a list from a registered device).
+        Guarda en el buffer las entradas de un resultado de fetch_logs (se ignora salvo que sea una lista de
+        un dispositivo registrado).
+        """
+        if not self.enabled or not isinstance(entries, list) or not entries:
+            return
+        device = device_registry.get_by_ip(ip)
+        if device is not None:
+            self.record(device.id, entries)
+            self.collected[ip] = time.time()
+
+    def record(self, device_id: int, entries: List[Any], received_at: Optional[float] = None) -> None:
+        """
+        Buffer log entries of a device; entries without a timestamp get `received_at` (now by default).
+        Guarda en el buffer entradas de log de un dispositivo; las que no tienen timestamp reciben `received_at`
+        (ahora por defecto).
+        """
+        with self._buffer_lock:
+            if self._buffered >= LOG_ARCHIVE_MAX_BUFFER:
+                LOG_ARCHIVE_ENTRIES.labels("dropped").inc(len(entries))
+                return
+            self._buffer.append((device_id, entries, time.time() if received_at is None else received_at))
+            self._buffered += len(entries)
+
+    def flush(self) -> Dict[str, int]:
+        """
+        Write the buffered entries in one transaction (blocking: call it from a worker thread).
+        Returns the count of stored, duplicate and expired entries.
+        Escribe las entradas en buffer en una sola transacción (bloqueante: llamarla desde un hilo).
+        Retorna la cantidad de entradas guardadas, duplicadas y vencidas.
+        """
+        with self._buffer_lock:
+            batch, self._buffer, self._buffered = self._buffer, [], 0
+        counts = {"stored": 0, "duplicate": 0, "expired": 0}
+        if not batch or not self.enabled:
+            return counts
+        oldest = time.time() - self.retention_days * DAY_SECONDS
+        with self._lock:
+            conn = self._writer()
+            with conn:
+                for device_id, entries, received_at in batch:
+                    watermark = self._watermarks.get(device_id, 0.0)
+                    newest = watermark
+                    for entry in entries:
+                        ts = entry_time(entry, received_at)
+                        if ts < watermark:
+                            counts["duplicate"] += 1
+                            continue
+                        if ts < oldest:
+                            counts["expired"] += 1
+                            continue
+                        key, level, message = entry_fields(entry)
+                        day = partition_day(ts)
+                        self._ensure_partition(conn, day)
+                        inserted = conn.execute(
+                            f"INSERT OR IGNORE INTO logkeys_{day} (device_id, key) VALUES (?, ?)", (device_id, key)
+                        ).rowcount
+                        if not inserted:
+                            counts["duplicate"] += 1
+                            continue
+                        conn.execute(
+                            f"INSERT INTO {PARTITION_PREFIX}{day} (message, level, device, device_id, ts) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (message, level, f"d{device_id}", device_id, ts),
+                        )
+                        counts["stored"] += 1
+                        newest = max(newest, ts)
+                    if newest > watermark:
+                        self._watermarks[device_id] = newest
+                        conn.execute("INSERT OR REPLACE INTO log_watermark (device_id, ts) VALUES (?, ?)",
+                                     (device_id, newest))
+        for result, count in counts.items():
+            if count:
+                LOG_ARCHIVE_ENTRIES.labels(result).inc(count)
+        return counts
+
+    def purge(self) -> List[str]:
+        """
+        Drop the partitions older than the retention period (blocking). Returns the dropped days.
+        Elimina las particiones más antiguas que el periodo de retención (bloqueante). Retorna los días eliminados.
+        """
+        if not self.enabled:
+            return []
+        cutoff = partition_day(time.time() - self.retention_days * DAY_SECONDS)
+        with self._lock:
+            conn = self._writer()
+            expired = [day for day in sorted(self._partitions) if day < cutoff]
+            with conn:
+                for day in expired:
+                    conn.execute(f"DROP TABLE IF EXISTS {PARTITION_PREFIX}{day}")
+                    conn.execute(f"DROP TABLE IF EXISTS logkeys_{day}")
+                    self._partitions.discard(day)
+        return expired
+
+    def search(self, query: str, device_ids: Optional[Iterable[int]] = None, since: Optional[float] = None,
+               until: Optional[float] = None, limit: int = 100, cursor: Optional[Tuple[float, int]] = None) -> Dict[str, Any]:
+        """
+        Entries matching an FTS5 query (words, "phrases", prefix*, AND/OR/NOT, level:ERROR), optionally restricted
+        to devices and a time range, newest first (blocking). A query that is not valid FTS5 syntax or whose
+        parentheses do not balance is searched as a phrase. When `limit` is reached, `next_cursor` (the last ts
+        and the entries already returned with it) is the `cursor` of the next page. Raises SearchError for an
+        empty or invalid query.
+
+        Entradas que coinciden con una consulta FTS5 (palabras, "frases", prefijo*, AND/OR/NOT, level:ERROR),
+        opcionalmente restringidas a dispositivos y a un rango de tiempo, de la más reciente a la más antigua
+        (bloqueante). Una consulta que no es sintaxis FTS5 válida o cuyos paréntesis no están balanceados se
+        busca como frase. Al alcanzar `limit`, `next_cursor` (el último ts y las entradas ya retornadas con él)
+        es el `cursor` de la página siguiente. Lanza SearchError para una consulta vacía o no válida.
+        """
+        if not query.strip():
+            raise SearchError("Empty search query")
+        started = time.perf_counter()
+        if cursor is not None:
+            until = cursor[0] if until is None else min(until, cursor[0])
+        results, searched = self._search(query, device_ids, since, until, limit, cursor)
+        elapsed = time.perf_counter() - started
+        LOG_SEARCH_SECONDS.observe(elapsed)
+        next_cursor = None
+        if len(results) >= limit:
+            last = results[-1]["ts"]
+            seen = sum(1 for entry in results if entry["ts"] == last)
+            if cursor is not None and cursor[0] == last:
+                seen += cursor[1]
+            next_cursor = (last, seen)
+        return {"results": results, "partitions": searched, "took_ms": round(elapsed * 1000, 2), "next_cursor": next_cursor}
+
+    def _search(self, query: str, device_ids: Optional[Iterable[int]], since: Optional[float], until: Optional[float],
+                limit: int, cursor: Optional[Tuple[float, int]]) -> Tuple[List[Dict[str, Any]], int]:
+        if not os.path.exists(self.path):
+            return [], 0
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("ts <= ?")
+            params.append(until)
+        devices = None
+        if device_ids is not None:
+            device_ids = sorted(set(device_ids))
+            if not device_ids:
+                return [], 0
+            # Few devices: match their tokens in the index (a MATCH of its own, the query cannot reach it); many:
+            # filter the matches of the query
+            # Pocos dispositivos: buscar sus tokens en el índice (en un MATCH propio, la consulta no puede alcanzarlo);
+            # muchos: filtrar las coincidencias de la consulta
+            if len(device_ids) <= LOG_SEARCH_DEVICE_TERMS:
+                devices = "device : (" + " OR ".join(f"d{d}" for d in device_ids) + ")"
+            else:
+                conditions.append(f"device_id IN ({','.join('?' * len(device_ids))})")
+                params += device_ids
+        where = "".join(f" AND {condition}" for condition in conditions)
+        if not balanced(query):
+            query = '"' + query.replace('"', '""') + '"'
+        # Entries of the cursor's timestamp returned by the previous page (all in the newest partition searched)
+        # Entradas del timestamp del cursor retornadas por la página anterior (todas en la partición más reciente)
+        skip = cursor[1] if cursor is not None else 0
+        conn = self.connect()
+        try:
+            first = partition_day(since) if since is not None else None
+            last = partition_day(until) if until is not None else None
+            days = [d for d in self.partitions(conn) if (first is None or d >= first) and (last is None or d <= last)]
+            results: List[Dict[str, Any]] = []
+            searched = 0
+            for day in reversed(days):
+                table = PARTITION_PREFIX + day
+                match = f" AND {table} MATCH ?" if devices else ""
+                sql = (f"SELECT device_id, ts, level, message, snippet({table}, 0, '[', ']', '…', 16) FROM {table} "
+                       f"WHERE {table} MATCH ?{match}{where} ORDER BY ts DESC, rowid DESC LIMIT ?")
+                device_match = [devices] if devices else []
+                try:
+                    rows = conn.execute(sql, [f"{{message level}} : ({query})", *device_match, *params,
+                                              limit - len(results) + skip]).fetchall()
+                except sqlite3.OperationalError as e:
+                    if query.startswith('"') or not any(m in str(e) for m in ("fts5", "syntax", "no such column")):
+                        raise SearchError(f"Invalid search query: {e}")
+                    query = '"' + query.replace('"', '""') + '"'
+                    rows = conn.execute(sql, [f"{{message level}} : ({query})", *device_match, *params,
+                                              limit - len(results) + skip]).fetchall()
+                searched += 1
+                if skip:
+                    rows = [row for i, row in enumerate(rows) if i >= skip or row[1] != cursor[0]]
+                    skip = 0
+                results += [{"device_id": device_id, "ts": ts, "level": level, "message": message, "snippet": snippet}
+                            for device_id, ts, level, message, snippet in rows][:limit - len(results)]
+                if len(results) >= limit:
+                    break
+            return results, searched
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Partitions with their entry counts, and the archive file size.
+        Particiones con su cantidad de entradas, y el tamaño del archivo.
+        """
+        if not os.path.exists(self.path):
+            return {"path": self.path, "partitions": {}, "size_mb": 0.0}
+        conn = self.connect()
+        try:
+            partitions = {day: conn.execute(f"SELECT count(*) FROM {PARTITION_PREFIX}{day}").fetchone()[0]
+                          for day in self.partitions(conn)}
+        finally:
+            conn.close()
+        return {"path": self.path, "retention_days": self.retention_days, "partitions": partitions,
+                "size_mb": round(os.path.getsize(self.path) / (1024 * 1024), 2)}
+
+log_archive = LogArchive()
@@ -2,15 +2,154 @@
 logging_utils.py
 
 Utilities for logging and reading connection logs in the Raspberry Pi Dashboard backend.
+Also configures the backend logging pipeline: records are queued by the request and poller code and
+formatted and written by a background listener thread (JSON file with size and time rotation, plus console).
+
 Utilidades para el registro y lectura de logs de conexión en el backend de Raspberry Pi Dashboard.
+También configura el pipeline de logging del backend: el código de peticiones y sondeo encola los registros
+y un hilo listener en segundo plano los formatea y escribe (archivo JSON con rotación por tamaño y tiempo, y consola).
 """
 
+import atexit
+import copy
+import itertools
+import json
+import logging
 import os
+import queue
 from datetime import datetime
-from typing import List, Dict
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import List, Dict, Optional, TextIO
 
 LOG_FILE = "/app/logs/connection.log"
 
+BACKEND_LOG_FILE = os.environ.get("LOG_FILE_PATH", "backend.log")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN", "midnight")
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "7"))
+# Keep one of every N per-device success lines / Conservar una de cada N líneas de éxito por dispositivo
+LOG_SUCCESS_SAMPLE_EVERY = int(os.environ.get("LOG_SUCCESS_SAMPLE_EVERY", "100"))
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+_status_file: Optional[TextIO] = None
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as one JSON object per line.
+    Formatea los registros de log como un objeto JSON por línea.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """
+    Rotating file handler that rolls over on a time schedule and also when the file exceeds max_bytes.
+    Handler de archivo que rota según un horario y también cuando el archivo supera max_bytes.
+    """
+    def __init__(self, filename: str, max_bytes: int = 0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0 and self.stream is not None:
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+    def rotation_filename(self, default_name: str) -> str:
+        # Size rollovers within the same period must not overwrite the previous file
+        # Las rotaciones por tamaño dentro del mismo periodo no deben sobrescribir el archivo anterior
+        name = super().rotation_filename(default_name)
+        for n in itertools.count(1):
+            if not os.path.exists(name):
+                return name
+            name = f"{default_name}.{n}"
+        return name
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queue handler that, like the stdlib QueueHandler, merges `msg % args` and clears `args` and `exc_info` at
+    enqueue time (the arguments may change before the listener thread runs), but keeps the traceback in
+    `exc_text` instead of the message, so the formatters in the listener still write it apart.
+
+    Handler de cola que, como el QueueHandler estándar, combina `msg % args` y limpia `args` y `exc_info` al
+    encolar (los argumentos pueden cambiar antes de que corra el hilo listener), pero conserva el traceback en
+    `exc_text` en lugar del mensaje, así los formateadores del listener lo siguen escribiendo aparte.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only one of every `every` records flagged with extra={"sample": True}; other records always pass.
+    Conserva solo uno de cada `every` registros marcados con extra={"sample": True}; los demás siempre pasan.
+    """
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(every, 1)
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sample", False):
+            return True
+        return next(self._counter) % self.every == 0
+
+def setup_logging() -> QueueListener:
+    """
+    Configure root logging through a queue and a background listener writing to a rotating file and the console.
+    Configura el logging raíz mediante una cola y un listener en segundo plano que escribe en un archivo rotativo y la consola.
+
+    Returns:
+        QueueListener: The started listener (stopped automatically at exit).
+        QueueListener: El listener iniciado (se detiene automáticamente al salir).
+    """
+    file_handler = SizedTimedRotatingFileHandler(
+        BACKEND_LOG_FILE,
+        max_bytes=LOG_MAX_BYTES,
+        when=LOG_ROTATE_WHEN,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding="utf-8",
+        delay=True,
+    )
+    file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SUCCESS_SAMPLE_EVERY))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
 def log_status(is_online: bool) -> None:
     """
     Log the connection status (ONLINE/OFFLINE) to the log file.
@@ -19,10 +158,12 @@ def log_status(is_online: bool) -> None:
         is_online (bool): True if online, False if offline.
         is_online (bool): True si está online, False si está offline.
     """
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-    with open(LOG_FILE, "a") as f:
-        status = "ONLINE" if is_online else "OFFLINE"
-        f.write(f"{datetime.now().isoformat()} - {status}\n")
+    global _status_file
+    if _status_file is None:
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        _status_file = open(LOG_FILE, "a", buffering=1)
+    status = "ONLINE" if is_online else "OFFLINE"
+    _status_file.write(f"{datetime.now().isoformat()} - {status}\n")
 
 def read_logs() -> List[Dict[str, str]]:
     """
@@ -0,0 +1,145 @@
+"""
+metrics.py
+
+Prometheus/OpenMetrics instrumentation for the backend hot paths: device polling, database access,
+WebSocket delivery, Telegram notifications and event-loop lag. All collectors live in the default
+registry and are exposed by the /metrics endpoint.
+
+Instrumentación Prometheus/OpenMetrics de las rutas críticas del backend: sondeo de dispositivos,
+acceso a base de datos, envío por WebSocket, notificaciones de Telegram y retraso del event loop.
+Todos los colectores viven en el registro por defecto y se exponen en el endpoint /metrics.
+"""
+
+import asyncio
+import functools
+import time
+from typing import Callable, TypeVar
+from prometheus_client import Counter, Gauge, Histogram, disable_created_metrics
+
+F = TypeVar("F", bound=Callable)
+
+# Skip the *_created series: they double the scrape size without adding useful information
+# Omitir las series *_created: duplican el tamaño del scrape sin aportar información útil
+disable_created_metrics()
+
+# Latency buckets in seconds, tuned for LAN HTTP calls and SQLite queries
+# Buckets de latencia en segundos, ajustados para llamadas HTTP en LAN y consultas SQLite
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+HTTP_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0)
+CYCLE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0)
+
+FETCH_STATUS_SECONDS = Histogram(
+    "raingauge_fetch_status_seconds", "Latency of fetch_status per device", ["device"], buckets=HTTP_BUCKETS
+)
+FETCH_ERRORS = Counter(
+    "raingauge_fetch_errors_total", "Failed device requests by endpoint and reason", ["endpoint", "reason"]
+)
+BREAKERS_OPEN = Gauge(
+    "raingauge_breakers_open", "Devices whose circuit breaker is open or half-open"
+)
+BREAKER_TRANSITIONS = Counter(
+    "raingauge_breaker_transitions_total", "Circuit breaker state changes by new state", ["state"]
+)
+HEDGED_REQUESTS = Counter(
+    "raingauge_hedged_requests_total", "Hedged device requests sent, and how many answered first", ["result"]
+)
+FANOUT_LATE = Counter(
+    "raingauge_fanout_late_total", "Device requests that missed the response deadline, by endpoint", ["endpoint"]
+)
+POLL_CYCLE_SECONDS = Histogram(
+    "raingauge_poll_cycle_seconds", "Duration of a full monitoring cycle", buckets=CYCLE_BUCKETS
+)
+POLL_DEVICES = Gauge(
+    "raingauge_poll_devices", "Devices in the last monitoring cycle by state", ["state"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "raingauge_db_query_seconds", "Database time per CRUD function", ["function"], buckets=FAST_BUCKETS
+)
+WS_CONNECTIONS = Gauge(
+    "raingauge_ws_connections", "Connected WebSocket clients"
+)
+WS_DISCONNECTS = Counter(
+    "raingauge_ws_disconnects_total", "Closed or rejected WebSocket connections by reason", ["reason"]
+)
+WS_LEAKED_CONNECTIONS = Counter(
+    "raingauge_ws_leaked_connections_total", "WebSocket connections found registered after their handler exited"
+)
+WS_SEND_QUEUE_DEPTH = Gauge(
+    "raingauge_ws_send_queue_depth", "WebSocket frames waiting to be written to clients"
+)
+WS_SEND_SECONDS = Histogram(
+    "raingauge_ws_send_seconds", "Time to write one WebSocket frame", buckets=FAST_BUCKETS
+)
+SSE_CLIENTS = Gauge(
+    "raingauge_sse_clients", "Connected Server-Sent Events clients"
+)
+FEDERATION_PEERS_CONNECTED = Gauge(
+    "raingauge_federation_peers_connected", "Federation peers whose event stream is connected"
+)
+FEDERATION_EVENTS = Counter(
+    "raingauge_federation_events_total", "Events received from federation peers", ["peer", "event"]
+)
+FEDERATION_RECONNECTS = Counter(
+    "raingauge_federation_reconnects_total", "Federation peer streams that ended or failed", ["peer"]
+)
+LOG_ARCHIVE_ENTRIES = Counter(
+    "raingauge_log_archive_entries_total", "Collected device log entries by archive result", ["result"]
+)
+LOG_SEARCH_SECONDS = Histogram(
+    "raingauge_log_search_seconds", "Time to answer one log archive search", buckets=FAST_BUCKETS
+)
+TELEGRAM_SEND_SECONDS = Histogram(
+    "raingauge_telegram_send_seconds", "Latency of Telegram sendMessage calls", buckets=HTTP_BUCKETS
+)
+COMPRESSION_BYTES = Counter(
+    "raingauge_compression_bytes_total", "HTTP response bytes before and after compression", ["encoding", "stage"]
+)
+COMPRESSION_SECONDS = Histogram(
+    "raingauge_compression_seconds", "CPU time spent compressing one HTTP response", ["encoding"], buckets=FAST_BUCKETS
+)
+HTTP_CACHE_RESPONSES = Counter(
+    "raingauge_http_cache_responses_total", "Conditional list responses by resource and result", ["resource", "result"]
+)
+RING_BUFFER_BYTES = Gauge(
+    "raingauge_ring_buffer_bytes", "Memory used by the per-device recent metric ring buffers"
+)
+OPERATION_RESULTS = Counter(
+    "raingauge_operation_results_total", "Per-device results of fleet operations", ["operation", "outcome"]
+)
+OPERATION_DEVICE_SECONDS = Histogram(
+    "raingauge_operation_device_seconds", "Time of one device call of a fleet operation", ["operation"], buckets=CYCLE_BUCKETS
+)
+DISCOVERY_PROBES = Counter(
+    "raingauge_discovery_probes_total", "Network discovery probes by result", ["result"]
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "raingauge_event_loop_lag_seconds", "Delay of the event loop in waking up a sleeping task", buckets=FAST_BUCKETS
+)
+
+LOOP_LAG_PROBE_INTERVAL = 0.5
+
+def observe_db(func: F) -> F:
+    """
+    Decorator that records the execution time of a CRUD function in DB_QUERY_SECONDS.
+    Decorador que registra el tiempo de ejecución de una función CRUD en DB_QUERY_SECONDS.
+    """
+    histogram = DB_QUERY_SECONDS.labels(func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+async def measure_loop_lag() -> None:
+    """
+    Sleep for a fixed interval and record how late the event loop woke the task up.
+    Duerme un intervalo fijo y registra con cuánto retraso el event loop despertó la tarea.
+    """
+    started = time.perf_counter()
+    await asyncio.sleep(LOOP_LAG_PROBE_INTERVAL)
+    lag = time.perf_counter() - started - LOOP_LAG_PROBE_INTERVAL
+    EVENT_LOOP_LAG_SECONDS.observe(max(lag, 0.0))
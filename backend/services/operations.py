@@ -0,0 +1,239 @@
+"""
+operations.py
+
+Fleet-wide operations (reboot, service restart, config push). A named operation is sent as a POST to
+an endpoint of every selected Raspberry Pi by a pool of OPERATION_CONCURRENCY workers, each call with
+a hard OPERATION_TIMEOUT budget, so a rollout takes about as long as its slowest batch instead of the
+sum of all devices. Progress is published (throttled to OPERATION_PROGRESS_INTERVAL) to the WebSocket
+and to the DeviceOperation row, which keeps the per-device results when the operation ends.
+
+Operaciones sobre toda la flota (reinicio, reinicio de servicio, envío de configuración). Una
+operación con nombre se envía como POST a un endpoint de cada Raspberry Pi seleccionada mediante un
+pool de OPERATION_CONCURRENCY workers, cada llamada con un límite estricto de OPERATION_TIMEOUT, así un
+despliegue tarda más o menos lo que su lote más lento en lugar de la suma de todos los dispositivos.
+El progreso se publica (limitado a OPERATION_PROGRESS_INTERVAL) al WebSocket y a la fila
+DeviceOperation, que guarda los resultados por dispositivo cuando la operación termina.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+import httpx
+from sqlmodel import Session
+from models import Device, DeviceOperation
+import crud
+from database import engine
+from services.device_registry import device_registry
+from services.group_aggregates import group_aggregates
+from services.metrics import OPERATION_RESULTS, OPERATION_DEVICE_SECONDS
+from services.serialization import dumps
+from utils import DEVICE_API_PORT, DEVICE_CONNECT_TIMEOUT, get_client, error_reason
+
+logger = logging.getLogger(__name__)
+
+# Operation name -> path of the device API endpoint that runs it
+# Nombre de la operación -> ruta del endpoint de la API del dispositivo que la ejecuta
+OPERATIONS: Dict[str, str] = {
+    "reboot": "/api/v1/reboot",
+    "restart_service": "/api/v1/service/restart",
+    "push_config": "/api/v1/config",
+}
+OPERATION_CONCURRENCY = int(os.environ.get("OPERATION_CONCURRENCY", "50"))
+# Total budget of one device call (connect + request + response) / Presupuesto total de una llamada a un dispositivo
+OPERATION_TIMEOUT = float(os.environ.get("OPERATION_TIMEOUT", "30"))
+OPERATION_PROGRESS_INTERVAL = float(os.environ.get("OPERATION_PROGRESS_INTERVAL", "1"))
+OPERATION_HTTP_TIMEOUT = httpx.Timeout(OPERATION_TIMEOUT, connect=DEVICE_CONNECT_TIMEOUT, pool=None)
+# Characters of a failed response body kept in the result / Caracteres del cuerpo de una respuesta fallida guardados en el resultado
+ERROR_BODY_CHARS = 200
+
+Publish = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Running operations by ID (also the strong references to their tasks)
+# Operaciones en curso por ID (también las referencias fuertes a sus tareas)
+_running: Dict[int, asyncio.Task] = {}
+
+def select_devices(device_ids: Iterable[int] = (), group_ids: Iterable[int] = (),
+                   enabled_only: bool = True) -> List[Device]:
+    """
+    Devices targeted by an operation: the given IDs plus the members of the given groups and their
+    subgroups. No IDs and no groups = every device.
+    Dispositivos objetivo de una operación: los IDs dados más los miembros de los grupos dados y de
+    sus subgrupos. Sin IDs ni grupos = todos los dispositivos.
+    """
+    device_ids, group_ids = set(device_ids), set(group_ids)
+    devices = device_registry.enabled() if enabled_only else device_registry.all()
+    if not device_ids and not group_ids:
+        return list(devices)
+    groups = group_aggregates.descendants(group_ids)
+    return [d for d in devices if d.id in device_ids or d.group_id in groups]
+
+async def call_device(name: str, device: Device, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    POST an operation to one device. Returns its result: ok, HTTP status, error and seconds.
+    Envía una operación por POST a un dispositivo. Retorna su resultado: ok, estado HTTP, error y segundos.
+    """
+    url = f"http://{device.ip}:{DEVICE_API_PORT}{OPERATIONS[name]}"
+    result: Dict[str, Any] = {"device_id": device.id, "ip": device.ip, "ok": False, "status_code": None, "error": None}
+    started = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(
+            get_client(device.ip).post(url, json=params, timeout=OPERATION_HTTP_TIMEOUT), OPERATION_TIMEOUT,
+        )
+        result["status_code"] = response.status_code
+        result["ok"] = response.is_success
+        if not response.is_success:
+            result["error"] = response.text[:ERROR_BODY_CHARS] or f"HTTP {response.status_code}"
+    except asyncio.TimeoutError:
+        result["error"] = "timeout"
+    except Exception as e:
+        result["error"] = f"{error_reason(e)}: {e}"
+    elapsed = time.perf_counter() - started
+    result["seconds"] = round(elapsed, 3)
+    OPERATION_DEVICE_SECONDS.labels(name).observe(elapsed)
+    OPERATION_RESULTS.labels(name, "ok" if result["ok"] else "failed").inc()
+    return result
+
+class OperationProgress:
+    """
+    Counters and results of a running operation, published at most every OPERATION_PROGRESS_INTERVAL.
+    Contadores y resultados de una operación en curso, publicados como mucho cada OPERATION_PROGRESS_INTERVAL.
+    """
+    def __init__(self, operation: DeviceOperation, publish: Optional[Publish]):
+        self.id = operation.id
+        self.name = operation.name
+        self.total = operation.total
+        self.publish = publish
+        self.results: List[Dict[str, Any]] = []
+        self.succeeded = 0
+        self.failed = 0
+        self.published_at = time.monotonic()
+
+    def add(self, result: Dict[str, Any]) -> bool:
+        """
+        Record one device result; True when progress is due to be published.
+        Registra el resultado de un dispositivo; True cuando corresponde publicar el progreso.
+        """
+        self.results.append(result)
+        if result["ok"]:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        return time.monotonic() - self.published_at >= OPERATION_PROGRESS_INTERVAL
+
+    def frame(self, status: str) -> Dict[str, Any]:
+        return {
+            "type": "operation_progress", "id": self.id, "name": self.name, "status": status,
+            "total": self.total, "done": len(self.results), "succeeded": self.succeeded, "failed": self.failed,
+        }
+
+    async def flush(self, status: str = "running") -> None:
+        """
+        Store the counters (and, once finished, the results) and publish a progress frame.
+        Guarda los contadores (y, al terminar, los resultados) y publica un frame de progreso.
+        """
+        self.published_at = time.monotonic()
+        values: Dict[str, Any] = {"status": status, "succeeded": self.succeeded, "failed": self.failed}
+        if status != "running":
+            values["finished_at"] = datetime.utcnow()
+            values["results"] = dumps(sorted(self.results, key=lambda r: r["device_id"])).decode()
+        with Session(engine) as session:
+            crud.update_operation(session, self.id, values)
+        if self.publish is not None:
+            try:
+                await self.publish(self.frame(status))
+            except Exception as e:
+                logger.error("Error publishing progress of operation %s: %s", self.id, e)
+
+async def run_operation(operation: DeviceOperation, devices: List[Device], params: Dict[str, Any],
+                        publish: Optional[Publish] = None) -> None:
+    """
+    Call the operation on every device with at most OPERATION_CONCURRENCY calls in flight.
+    On cancellation the results gathered so far are stored with status 'cancelled', and on an
+    unexpected error with status 'failed'.
+
+    Llama a la operación en cada dispositivo con como máximo OPERATION_CONCURRENCY llamadas en curso.
+    Al cancelarse se guardan los resultados obtenidos hasta el momento con estado 'cancelled', y ante
+    un error inesperado con estado 'failed'.
+    """
+    progress = OperationProgress(operation, publish)
+    # Workers share one iterator: next() never awaits, so each device is taken exactly once
+    # Los workers comparten un iterador: next() nunca espera, así cada dispositivo se toma una sola vez
+    pending = iter(devices)
+
+    async def worker() -> None:
+        for device in pending:
+            if progress.add(await call_device(operation.name, device, params)):
+                # A failed progress update must not stop the operation; the final one stores everything
+                # Una actualización de progreso fallida no debe detener la operación; la final guarda todo
+                try:
+                    await progress.flush()
+                except Exception as e:
+                    logger.error("Error storing progress of operation %s: %s", operation.id, e)
+
+    async def stop() -> None:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(OPERATION_CONCURRENCY, len(devices)))]
+    try:
+        await asyncio.gather(*workers)
+    except asyncio.CancelledError:
+        await stop()
+        await progress.flush("cancelled")
+        logger.info("Operation %s (%s) cancelled after %d/%d devices", operation.id, operation.name,
+                    len(progress.results), progress.total)
+        raise
+    except Exception as e:
+        await stop()
+        await progress.flush("failed")
+        logger.error("Operation %s (%s) failed after %d/%d devices: %s", operation.id, operation.name,
+                     len(progress.results), progress.total, e)
+        return
+    await progress.flush("completed")
+    logger.info("Operation %s (%s) completed: %d ok, %d failed", operation.id, operation.name,
+                progress.succeeded, progress.failed)
+
+def start_operation(session: Session, name: str, params: Dict[str, Any], target: Dict[str, Any],
+                    devices: List[Device], created_by: Optional[str], publish: Optional[Publish] = None) -> DeviceOperation:
+    """
+    Persist a new operation and run it in the background. Must be called from the event loop.
+    Persiste una nueva operación y la ejecuta en segundo plano. Debe llamarse desde el event loop.
+    """
+    operation = crud.create_operation(session, DeviceOperation(
+        name=name, params=dumps(params).decode(), target=dumps(target).decode(),
+        created_by=created_by, total=len(devices),
+    ))
+    task = asyncio.ensure_future(run_operation(operation, devices, params, publish))
+    _running[operation.id] = task
+    task.add_done_callback(lambda t, operation_id=operation.id: _finished(operation_id, t))
+    return operation
+
+def _finished(operation_id: int, task: asyncio.Task) -> None:
+    _running.pop(operation_id, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Operation %s failed: %s", operation_id, task.exception())
+
+def cancel_operation(operation_id: int) -> bool:
+    """
+    Cancel a running operation; False if it is not running in this process.
+    Cancela una operación en curso; False si no se está ejecutando en este proceso.
+    """
+    task = _running.get(operation_id)
+    if task is None:
+        return False
+    task.cancel()
+    return True
+
+async def cancel_all() -> None:
+    """
+    Cancel every running operation and wait for their results to be stored (on shutdown).
+    Cancela todas las operaciones en curso y espera a que se guarden sus resultados (al apagar).
+    """
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,156 @@
+"""
+payload_schema.py
+
+Declarative extraction of gauge readings from status payloads. Each device type maps metric names to
+paths in the (flattened) fetch_status result, e.g. "rain.mm" -> status["rain"]["mm"]. A schema is
+compiled once into a single generated function that reads every path with direct subscripts, so
+extracting a sample costs one call instead of walking dicts per field. Metric names are interned into
+the Metric table and samples are stored as (device_id, metric_id, ts, value) rows in MetricSample.
+
+The built-in schemas can be extended or overridden with a JSON file in PAYLOAD_SCHEMA_FILE:
+    {"raingauge": {"rain.mm": {"path": "rain.mm", "unit": "mm"}, "solar.v": "solar.voltage"}}
+
+Extracción declarativa de lecturas de pluviómetros desde los payloads de estado. Cada tipo de
+dispositivo asigna nombres de métricas a rutas del resultado (aplanado) de fetch_status, p. ej.
+"rain.mm" -> status["rain"]["mm"]. Un esquema se compila una vez en una única función generada que lee
+cada ruta con subíndices directos, así extraer una muestra cuesta una llamada en lugar de recorrer
+diccionarios por campo. Los nombres de métricas se internan en la tabla Metric y las muestras se
+guardan como filas (device_id, metric_id, ts, value) en MetricSample.
+
+Los esquemas incluidos se pueden ampliar o reemplazar con un archivo JSON en PAYLOAD_SCHEMA_FILE
+(mismo formato que el ejemplo anterior).
+"""
+
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlmodel import Session, select
+from models import Metric
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_SCHEMA_FILE = os.environ.get("PAYLOAD_SCHEMA_FILE", "")
+
+DEFAULT_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "raingauge": {
+        "rain.count": {"path": "rain.count", "unit": "tips"},
+        "rain.mm": {"path": "rain.mm", "unit": "mm"},
+        "battery.voltage": {"path": "battery.voltage", "unit": "V"},
+        "gps.lat": {"path": "gps.lat", "unit": "deg"},
+        "gps.lon": {"path": "gps.lon", "unit": "deg"},
+    },
+}
+
+def as_float(value: Any) -> Optional[float]:
+    """
+    Convert a reading to float, or None if it is missing or not numeric.
+    Convierte una lectura a float, o None si falta o no es numérica.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def compile_extractor(paths: List[str]) -> Callable[[Dict[str, Any]], Tuple[Optional[float], ...]]:
+    """
+    Generate a function returning the values at `paths` (dotted; numeric parts index lists) as a tuple,
+    with None for missing or non-numeric readings.
+    Genera una función que retorna los valores en `paths` (con puntos; las partes numéricas indexan
+    listas) como tupla, con None para lecturas ausentes o no numéricas.
+    """
+    lines = ["def extract(status):"]
+    for i, path in enumerate(paths):
+        access = "status" + "".join(f"[{int(k)}]" if k.isdigit() else f"[{k!r}]" for k in path.split("."))
+        lines += [
+            "    try:",
+            f"        v{i} = as_float({access})",
+            "    except (KeyError, IndexError, TypeError):",
+            f"        v{i} = None",
+        ]
+    lines.append("    return (" + "".join(f"v{i}, " for i in range(len(paths))) + ")")
+    namespace: Dict[str, Any] = {"as_float": as_float}
+    exec(compile("\n".join(lines), "<payload_schema>", "exec"), namespace)
+    return namespace["extract"]
+
+class CompiledSchema:
+    """
+    Metric names, units and the generated extractor of one device type.
+    Nombres de métricas, unidades y el extractor generado de un tipo de dispositivo.
+    """
+    def __init__(self, device_type: str, fields: Dict[str, Any]):
+        self.device_type = device_type
+        specs = [spec if isinstance(spec, dict) else {"path": spec} for spec in fields.values()]
+        self.names: Tuple[str, ...] = tuple(fields)
+        self.units: Tuple[Optional[str], ...] = tuple(spec.get("unit") for spec in specs)
+        self.extract = compile_extractor([spec["path"] for spec in specs])
+
+def load_schemas() -> Dict[str, Dict[str, Any]]:
+    """
+    Built-in schemas updated with the ones in PAYLOAD_SCHEMA_FILE, if set.
+    Esquemas incluidos actualizados con los de PAYLOAD_SCHEMA_FILE, si está definido.
+    """
+    schemas = {device_type: dict(fields) for device_type, fields in DEFAULT_SCHEMAS.items()}
+    if PAYLOAD_SCHEMA_FILE:
+        try:
+            with open(PAYLOAD_SCHEMA_FILE, encoding="utf-8") as f:
+                for device_type, fields in json.load(f).items():
+                    schemas.setdefault(device_type, {}).update(fields)
+        except (OSError, ValueError) as e:
+            logger.error("Could not load payload schemas from %s: %s", PAYLOAD_SCHEMA_FILE, e)
+    return schemas
+
+_schemas = load_schemas()
+_compiled: Dict[str, CompiledSchema] = {}
+
+def schema_for(device_type: Optional[str]) -> Optional[CompiledSchema]:
+    """
+    Compiled schema of a device type (compiled on first use), or None if the type has no schema.
+    Esquema compilado de un tipo de dispositivo (compilado en el primer uso), o None si el tipo no tiene esquema.
+    """
+    compiled = _compiled.get(device_type)
+    if compiled is None and device_type in _schemas and _schemas[device_type]:
+        compiled = _compiled[device_type] = CompiledSchema(device_type, _schemas[device_type])
+    return compiled
+
+class MetricCatalog:
+    """
+    Interned metric IDs by name, backed by the Metric table.
+    IDs de métricas internados por nombre, respaldados por la tabla Metric.
+    """
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def ids_for(self, session: Session, schema: CompiledSchema) -> Tuple[int, ...]:
+        """
+        Metric IDs of a schema's fields, creating the missing Metric rows.
+        IDs de métricas de los campos de un esquema, creando las filas Metric que faltan.
+        """
+        missing = [name for name in schema.names if name not in self.ids]
+        if missing:
+            for metric in session.exec(select(Metric).where(Metric.name.in_(missing))).all():
+                self.ids[metric.name] = metric.id
+            new = [Metric(name=name, unit=unit) for name, unit in zip(schema.names, schema.units)
+                   if name not in self.ids]
+            if new:
+                session.add_all(new)
+                session.commit()
+                for metric in new:
+                    self.ids[metric.name] = metric.id
+        return tuple(self.ids[name] for name in schema.names)
+
+    def id_of(self, session: Session, name: str) -> Optional[int]:
+        """
+        ID of a metric name, or None if it was never recorded.
+        ID de un nombre de métrica, o None si nunca se registró.
+        """
+        if name not in self.ids:
+            metric = session.exec(select(Metric).where(Metric.name == name)).first()
+            if metric is None:
+                return None
+            self.ids[name] = metric.id
+        return self.ids[name]
+
+metric_catalog = MetricCatalog()
@@ -0,0 +1,184 @@
+"""
+profiling.py
+
+On-demand profiling of the running backend. `sample_stacks` is a sampling CPU profiler: a helper
+thread reads the Python stack of every other thread (sys._current_frames) at a fixed interval for a
+bounded time and counts the stacks, so the event loop keeps serving while it is observed and nothing
+is instrumented outside a capture. The result lists the hottest functions (self and total samples)
+and the collapsed stacks used by flame graph tools. `memory_snapshot` takes a tracemalloc snapshot
+(tracing only during the capture unless it was already on) with the largest allocation sites and
+their growth over the window. Only one capture of each kind runs at a time.
+
+Perfilado bajo demanda del backend en ejecución. `sample_stacks` es un perfilador de CPU por
+muestreo: un hilo auxiliar lee la pila Python de cada uno de los demás hilos (sys._current_frames) a
+intervalos fijos durante un tiempo acotado y cuenta las pilas, así el event loop sigue atendiendo
+mientras se observa y nada se instrumenta fuera de una captura. El resultado lista las funciones más
+calientes (muestras propias y totales) y las pilas colapsadas que usan las herramientas de flame
+graphs. `memory_snapshot` toma una instantánea de tracemalloc (trazando solo durante la captura salvo
+que ya estuviera activo) con los sitios de mayor asignación y su crecimiento en la ventana. Solo se
+ejecuta una captura de cada tipo a la vez.
+"""
+
+import asyncio
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MIN_INTERVAL = 0.001
+# Frames kept per allocation by tracemalloc captures / Frames guardados por asignación en las capturas tracemalloc
+TRACEMALLOC_FRAMES = int(os.environ.get("TRACEMALLOC_FRAMES", "1"))
+
+# Leaf frames of threads waiting for work (event loop in select, idle pool workers, log queue listener)
+# Frames hoja de hilos esperando trabajo (event loop en select, workers del pool inactivos, listener de la cola de logs)
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("_threads.py", "run"),
+    ("handlers.py", "dequeue"),
+}
+
+_profile_lock = threading.Lock()
+_memory_lock = asyncio.Lock()
+
+def frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def collect_samples(seconds: float, interval: float, include_idle: bool) -> Tuple[Counter, int]:
+    """
+    Sample the stacks of every other thread for `seconds`. Returns the collapsed stack counts
+    ("thread;root;...;leaf" -> samples) and the number of sampling rounds.
+    Muestrea las pilas de todos los demás hilos durante `seconds`. Retorna los conteos de pilas
+    colapsadas ("hilo;raíz;...;hoja" -> muestras) y el número de rondas de muestreo.
+    """
+    own = threading.get_ident()
+    stacks: Counter = Counter()
+    rounds = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            code = frame.f_code
+            if not include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(labels))] += 1
+        rounds += 1
+        time.sleep(interval)
+    return stacks, rounds
+
+def summarize_samples(stacks: Counter, top: int) -> Dict[str, Any]:
+    """
+    Hottest functions by self samples (on top of the stack) and total samples (anywhere in it).
+    Funciones más calientes por muestras propias (en la cima de la pila) y totales (en cualquier parte).
+    """
+    own: Counter = Counter()
+    total: Counter = Counter()
+    threads: Counter = Counter()
+    for stack, count in stacks.items():
+        thread, *frames = stack.split(";")
+        threads[thread] += count
+        if frames:
+            own[frames[-1]] += count
+        for label in set(frames):
+            total[label] += count
+    samples = sum(stacks.values())
+
+    def ranking(counter: Counter) -> List[Dict[str, Any]]:
+        return [{"function": label, "samples": count, "percent": round(100 * count / samples, 1)}
+                for label, count in counter.most_common(top)]
+
+    return {"samples": samples, "threads": dict(threads), "top_self": ranking(own), "top_total": ranking(total)}
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False, top: int = 30) -> Dict[str, Any]:
+    """
+    Run a sampling CPU profile for `seconds` (blocking: call it from a worker thread).
+    Raises RuntimeError if another profile is running.
+    Ejecuta un perfil de CPU por muestreo durante `seconds` (bloqueante: llamarla desde un hilo).
+    Lanza RuntimeError si otro perfil está en curso.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A CPU profile is already running")
+    try:
+        seconds = min(max(seconds, interval), PROFILE_MAX_SECONDS)
+        interval = max(interval, PROFILE_MIN_INTERVAL)
+        started = time.perf_counter()
+        stacks, rounds = collect_samples(seconds, interval, include_idle)
+        summary = summarize_samples(stacks, top)
+        summary.update({
+            "seconds": round(time.perf_counter() - started, 3),
+            "interval": interval,
+            "rounds": rounds,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+        })
+        return summary
+    finally:
+        _profile_lock.release()
+
+MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+def stat_to_dict(stat) -> Dict[str, Any]:
+    frame = stat.traceback[0]
+    entry = {"location": f"{frame.filename}:{frame.lineno}", "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+async def memory_snapshot(seconds: float, top: int = 25, group_by: str = "lineno") -> Dict[str, Any]:
+    """
+    tracemalloc snapshot after `seconds`: the largest live allocation sites and, compared with a snapshot
+    taken at the start, the ones that grew the most. Tracing is started for the capture and stopped after
+    it unless it was already active (PYTHONTRACEMALLOC). Raises RuntimeError if a capture is running.
+
+    Instantánea tracemalloc tras `seconds`: los sitios con más memoria asignada viva y, comparados con una
+    instantánea tomada al inicio, los que más crecieron. El trazado se activa para la captura y se detiene
+    después salvo que ya estuviera activo (PYTHONTRACEMALLOC). Lanza RuntimeError si hay una captura en curso.
+    """
+    if _memory_lock.locked():
+        raise RuntimeError("A memory snapshot is already running")
+    async with _memory_lock:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        try:
+            first = await asyncio.to_thread(tracemalloc.take_snapshot)
+            await asyncio.sleep(min(seconds, PROFILE_MAX_SECONDS))
+            last = await asyncio.to_thread(tracemalloc.take_snapshot)
+            current, peak = tracemalloc.get_traced_memory()
+            overhead = tracemalloc.get_tracemalloc_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+        first = first.filter_traces(MEMORY_FILTERS)
+        last = last.filter_traces(MEMORY_FILTERS)
+        top_stats = await asyncio.to_thread(last.statistics, group_by)
+        growth = await asyncio.to_thread(last.compare_to, first, group_by)
+    return {
+        "seconds": seconds,
+        "tracing_since_start": not started_here,
+        "traced_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "tracemalloc_overhead_kb": round(overhead / 1024, 1),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "top": [stat_to_dict(stat) for stat in top_stats[:top]],
+        "growth": [stat_to_dict(stat) for stat in growth[:top] if stat.size_diff > 0],
+    }
@@ -0,0 +1,170 @@
+"""
+request_timing.py
+
+Per-request timing breakdown returned as a Server-Timing header. A request sending
+`X-Server-Timing: 1` (or the value of SERVER_TIMING_TOKEN when it is set) gets the time spent in the
+database, upstream device HTTP calls, JSON serialization and authentication, plus the total. The
+timings live in a context variable that is only set for those requests: everywhere else the
+instrumented functions check it and call straight through, so tracing costs nothing when disabled.
+Upstream calls of a fan-out run concurrently, so their sum can exceed the total.
+
+Desglose de tiempos por petición devuelto en una cabecera Server-Timing. Una petición que envía
+`X-Server-Timing: 1` (o el valor de SERVER_TIMING_TOKEN si está definido) recibe el tiempo pasado en
+la base de datos, las llamadas HTTP a dispositivos, la serialización JSON y la autenticación, más el
+total. Los tiempos viven en una variable de contexto que solo se define para esas peticiones: en el
+resto de los casos las funciones instrumentadas la consultan y llaman directamente, así el trazado no
+cuesta nada cuando está desactivado. Las llamadas a dispositivos de un fan-out corren en paralelo, así
+que su suma puede superar el total.
+"""
+
+import asyncio
+import functools
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, TypeVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+F = TypeVar("F", bound=Callable)
+
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+# When set, the request header must carry this value instead of "1"
+# Si está definido, la cabecera de la petición debe llevar este valor en lugar de "1"
+SERVER_TIMING_TOKEN = os.environ.get("SERVER_TIMING_TOKEN", "")
+SERVER_TIMING_HEADER = "x-server-timing"
+
+# Category -> [seconds, calls] for the current request, None when not traced
+# Categoría -> [segundos, llamadas] de la petición actual, None si no se traza
+_timings: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar("request_timings", default=None)
+
+def record(timings: Dict[str, List[float]], category: str, seconds: float) -> None:
+    entry = timings.get(category)
+    if entry is None:
+        timings[category] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+class _Span:
+    __slots__ = ("timings", "category", "started")
+
+    def __init__(self, timings: Dict[str, List[float]], category: str):
+        self.timings = timings
+        self.category = category
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        record(self.timings, self.category, time.perf_counter() - self.started)
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+_NO_SPAN = _NoSpan()
+
+def trace(category: str):
+    """
+    Context manager adding the time of its block to `category` when the request is traced.
+    Context manager que suma el tiempo de su bloque a `category` cuando la petición se traza.
+    """
+    timings = _timings.get()
+    return _NO_SPAN if timings is None else _Span(timings, category)
+
+def traced(category: str) -> Callable[[F], F]:
+    """
+    Decorator (sync or async functions) adding each call's time to `category` when the request is traced.
+    Decorador (funciones síncronas o asíncronas) que suma el tiempo de cada llamada a `category` cuando la petición se traza.
+    """
+    def decorator(func: F) -> F:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                timings = _timings.get()
+                if timings is None:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(timings, category, time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _timings.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(timings, category, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time every SQL statement executed on `engine` under the "db" category of traced requests.
+    Mide cada sentencia SQL ejecutada en `engine` en la categoría "db" de las peticiones trazadas.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if _timings.get() is not None:
+            conn.info.setdefault("timing_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = _timings.get()
+        started = conn.info.get("timing_started")
+        if timings is not None and started:
+            record(timings, "db", time.perf_counter() - started.pop())
+
+def server_timing(timings: Dict[str, List[float]], total: float) -> str:
+    """
+    Server-Timing header value: `db;dur=1.20;desc="3 calls", ..., total;dur=8.50` (milliseconds).
+    Valor de la cabecera Server-Timing: `db;dur=1.20;desc="3 calls", ..., total;dur=8.50` (milisegundos).
+    """
+    parts = [f'{category};dur={seconds * 1000:.2f};desc="{int(calls)} calls"'
+             for category, (seconds, calls) in list(timings.items())]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware enabling the timing breakdown for requests that ask for it and adding the
+    Server-Timing header to their response.
+    Middleware ASGI que activa el desglose de tiempos en las peticiones que lo piden y agrega la
+    cabecera Server-Timing a su respuesta.
+    """
+    def __init__(self, app: ASGIApp, token: str = SERVER_TIMING_TOKEN):
+        self.app = app
+        self.token = token or "1"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or Headers(scope=scope).get(SERVER_TIMING_HEADER) != self.token:
+            await self.app(scope, receive, send)
+            return
+        timings: Dict[str, List[float]] = {}
+        reset = _timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                headers.append("Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(reset)
@@ -0,0 +1,195 @@
+"""
+ring_buffer.py
+
+Per-device ring buffers with the most recent metric samples, filled by the poller on every cycle.
+Samples are stored in preallocated arrays (uint32 Unix timestamps, int8 online flag and one float32
+array per metric), about 21 bytes per sample, so "last hour" queries, sparklines and WebSocket
+catch-up are answered from memory and the database is only read for older ranges. The capacity per
+device shrinks when needed to keep the total under RING_BUFFER_MAX_MB.
+
+Buffers circulares por dispositivo con las muestras de métricas más recientes, llenados por el
+sondeo en cada ciclo. Las muestras se guardan en arreglos preasignados (timestamps Unix uint32,
+indicador online int8 y un arreglo float32 por métrica), unos 21 bytes por muestra, así las consultas
+de "última hora", los sparklines y la puesta al día del WebSocket se responden desde memoria y la
+base de datos solo se lee para rangos más antiguos. La capacidad por dispositivo se reduce cuando
+hace falta para mantener el total por debajo de RING_BUFFER_MAX_MB.
+"""
+
+import os
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from services.metrics import RING_BUFFER_BYTES
+from services.payload_schema import as_float
+
+RING_FIELDS = ("cpu", "ram", "disk", "temp")
+# 360 samples = one hour at the default 10 s poll interval / 360 muestras = una hora con el sondeo por defecto de 10 s
+RING_BUFFER_SAMPLES = int(os.environ.get("RING_BUFFER_SAMPLES", "360"))
+RING_BUFFER_MAX_MB = float(os.environ.get("RING_BUFFER_MAX_MB", "50"))
+RING_BUFFER_MIN_SAMPLES = 12
+SAMPLE_BYTES = 4 + 1 + 4 * len(RING_FIELDS)
+# Python object overhead of one device's buffer (arrays, slots object, dict entry)
+# Sobrecarga de objetos Python del buffer de un dispositivo (arreglos, objeto con slots, entrada del dict)
+RING_DEVICE_OVERHEAD_BYTES = 640
+NAN = float("nan")
+
+class DeviceRing:
+    """
+    Fixed-capacity circular buffer of one device's samples, oldest overwritten first.
+    Buffer circular de capacidad fija con las muestras de un dispositivo; se sobrescribe primero la más antigua.
+    """
+    __slots__ = ("capacity", "timestamps", "online", "values", "head", "size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array("I", bytes(4 * capacity))
+        self.online = array("b", bytes(capacity))
+        self.values = [array("f", bytes(4 * capacity)) for _ in RING_FIELDS]
+        self.head = 0
+        self.size = 0
+
+    def append(self, ts: int, online: bool, values: Sequence[float]) -> None:
+        i = self.head
+        self.timestamps[i] = ts
+        self.online[i] = online
+        for column, value in zip(self.values, values):
+            column[i] = value
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def order(self) -> List[int]:
+        """
+        Slot indexes from oldest to newest.
+        Índices de las posiciones de la más antigua a la más reciente.
+        """
+        start = (self.head - self.size) % self.capacity
+        return [(start + k) % self.capacity for k in range(self.size)]
+
+    def oldest(self) -> Optional[int]:
+        return self.timestamps[(self.head - self.size) % self.capacity] if self.size else None
+
+    def resized(self, capacity: int) -> "DeviceRing":
+        """
+        Copy with another capacity, keeping the newest samples that fit.
+        Copia con otra capacidad, conservando las muestras más recientes que caben.
+        """
+        ring = DeviceRing(capacity)
+        for i in self.order()[-capacity:]:
+            ring.append(self.timestamps[i], bool(self.online[i]), [column[i] for column in self.values])
+        return ring
+
+class MetricRings:
+    """
+    Ring buffers of every polled device within a total memory budget.
+    Buffers circulares de todos los dispositivos sondeados dentro de un presupuesto de memoria total.
+    """
+    def __init__(self, samples: int = RING_BUFFER_SAMPLES, max_bytes: int = int(RING_BUFFER_MAX_MB * 1024 * 1024)):
+        self.samples = samples
+        self.max_bytes = max_bytes
+        self.capacity = samples
+        self.rings: Dict[int, DeviceRing] = {}
+        self.version = 0
+
+    def fit(self, device_count: int) -> None:
+        """
+        Adjust the per-device capacity so `device_count` buffers fit in the memory budget.
+        Ajusta la capacidad por dispositivo para que `device_count` buffers quepan en el presupuesto de memoria.
+        """
+        capacity = self.samples
+        if device_count:
+            per_device = self.max_bytes // device_count - RING_DEVICE_OVERHEAD_BYTES
+            capacity = max(min(self.samples, per_device // SAMPLE_BYTES), RING_BUFFER_MIN_SAMPLES)
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.rings = {device_id: ring.resized(capacity) for device_id, ring in self.rings.items()}
+        RING_BUFFER_BYTES.set(len(self.rings) * (self.capacity * SAMPLE_BYTES + RING_DEVICE_OVERHEAD_BYTES))
+
+    def record(self, device_id: int, status: Dict[str, Any], online: bool, ts: Optional[int] = None) -> None:
+        """
+        Append one poll result; missing or non-numeric readings are stored as NaN.
+        Agrega un resultado del sondeo; las lecturas ausentes o no numéricas se guardan como NaN.
+        """
+        ring = self.rings.get(device_id)
+        if ring is None:
+            ring = self.rings[device_id] = DeviceRing(self.capacity)
+        values = [NAN] * len(RING_FIELDS)
+        if online:
+            for k, field in enumerate(RING_FIELDS):
+                value = as_float(status.get(field))
+                if value is not None:
+                    values[k] = value
+        ring.append(int(time.time()) if ts is None else ts, online, values)
+        self.version += 1
+
+    def remove(self, device_id: int) -> None:
+        self.rings.pop(device_id, None)
+
+    def oldest(self, device_id: int) -> Optional[int]:
+        """
+        Unix timestamp of the oldest sample held for a device, or None if there is none.
+        Timestamp Unix de la muestra más antigua guardada de un dispositivo, o None si no hay ninguna.
+        """
+        ring = self.rings.get(device_id)
+        return ring.oldest() if ring is not None else None
+
+    def rows(self, device_id: int, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Samples between two Unix timestamps as MetricHistory-like rows (without id), oldest first.
+        Values are rounded to 2 decimals to hide float32 noise.
+        Muestras entre dos timestamps Unix como filas tipo MetricHistory (sin id), de la más antigua a la
+        más reciente. Los valores se redondean a 2 decimales para ocultar el ruido de float32.
+        """
+        ring = self.rings.get(device_id)
+        if ring is None:
+            return []
+        rows = []
+        for i in ring.order():
+            ts = ring.timestamps[i]
+            if (start is not None and ts < start) or (end is not None and ts > end):
+                continue
+            rows.append(self._row(device_id, ring, i))
+        return rows
+
+    def latest_rows(self) -> List[Dict[str, Any]]:
+        """
+        Newest sample of every device, ordered by device ID.
+        Muestra más reciente de cada dispositivo, ordenadas por ID de dispositivo.
+        """
+        return [
+            self._row(device_id, ring, (ring.head - 1) % ring.capacity)
+            for device_id, ring in sorted(self.rings.items()) if ring.size
+        ]
+
+    @staticmethod
+    def _row(device_id: int, ring: DeviceRing, i: int) -> Dict[str, Any]:
+        row = {"device_id": device_id, "timestamp": datetime.utcfromtimestamp(ring.timestamps[i])}
+        for field, column in zip(RING_FIELDS, ring.values):
+            value = column[i]
+            row[field] = round(value, 2) if value == value else None
+        row["status"] = "online" if ring.online[i] else "offline"
+        return row
+
+    def columns(self, device_id: int, start: Optional[int] = None, fields: Sequence[str] = RING_FIELDS) -> Dict[str, List[Any]]:
+        """
+        Samples since a Unix timestamp as one array per field ({"timestamp": [unix...], "cpu": [...]}), for sparklines.
+        Muestras desde un timestamp Unix como un arreglo por campo ({"timestamp": [unix...], "cpu": [...]}), para sparklines.
+        """
+        ring = self.rings.get(device_id)
+        result: Dict[str, List[Any]] = {"timestamp": []}
+        wanted = [(field, ring.values[RING_FIELDS.index(field)] if ring else None) for field in fields if field in RING_FIELDS]
+        for field, _ in wanted:
+            result[field] = []
+        if ring is None:
+            return result
+        for i in ring.order():
+            ts = ring.timestamps[i]
+            if start is not None and ts < start:
+                continue
+            result["timestamp"].append(ts)
+            for field, column in wanted:
+                value = column[i]
+                result[field].append(round(value, 2) if value == value else None)
+        return result
+
+metric_rings = MetricRings()
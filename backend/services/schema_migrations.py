@@ -0,0 +1,62 @@
+"""
+schema_migrations.py
+
+Lightweight in-place schema upgrade. `SQLModel.metadata.create_all` creates missing tables but never
+alters existing ones, so databases created by an older version lack newly added columns and indexes.
+`upgrade_schema` adds them (nullable, with the model default as SQL DEFAULT) without touching data.
+
+Actualización ligera del esquema en el lugar. `SQLModel.metadata.create_all` crea las tablas que faltan
+pero nunca modifica las existentes, así que las bases creadas por una versión anterior no tienen las
+columnas e índices nuevos. `upgrade_schema` los agrega (nulables, con el valor por defecto del modelo
+como DEFAULT de SQL) sin tocar los datos.
+"""
+
+import logging
+from typing import Any, List
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel
+
+logger = logging.getLogger(__name__)
+
+def sql_literal(value: Any) -> str:
+    """
+    Render a Python scalar as an SQL literal for a DEFAULT clause.
+    Representa un escalar de Python como literal SQL para una cláusula DEFAULT.
+    """
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def upgrade_schema(engine) -> List[str]:
+    """
+    Add the columns and indexes declared on the models that are missing in the database.
+    Returns the applied DDL statements.
+
+    Agrega las columnas e índices declarados en los modelos que faltan en la base de datos.
+    Retorna las sentencias DDL aplicadas.
+    """
+    inspector = inspect(engine)
+    applied: List[str] = []
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=engine.dialect)}'
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {sql_literal(column.default.arg)}"
+                conn.execute(text(ddl))
+                applied.append(ddl)
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    applied.append(f"CREATE INDEX {index.name}")
+    for ddl in applied:
+        logger.info("Schema upgrade: %s", ddl)
+    return applied
@@ -0,0 +1,76 @@
+"""
+serialization.py
+
+Fast JSON serialization helpers based on orjson: a response class for the REST routes, direct
+encoding of ORM rows (without the Pydantic round-trip) for WebSocket frames, and a compact
+array-of-columns format for metric series.
+
+Utilidades de serialización JSON rápida basadas en orjson: una clase de respuesta para las rutas REST,
+codificación directa de filas ORM (sin pasar por Pydantic) para los frames WebSocket y un formato
+compacto de columnas para series de métricas.
+"""
+
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+import orjson
+from fastapi.responses import JSONResponse
+from sqlmodel import SQLModel
+from services.request_timing import traced
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+_columns_cache: Dict[type, Tuple[str, ...]] = {}
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson.
+    Respuesta JSON generada con orjson.
+    """
+    @traced("serialize")
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+@traced("serialize")
+def dumps(content: Any) -> bytes:
+    """
+    Serialize to JSON bytes with orjson (datetimes become ISO 8601 strings).
+    Serializa a bytes JSON con orjson (los datetime se convierten en cadenas ISO 8601).
+    """
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+def model_columns(model: type) -> Tuple[str, ...]:
+    """
+    Column names of a table model, computed once per class.
+    Nombres de columnas de un modelo de tabla, calculados una vez por clase.
+    """
+    columns = _columns_cache.get(model)
+    if columns is None:
+        columns = tuple(c.name for c in model.__table__.columns)
+        _columns_cache[model] = columns
+    return columns
+
+def row_to_dict(row: SQLModel) -> Dict[str, Any]:
+    """
+    Plain dict of a table row's column values, without Pydantic validation or encoding.
+    Dict plano con los valores de columna de una fila, sin validación ni codificación de Pydantic.
+    """
+    values = row.__dict__
+    return {
+        name: values[name] if name in values else getattr(row, name)
+        for name in model_columns(type(row))
+    }
+
+def rows_to_dicts(rows: Iterable[SQLModel]) -> List[Dict[str, Any]]:
+    """
+    row_to_dict applied to every row.
+    row_to_dict aplicado a cada fila.
+    """
+    return [row_to_dict(row) for row in rows]
+
+def rows_to_columns(rows: Sequence[Sequence[Any]], fields: Sequence[str]) -> Dict[str, List[Any]]:
+    """
+    Transpose result tuples into one array per field: {"timestamp": [...], "cpu": [...], ...}.
+    Transpone tuplas de resultado en un arreglo por campo: {"timestamp": [...], "cpu": [...], ...}.
+    """
+    if not rows:
+        return {field: [] for field in fields}
+    return {field: list(values) for field, values in zip(fields, zip(*rows))}
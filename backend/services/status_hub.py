@@ -0,0 +1,114 @@
+"""
+status_hub.py
+
+Shared producer for real-time status streams. The poller publishes the latest status of each device
+here; WebSocket clients read filtered views of it. The JSON payload of each topic (one device with
+one selection of fields) is built once per status change and reused by every client watching it.
+
+Productor compartido para los flujos de estado en tiempo real. El sondeo publica aquí el último
+estado de cada dispositivo; los clientes WebSocket leen vistas filtradas. El payload JSON de cada
+tópico (un dispositivo con una selección de campos) se construye una vez por cambio de estado y lo
+reutilizan todos los clientes que lo observan.
+"""
+
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlmodel import Session, select
+from models import Alert
+from services.serialization import dumps, row_to_dict
+
+# Keys always present in a filtered status entry / Claves siempre presentes en una entrada filtrada
+BASE_FIELDS = ("device_id", "ip", "name", "online", "error")
+ALERTS_REFRESH_SECONDS = 2.0
+
+FieldSet = Optional[Tuple[str, ...]]
+
+class StatusHub:
+    """
+    Latest status per device plus per-topic cached JSON fragments.
+    Último estado por dispositivo más fragmentos JSON en caché por tópico.
+    """
+    def __init__(self):
+        self.snapshots: Dict[int, Dict[str, Any]] = {}
+        self.versions: Dict[int, int] = {}
+        self.version = 0
+        self._fragments: Dict[Tuple[int, FieldSet], Tuple[int, bytes]] = {}
+        self._alerts: Dict[int, List[Dict[str, Any]]] = {}
+        self._alerts_loaded_at = 0.0
+
+    def publish(self, device_id: int, status: Dict[str, Any]) -> None:
+        """
+        Store the latest status of a device.
+        Almacena el último estado de un dispositivo.
+        """
+        self.snapshots[device_id] = status
+        self.version += 1
+        self.versions[device_id] = self.version
+
+    def remove(self, device_id: int) -> None:
+        """
+        Forget a device (e.g. after it is deleted or disabled).
+        Olvida un dispositivo (p. ej. tras eliminarlo o deshabilitarlo).
+        """
+        self.snapshots.pop(device_id, None)
+        self.versions.pop(device_id, None)
+        self.version += 1
+        for key in [k for k in self._fragments if k[0] == device_id]:
+            del self._fragments[key]
+
+    def device_ids(self, wanted: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        Known device IDs, optionally restricted to `wanted`, in a stable order.
+        IDs de dispositivos conocidos, opcionalmente restringidos a `wanted`, en orden estable.
+        """
+        if wanted is None:
+            return sorted(self.snapshots)
+        return sorted(d for d in set(wanted) if d in self.snapshots)
+
+    def fragment(self, device_id: int, fields: FieldSet) -> bytes:
+        """
+        JSON of one device's status restricted to `fields` (all keys if None), cached per version.
+        JSON del estado de un dispositivo restringido a `fields` (todas las claves si es None), en caché por versión.
+        """
+        key = (device_id, fields)
+        version = self.versions[device_id]
+        cached = self._fragments.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        status = self.snapshots[device_id]
+        if fields is not None:
+            status = {k: status[k] for k in BASE_FIELDS + fields if k in status}
+        encoded = dumps(status)
+        self._fragments[key] = (version, encoded)
+        return encoded
+
+    def status_array(self, device_ids: List[int], fields: FieldSet) -> bytes:
+        """
+        JSON array of the cached fragments of the given devices.
+        Arreglo JSON con los fragmentos en caché de los dispositivos dados.
+        """
+        return b"[" + b",".join(self.fragment(d, fields) for d in device_ids) + b"]"
+
+    def state_token(self, device_ids: List[int]) -> Tuple[int, ...]:
+        """
+        Versions of the given devices; equal tokens mean nothing changed for a subscriber.
+        Versiones de los dispositivos dados; tokens iguales significan que nada cambió para un suscriptor.
+        """
+        return tuple(self.versions.get(d, 0) for d in device_ids)
+
+    def unresolved_alerts(self, engine) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Unresolved alerts grouped by device, reloaded from the database at most every ALERTS_REFRESH_SECONDS.
+        Alertas no resueltas agrupadas por dispositivo, recargadas de la base como máximo cada ALERTS_REFRESH_SECONDS.
+        """
+        now = time.monotonic()
+        if now - self._alerts_loaded_at >= ALERTS_REFRESH_SECONDS:
+            grouped: Dict[int, List[Dict[str, Any]]] = {}
+            with Session(engine) as session:
+                for alert in session.exec(select(Alert).where(Alert.resolved == False)).all():
+                    grouped.setdefault(alert.device_id, []).append(row_to_dict(alert))
+            self._alerts = grouped
+            self._alerts_loaded_at = now
+        return self._alerts
+
+status_hub = StatusHub()
@@ -0,0 +1,63 @@
+"""
+test_circuit_breaker.py
+
+Circuit breakers of the device requests (services/circuit_breaker.py, utils.fetch_status/fetch_logs),
+against a stub device served through httpx.MockTransport.
+
+Circuit breakers de las peticiones a dispositivos (services/circuit_breaker.py,
+utils.fetch_status/fetch_logs), contra un dispositivo simulado servido con httpx.MockTransport.
+
+Usage / Uso (from backend/ / desde backend/):
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from services.circuit_breaker import breakers, breaker_for, CLOSED, OPEN, BREAKER_FAILURE_THRESHOLD
+
+def stub_device(ip: str, status_body, log_status: int = 200) -> None:
+    """
+    Route the requests to `ip` to a stub answering /api/v1/status with `status_body` and /log with `log_status`.
+    Dirige las peticiones a `ip` a un simulador que responde /api/v1/status con `status_body` y /log con `log_status`.
+    """
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/log":
+            return httpx.Response(log_status, json=[] if log_status == 200 else {"detail": "boom"})
+        return httpx.Response(200, json=status_body)
+    utils._clients[ip] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    breakers.pop((ip, "status"), None)
+    breakers.pop((ip, "log"), None)
+
+def test_log_failures_do_not_open_status_breaker():
+    ip = "10.255.0.1"
+    stub_device(ip, {"temp": 45.0, "disk": 30}, log_status=500)
+
+    async def run():
+        for _ in range(BREAKER_FAILURE_THRESHOLD):
+            assert "error" in (await utils.fetch_logs(ip))["logs"]
+        return await utils.fetch_status(ip)
+
+    status = asyncio.run(run())
+    assert "error" not in status and not status.get("stale")
+    assert status["temp"] == 45.0
+    assert breaker_for(ip, "log").state == OPEN
+    assert breaker_for(ip, "status").state == CLOSED
+
+def test_unstructured_status_counts_as_failure():
+    ip = "10.255.0.2"
+    stub_device(ip, ["not", "a", "dict"])
+
+    async def run():
+        return [await utils.fetch_status(ip) for _ in range(BREAKER_FAILURE_THRESHOLD + 1)]
+
+    results = asyncio.run(run())
+    assert all("error" in result for result in results)
+    assert results[-1].get("stale")
+    assert breaker_for(ip, "status").state == OPEN
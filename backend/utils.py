@@ -8,9 +8,18 @@ Funciones utilitarias para el backend de Raspberry Pi Dashboard.
 Incluye utilidades para alertas de Telegram, obtención de estado y logs, y escape de Markdown.
 """
 
+import asyncio
 import httpx
 import logging
 import os
+import ssl
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+from services.metrics import FETCH_STATUS_SECONDS, FETCH_ERRORS, HEDGED_REQUESTS, TELEGRAM_SEND_SECONDS
+from services.circuit_breaker import breaker_for
+from services.request_timing import traced
+from services.log_archive import log_archive
 logger = logging.getLogger(__name__)
 
 def escape_markdown(text: str) -> str:
@@ -26,76 +35,252 @@ def escape_markdown(text: str) -> str:
     escape_chars = r'_*[]()~`>#+-=|{}.!'
     return ''.join(f'\\{c}' if c in escape_chars else c for c in str(text))
 
+# Port of the status/log API on each Raspberry Pi / Puerto de la API de estado/logs en cada Raspberry Pi
+DEVICE_API_PORT = int(os.environ.get("DEVICE_API_PORT", "8000"))
+
+# Connect and read timeouts are separate: a dead host fails in DEVICE_CONNECT_TIMEOUT, a slow one gets the read budget
+# Los timeouts de conexión y lectura son separados: un host caído falla en DEVICE_CONNECT_TIMEOUT, uno lento tiene el de lectura
+DEVICE_CONNECT_TIMEOUT = float(os.environ.get("DEVICE_CONNECT_TIMEOUT", "1"))
+DEVICE_STATUS_READ_TIMEOUT = float(os.environ.get("DEVICE_STATUS_READ_TIMEOUT", "3"))
+DEVICE_LOG_READ_TIMEOUT = float(os.environ.get("DEVICE_LOG_READ_TIMEOUT", "1"))
+# No pool timeout: waiting for a free connection is not a device failure / Sin timeout de pool: esperar una conexión libre no es un fallo del dispositivo
+STATUS_TIMEOUT = httpx.Timeout(DEVICE_STATUS_READ_TIMEOUT, connect=DEVICE_CONNECT_TIMEOUT, pool=None)
+LOG_TIMEOUT = httpx.Timeout(DEVICE_LOG_READ_TIMEOUT, connect=DEVICE_CONNECT_TIMEOUT, pool=None)
+# Delay before a hedged duplicate request; 0 disables hedging / Espera antes de una petición duplicada; 0 la desactiva
+DEVICE_HEDGE_DELAY = float(os.environ.get("DEVICE_HEDGE_DELAY", "0"))
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_ssl_context: Optional[ssl.SSLContext] = None
+
+# Last successful payloads per device IP, served while its breaker is open
+# Últimos payloads exitosos por IP de dispositivo, servidos mientras su breaker está abierto
+last_status: Dict[str, Tuple[Dict[str, Any], float]] = {}
+last_logs: Dict[str, Any] = {}
+
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 
-async def send_telegram_alert(message: str, parse_mode: str = "Markdown"):
+async def post_telegram(message: str, parse_mode: str = "Markdown") -> Optional[httpx.Response]:
     """
-    Send an alert message to Telegram using the bot token and chat ID from environment variables.
-    Logs the response and errors.
+    Send a message to Telegram using the bot token and chat ID from environment variables.
+    Logs the response and errors. Returns Telegram's response, or None if Telegram is not configured
+    or could not be reached.
 
-    Envía un mensaje de alerta a Telegram usando el token y chat ID de las variables de entorno.
-    Registra la respuesta y los errores.
+    Envía un mensaje a Telegram usando el token y chat ID de las variables de entorno.
+    Registra la respuesta y los errores. Retorna la respuesta de Telegram, o None si Telegram no está
+    configurado o no se pudo contactar.
     """
-    logger.info(f"Trying to send alert to Telegram: {message}")
+    logger.info("Trying to send alert to Telegram: %s", message)
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-        logger.warning(f"Telegram token or chat_id not configured. TOKEN: {TELEGRAM_BOT_TOKEN}, CHAT_ID: {TELEGRAM_CHAT_ID}")
-        return
+        logger.warning("Telegram token or chat_id not configured. TOKEN: %s, CHAT_ID: %s", TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+        return None
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": parse_mode}
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, data=payload, timeout=5)
-        logger.info(f"Telegram response: {response.status_code} {response.text}")
-        logger.info("Alert sent to Telegram")
+        with TELEGRAM_SEND_SECONDS.time():
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, data=payload, timeout=5)
+        logger.info("Telegram response: %s %s", response.status_code, response.text)
+        return response
     except Exception as e:
-        logger.error(f"Error sending alert to Telegram: {e}")
+        logger.error("Error sending alert to Telegram: %s", e)
+        return None
+
+async def send_telegram_alert(message: str, parse_mode: str = "Markdown") -> bool:
+    """
+    Send an alert message to Telegram. Returns True if Telegram accepted the message.
+    Envía un mensaje de alerta a Telegram. Retorna True si Telegram aceptó el mensaje.
+    """
+    response = await post_telegram(message, parse_mode)
+    if response is None or not response.is_success:
+        return False
+    logger.info("Alert sent to Telegram")
+    return True
+
+def error_reason(error: Exception) -> str:
+    """
+    Classify a device request error for metrics: timeout, connect or other.
+    Clasifica un error de petición a un dispositivo para métricas: timeout, connect u other.
+    """
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.ConnectError):
+        return "connect"
+    if isinstance(error, httpx.HTTPStatusError):
+        return "http_status"
+    return "other"
+
+def get_client(ip: str) -> httpx.AsyncClient:
+    """
+    Keep-alive HTTP client of one device, reused across calls. One small pool per device keeps
+    connection lookup constant-time (a single pool over the whole fleet slows down with its size),
+    and the shared SSL context avoids rebuilding certificates for every client.
+
+    Cliente HTTP keep-alive de un dispositivo, reutilizado entre llamadas. Un pool pequeño por
+    dispositivo mantiene la búsqueda de conexiones en tiempo constante (un único pool para toda la
+    flota se vuelve lento con su tamaño), y el contexto SSL compartido evita reconstruir certificados
+    para cada cliente.
+    """
+    global _ssl_context
+    client = _clients.get(ip)
+    if client is None or client.is_closed:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context()
+        # Two connections: the request and an optional hedge / Dos conexiones: la petición y una duplicada opcional
+        client = _clients[ip] = httpx.AsyncClient(
+            verify=_ssl_context, limits=httpx.Limits(max_connections=2, max_keepalive_connections=2),
+        )
+    return client
+
+async def close_client() -> None:
+    """
+    Close the device clients (on shutdown).
+    Cierra los clientes de dispositivos (al apagar).
+    """
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+@traced("upstream")
+async def device_get(ip: str, url: str, timeout: httpx.Timeout) -> httpx.Response:
+    """
+    GET a device URL. With DEVICE_HEDGE_DELAY > 0, a second identical request is sent if the first has
+    not answered after that delay, and the first successful response wins.
+
+    GET a una URL de dispositivo. Con DEVICE_HEDGE_DELAY > 0 se envía una segunda petición idéntica si la
+    primera no respondió tras ese tiempo, y gana la primera respuesta exitosa.
+    """
+    client = get_client(ip)
+    if DEVICE_HEDGE_DELAY <= 0:
+        return await client.get(url, timeout=timeout)
+    first = asyncio.ensure_future(client.get(url, timeout=timeout))
+    done, _ = await asyncio.wait({first}, timeout=DEVICE_HEDGE_DELAY)
+    if done:
+        return first.result()
+    HEDGED_REQUESTS.labels("sent").inc()
+    hedge = asyncio.ensure_future(client.get(url, timeout=timeout))
+    pending = {first, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        HEDGED_REQUESTS.labels("won").inc()
+                    return task.result()
+        return first.result()  # Both failed: raise the original error / Ambas fallaron: lanzar el error original
+    finally:
+        for task in pending:
+            task.cancel()
+
+def with_last_status(ip: str, result: dict) -> dict:
+    """
+    Merge a flagged result ({"stale": True} or {"pending": True}) over the last known status of a device.
+    Combina un resultado marcado ({"stale": True} o {"pending": True}) con el último estado conocido de un dispositivo.
+    """
+    snapshot = last_status.get(ip)
+    if snapshot is None:
+        return {"ip": ip, **result}
+    data, seen_at = snapshot
+    return {"ip": ip, **data, **result, "last_seen": datetime.fromtimestamp(seen_at, timezone.utc).isoformat()}
+
+def stale_status(ip: str) -> dict:
+    """
+    Result for a device whose circuit breaker is open: the last known status marked as stale.
+    Resultado para un dispositivo con el circuit breaker abierto: el último estado conocido marcado como viejo.
+    """
+    return with_last_status(ip, {"error": f"Raspberry Pi {ip} is not responding (circuit open)", "stale": True})
+
+def pending_status(ip: str) -> dict:
+    """
+    Placeholder for a device that missed the response deadline: the last known status marked as pending.
+    Valor provisional para un dispositivo que no respondió a tiempo: el último estado conocido marcado como pendiente.
+    """
+    return with_last_status(ip, {"pending": True})
+
+def pending_logs(ip: str) -> dict:
+    """
+    Placeholder for a device whose logs missed the response deadline: the last known logs marked as pending.
+    Valor provisional para un dispositivo cuyos logs no llegaron a tiempo: los últimos logs conocidos marcados como pendientes.
+    """
+    return {"ip": ip, "logs": last_logs.get(ip, {"error": "Pending"}), "pending": True}
 
 async def fetch_status(ip):
     """
     Fetch the status from a Raspberry Pi device at the given IP address.
-    Returns a dictionary with the status or an error message.
+    Returns a dictionary with the status or an error message. If the device's circuit breaker is open,
+    returns its last known status marked as stale without sending a request.
 
     Obtiene el estado de una Raspberry Pi en la IP dada.
-    Retorna un diccionario con el estado o un mensaje de error.
-    """
-    url = f"http://{ip}:8000/api/v1/status"
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, timeout=3)
-            response.raise_for_status()
-            data = response.json()
-            logger.info(f"Status received from {ip}")
-            # If the response has 'data', merge it into the root
-            # Si la respuesta tiene 'data', mezclarlo en la raíz
-            if "data" in data:
-                data = {**data["data"], "meta": data.get("meta", {})}
-            # Ensure data is a dict
-            # Forzar que data sea un dict
-            if not isinstance(data, dict):
-                logger.error(f"Unstructured response for {ip}: {data}")
-                data = {"error": f"Unstructured response from Raspberry Pi {ip}"}
-        except Exception as e:
-            logger.error(f"Error getting status from {ip}: {e}")
-            data = {"error": f"Could not get status from Raspberry Pi {ip}: {str(e)}"}
+    Retorna un diccionario con el estado o un mensaje de error. Si el circuit breaker del dispositivo
+    está abierto, retorna su último estado conocido marcado como viejo sin enviar la petición.
+    """
+    breaker = breaker_for(ip, "status")
+    if not breaker.allow():
+        FETCH_ERRORS.labels("status", "circuit_open").inc()
+        return stale_status(ip)
+    url = f"http://{ip}:{DEVICE_API_PORT}/api/v1/status"
+    started = time.perf_counter()
+    try:
+        response = await device_get(ip, url, STATUS_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        # If the response has 'data', merge it into the root
+        # Si la respuesta tiene 'data', mezclarlo en la raíz
+        if isinstance(data, dict) and isinstance(data.get("data"), dict):
+            data = {**data["data"], "meta": data.get("meta", {})}
+        # Ensure data is a dict; anything else counts as a failure of the device
+        # Forzar que data sea un dict; cualquier otra cosa cuenta como un fallo del dispositivo
+        if not isinstance(data, dict):
+            breaker.record_failure()
+            logger.error("Unstructured response for %s: %s", ip, data)
+            FETCH_ERRORS.labels("status", "invalid").inc()
+            data = {"error": f"Unstructured response from Raspberry Pi {ip}"}
+        else:
+            breaker.record_success()
+            logger.info("Status received from %s", ip, extra={"sample": True})
+            last_status[ip] = (data, time.time())
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.record_failure()
+        logger.error("Error getting status from %s: %s", ip, e)
+        FETCH_ERRORS.labels("status", error_reason(e)).inc()
+        data = {"error": f"Could not get status from Raspberry Pi {ip}: {str(e)}"}
+    FETCH_STATUS_SECONDS.labels(ip).observe(time.perf_counter() - started)
     return {"ip": ip, **data}
 
 async def fetch_logs(ip):
     """
     Fetch the logs from a Raspberry Pi device at the given IP address.
-    Returns a dictionary with the logs or an error message.
+    Returns a dictionary with the logs or an error message. If the device's circuit breaker is open,
+    returns its last known logs marked as stale without sending a request.
 
     Obtiene los logs de una Raspberry Pi en la IP dada.
-    Retorna un diccionario con los logs o un mensaje de error.
-    """
-    url = f"http://{ip}:8000/log"
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, timeout=1)
-            response.raise_for_status()
-            data = response.json()
-            logger.info(f"Logs received from {ip}")
-        except Exception as e:
-            logger.error(f"Error getting logs from {ip}: {e}")
-            data = {"error": "Not available"}
+    Retorna un diccionario con los logs o un mensaje de error. Si el circuit breaker del dispositivo
+    está abierto, retorna sus últimos logs conocidos marcados como viejos sin enviar la petición.
+    """
+    breaker = breaker_for(ip, "log")
+    if not breaker.allow():
+        FETCH_ERRORS.labels("log", "circuit_open").inc()
+        return {"ip": ip, "logs": last_logs.get(ip, {"error": "Not available"}), "stale": True}
+    url = f"http://{ip}:{DEVICE_API_PORT}/log"
+    try:
+        response = await device_get(ip, url, LOG_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        breaker.record_success()
+        last_logs[ip] = data
+        log_archive.add(ip, data)
+        logger.info("Logs received from %s", ip, extra={"sample": True})
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.record_failure()
+        logger.error("Error getting logs from %s: %s", ip, e)
+        FETCH_ERRORS.labels("log", error_reason(e)).inc()
+        data = {"error": "Not available"}
     return {"ip": ip, "logs": data}
@@ -43,6 +43,8 @@ interface StatusData {
     status: string;
   };
   error?: string;
+  peer?: string;
+  stale?: boolean;
 }
 
 interface LogEntry {
@@ -107,7 +109,7 @@ export default function Dashboard() {
 
   // Fetch status from backend
   // Obtener estado desde el backend
-  const fetchStatus = async () => {
+  const fetchStatus = async (): Promise<StatusData[]> => {
     const now = new Date().toLocaleTimeString();
     setLastPing(now);
     setLoading(true);
@@ -116,12 +118,15 @@ export default function Dashboard() {
       const res = await fetch(`${RPI_BASE_URL}/api/v1/status`);
       if (!res.ok) throw new Error("Could not connect to backend");
       const data = await res.json();
-      setStatusList(Array.isArray(data) ? data : []);
+      const list = Array.isArray(data) ? data : [];
+      setStatusList(list);
       setIsOnline(true);
+      return list;
     } catch (err) {
       setIsOnline(false);
       setStatusList([]);
       setGlobalError("Could not connect to backend. Check network or server.");
+      return [];
     } finally {
       setLoading(false);
     }
@@ -156,22 +161,77 @@ export default function Dashboard() {
     }
   };
 
-  // WebSocket and polling for real-time updates
-  // WebSocket y polling para actualizaciones en tiempo real
+  // WebSocket, Server-Sent Events fallback and polling for real-time updates
+  // WebSocket, respaldo con Server-Sent Events y polling para actualizaciones en tiempo real
   useEffect(() => {
     let ws: WebSocket | null = null;
+    let events: EventSource | null = null;
     let wsActive = false;
+    let streamActive = false;
+    // Federated statuses only arrive by polling or WebSocket / Los estados federados solo llegan por polling o WebSocket
+    let federated = false;
     let interval: NodeJS.Timeout | null = null;
 
+    // Merge streamed statuses into the list by peer and IP (networks of different peers may reuse IPs)
+    // Combinar los estados recibidos del flujo por par e IP (las redes de distintos pares pueden repetir IPs)
+    function mergeStatuses(updates: StatusData[]) {
+      setStatusList((prev) => {
+        const byKey = new Map(prev.map((s) => [`${s.peer ?? ""}|${s.ip}`, s]));
+        updates.forEach((s) => byKey.set(`${s.peer ?? ""}|${s.ip}`, s));
+        return Array.from(byKey.values());
+      });
+    }
+
+    // Used when the WebSocket cannot connect (e.g. behind a proxy); resumes with Last-Event-ID on its own
+    // Se usa cuando el WebSocket no puede conectar (p. ej. detrás de un proxy); continúa solo con Last-Event-ID
+    function connectEvents() {
+      if (events || typeof EventSource === "undefined") return;
+      events = new EventSource(`${RPI_BASE_URL}/api/v1/events`);
+      events.onopen = () => { streamActive = true; setIsOnline(true); };
+      events.onerror = () => { streamActive = false; };
+      events.addEventListener("snapshot", (event) => {
+        const data = JSON.parse((event as MessageEvent).data);
+        // The stream only carries this backend's devices: keep the federated ones
+        // El flujo solo trae los dispositivos de este backend: conservar los federados
+        setStatusList((prev) => [...prev.filter((s) => s.peer), ...(Array.isArray(data.status) ? data.status : [])]);
+        setLastPing(new Date().toLocaleTimeString());
+        setLoading(false);
+      });
+      events.addEventListener("status", (event) => {
+        const data = JSON.parse((event as MessageEvent).data);
+        if (Array.isArray(data.status)) mergeStatuses(data.status);
+        setLastPing(new Date().toLocaleTimeString());
+      });
+      events.addEventListener("remove", (event) => {
+        const data = JSON.parse((event as MessageEvent).data);
+        const removed = new Set<number>(data.device_ids || []);
+        setStatusList((prev) => prev.filter((s: any) => s.peer || !removed.has(s.device_id)));
+      });
+    }
+
     function connectWS() {
       ws = new WebSocket(`ws://${window.location.hostname}:8000/ws/status`);
       ws.onopen = () => { wsActive = true; };
-      ws.onclose = () => { wsActive = false; };
-      ws.onerror = () => { wsActive = false; };
+      ws.onclose = () => { if (!wsActive) connectEvents(); wsActive = false; };
+      ws.onerror = () => { wsActive = false; connectEvents(); };
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+          // Heartbeat: the server closes clients that stop answering / Heartbeat: el servidor cierra los clientes que dejan de responder
+          if (data.type === "ping") {
+            ws?.send(JSON.stringify({ action: "pong" }));
+            return;
+          }
           if (data.devices) setDevices(data.devices);
+          // Results of devices that missed the REST deadline / Resultados de dispositivos que no llegaron a tiempo en REST
+          if (data.type === "late_status" && data.status) {
+            setStatusList((prev) => prev.map((s) => (!s.peer && s.ip === data.status.ip ? data.status : s)));
+          }
+          if (data.type === "late_logs" && data.logs) {
+            setLogsByRaspberry((prev) => prev.map((l) => (l.ip === data.logs.ip ? data.logs : l)));
+          }
+          // Cached statuses of the federation peers / Estados en caché de los pares de la federación
+          if (Array.isArray(data.remote_status)) mergeStatuses(data.remote_status);
           if (data.metrics) {/* could be used for real-time chart updates / podría usarse para actualizar gráficas en tiempo real */}
           if (data.alerts) {/* could be used for real-time alerts / podría usarse para alertas en tiempo real */}
         } catch {}
@@ -179,17 +239,20 @@ export default function Dashboard() {
     }
 
     if (tab === "dashboard") {
+      const pollStatus = () => fetchStatus().then((list) => { federated = list.some((s) => s.peer); });
       connectWS();
-      fetchStatus();
+      pollStatus();
       fetchLogs();
       interval = setInterval(() => {
-        fetchStatus();
+        // The event stream already delivers this backend's statuses / El flujo de eventos ya entrega los estados de este backend
+        if (!streamActive || federated) pollStatus();
         fetchLogs();
       }, 10000);
     }
 
     return () => {
       if (ws) ws.close();
+      if (events) events.close();
       if (interval) clearInterval(interval);
     };
   }, [tab]);
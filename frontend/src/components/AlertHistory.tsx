@@ -1,9 +1,11 @@
 /**
  * AlertHistory.tsx
  *
- * Component that displays the system alert history and allows marking alerts as resolved. Fetches from backend on load.
+ * Component that displays the system alert history and allows marking alerts as resolved, one by one or in bulk.
+ * Alerts are loaded in pages of PAGE_SIZE (keyset pagination) with an optional level filter.
  *
- * Componente que muestra el historial de alertas del sistema y permite marcar alertas como resueltas. Consulta el backend al cargar.
+ * Componente que muestra el historial de alertas del sistema y permite marcar alertas como resueltas, una a una o en bloque.
+ * Las alertas se cargan en páginas de PAGE_SIZE (paginación por clave) con un filtro de nivel opcional.
  */
 
 import { useEffect, useState } from "react";
@@ -18,6 +20,8 @@ interface Alert {
   resolved: boolean;
 }
 
+const PAGE_SIZE = 100;
+
 /**
  * Displays a table with the alert history and allows resolving them.
  *
@@ -25,44 +29,119 @@ interface Alert {
  */
 export function AlertHistory() {
   const [alerts, setAlerts] = useState<Alert[]>([]);
+  const [level, setLevel] = useState("");
+  const [hasMore, setHasMore] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
+  // Error of the last resolve action, shown above the table / Error de la última acción de resolver, mostrado sobre la tabla
+  const [actionError, setActionError] = useState("");
 
-  // Fetch alert history from backend
-  // Obtiene el historial de alertas del backend
-  const fetchAlerts = () => {
+  // Fetch one page of alert history from backend; `before` is the ID of the last alert already shown
+  // Obtiene una página del historial de alertas del backend; `before` es el ID de la última alerta ya mostrada
+  const fetchAlerts = (before?: number) => {
     setLoading(true);
     setError("");
-    fetch(`${RPI_BASE_URL}/devices/alerts`)
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (level) params.set("level", level);
+    if (before !== undefined) params.set("before", String(before));
+    fetch(`${RPI_BASE_URL}/devices/alerts?${params}`)
       .then(res => res.json())
-      .then(setAlerts)
+      .then((page: Alert[]) => {
+        setAlerts(prev => (before === undefined ? page : [...prev, ...page]));
+        setHasMore(page.length === PAGE_SIZE);
+      })
       .catch(() => setError("Could not fetch alert history."))
       .finally(() => setLoading(false));
   };
 
   useEffect(() => {
     fetchAlerts();
-  }, []);
+  }, [level]);
+
+  // Perform authenticated requests using JWT token
+  // Realiza peticiones autenticadas usando el token JWT
+  function authFetch(input: RequestInfo, init: RequestInit = {}) {
+    const token = localStorage.getItem("token");
+    return fetch(input, {
+      ...init,
+      headers: {
+        ...(init.headers || {}),
+        Authorization: token ? `Bearer ${token}` : "",
+      },
+    });
+  }
 
-  // Mark an alert as resolved
-  // Marca una alerta como resuelta
+  // Error message of a failed response: the backend's detail if it sent one
+  // Mensaje de error de una respuesta fallida: el detail del backend si lo envió
+  async function responseError(res: Response, fallback: string) {
+    try {
+      const data = await res.json();
+      if (data && typeof data.detail === "string") return `${fallback} ${data.detail}`;
+    } catch {}
+    return `${fallback} (HTTP ${res.status})`;
+  }
+
+  // Mark an alert as resolved; the row changes only if the backend accepted it
+  // Marca una alerta como resuelta; la fila cambia solo si el backend lo aceptó
   const handleResolve = async (id: number) => {
     if (!window.confirm("Mark this alert as resolved?")) return;
+    setActionError("");
+    try {
+      const res = await authFetch(`${RPI_BASE_URL}/devices/alerts/${id}/resolve`, { method: "POST" });
+      if (!res.ok) {
+        setActionError(await responseError(res, "Could not resolve the alert."));
+        return;
+      }
+      setAlerts(prev => prev.map(a => (a.id === id ? { ...a, resolved: true } : a)));
+    } catch {
+      setActionError("Could not resolve the alert.");
+    }
+  };
+
+  // Mark every active alert of the selected level (or all levels) as resolved in one request
+  // Marca como resueltas en una sola petición todas las alertas activas del nivel elegido (o de todos)
+  const handleResolveAll = async () => {
+    if (!window.confirm(`Mark all active ${level || ""} alerts as resolved?`)) return;
+    setActionError("");
     try {
-      await fetch(`${RPI_BASE_URL}/devices/alerts/${id}/resolve`, { method: "POST" });
+      const res = await authFetch(`${RPI_BASE_URL}/devices/alerts/resolve`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(level ? { level } : { end: new Date().toISOString() }),
+      });
+      if (!res.ok) {
+        setActionError(await responseError(res, "Could not resolve the alerts."));
+        return;
+      }
       fetchAlerts();
     } catch {
-      setError("Could not resolve the alert.");
+      setActionError("Could not resolve the alerts.");
     }
   };
 
-  if (loading) return <div className="text-gray-400">Loading alerts...</div>;
+  if (loading && !alerts.length) return <div className="text-gray-400">Loading alerts...</div>;
   if (error) return <div className="text-red-400">{error}</div>;
-  if (!alerts.length) return <div className="text-gray-400">No alerts registered.</div>;
 
   return (
     <div className="bg-gray-900 p-4 rounded shadow">
-      <h2 className="text-lg font-bold mb-4">Alert History</h2>
+      <div className="flex items-center gap-4 mb-4">
+        <h2 className="text-lg font-bold">Alert History</h2>
+        <select
+          className="bg-gray-800 text-white text-sm rounded px-2 py-1"
+          value={level}
+          onChange={e => setLevel(e.target.value)}
+        >
+          <option value="">All levels</option>
+          <option value="CRITICAL">CRITICAL</option>
+          <option value="WARNING">WARNING</option>
+          <option value="INFO">INFO</option>
+        </select>
+        <button className="text-green-400 underline text-sm" onClick={handleResolveAll}>
+          Resolve all active
+        </button>
+      </div>
+      {actionError && <div className="text-red-400 mb-2 text-sm">{actionError}</div>}
+      {!alerts.length && <div className="text-gray-400">No alerts registered.</div>}
       <table className="min-w-full text-white text-sm rounded shadow">
         <thead>
           <tr className="bg-gray-700 text-left">
@@ -94,6 +173,15 @@ export function AlertHistory() {
           ))}
         </tbody>
       </table>
+      {hasMore && (
+        <button
+          className="mt-4 text-blue-400 underline disabled:text-gray-500"
+          disabled={loading}
+          onClick={() => fetchAlerts(alerts[alerts.length - 1].id)}
+        >
+          {loading ? "Loading..." : "Load more"}
+        </button>
+      )}
     </div>
   );
 }